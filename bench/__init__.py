@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+各处理脚本的基准测试。
+
+deckgen 按参数（幻灯片数、每个形状的 run 数、组合嵌套深度、表格大小、图片数、媒体大小）
+在本地生成测试用的 pptx；cases 登记要计时的核心函数；运行 python -m bench 时每个用例在
+单独的进程中执行，记录耗时、峰值内存和吞吐量，追加到 JSON 历史文件，便于在提交之间比较。
+"""
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+运行基准测试：python -m bench [参数]
+
+先按参数生成 deck（或用 --deck 指定已有文件），每个用例在新的工作进程中重复执行若干次，
+记录每次耗时、中位数、峰值内存（RSS）、每秒处理的幻灯片数和 MB 数，追加到历史文件。
+--compare 会与历史中 deck 参数相同的上一条记录对比。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.cases import CASES, ROOT, measure
+from bench.deckgen import DEFAULTS, make_deck
+
+HISTORY_PATH = os.path.join(ROOT, "bench", "history.json")
+
+
+def count_slides(deck):
+    with zipfile.ZipFile(deck) as zf:
+        return sum(1 for name in zf.namelist()
+                   if name.startswith("ppt/slides/slide") and name.endswith(".xml"))
+
+
+def run_case(name, deck, repeat, slides, size_mb):
+    """在新进程中运行一个用例，返回结果记录。"""
+    # 每个用例单独一个 spawn 的进程：fork 出的进程会继承父进程（已生成 deck、导入 pptx 和 PIL）
+    # 的 ru_maxrss，峰值内存就不是用例本身的了
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        times, peak = pool.submit(measure, name, deck, repeat).result()
+    wall = statistics.median(times)
+    return {
+        "wall": round(wall, 4),
+        "min": round(min(times), 4),
+        "runs": [round(t, 4) for t in times],
+        "peak_rss_mb": None if peak is None else round(peak, 1),
+        "slides_per_s": round(slides / wall, 2) if wall else None,
+        "mb_per_s": round(size_mb / wall, 2) if wall else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_history(path, history):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", prefix="history.", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def print_comparison(entry, history):
+    """与 deck 相同的上一条记录逐个用例比较耗时。"""
+    previous = next((old for old in reversed(history) if old["deck"] == entry["deck"]), None)
+    if previous is None:
+        print("历史中没有相同 deck 的记录，无法比较")
+        return
+    print("与 %s（%s）比较：" % (previous.get("commit"), previous["time"]))
+    for name, result in entry["results"].items():
+        old = previous["results"].get(name)
+        if old is None:
+            print("  %-16s %8.3fs  （无旧记录）" % (name, result["wall"]))
+            continue
+        change = (result["wall"] - old["wall"]) / old["wall"] * 100 if old["wall"] else 0.0
+        print("  %-16s %8.3fs -> %8.3fs  %+6.1f%%" % (name, old["wall"], result["wall"], change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="各处理脚本的基准测试")
+    for key, value in DEFAULTS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=value,
+                            help="生成 deck 的参数（默认 %s）" % value)
+    parser.add_argument("--deck", help="使用已有的 pptx，不生成 deck")
+    parser.add_argument("--cases", default=",".join(CASES),
+                        help="要运行的用例，逗号分隔（默认全部：%s）" % ",".join(CASES))
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每个用例重复次数（默认 3）")
+    parser.add_argument("--history", default=HISTORY_PATH, help="历史文件（默认 bench/history.json）")
+    parser.add_argument("--label", help="写入记录的备注")
+    parser.add_argument("--no-save", action="store_true", help="不写入历史文件")
+    parser.add_argument("--compare", action="store_true", help="与历史中相同 deck 的上一条记录比较")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error("未知用例：%s" % ", ".join(unknown))
+
+    workdir = tempfile.mkdtemp(prefix="bench-deck-")
+    try:
+        if args.deck:
+            deck = args.deck
+            deck_info = {"file": os.path.basename(deck)}
+        else:
+            deck = os.path.join(workdir, "bench.pptx")
+            deck_info = make_deck(deck, **{key: getattr(args, key) for key in DEFAULTS})
+        size_mb = os.path.getsize(deck) / 1024.0 / 1024.0
+        slides = count_slides(deck)
+        print("deck：%d 张幻灯片，%.2f MB" % (slides, size_mb))
+
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": git_commit(),
+            "label": args.label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "deck": deck_info,
+            "deck_size_mb": round(size_mb, 3),
+            "results": {},
+        }
+        for name in names:
+            result = run_case(name, deck, args.repeat, slides, size_mb)
+            entry["results"][name] = result
+            print("  %-16s %8.3fs  峰值 %s MB  %s 张/s  %s MB/s" % (
+                name, result["wall"], result["peak_rss_mb"], result["slides_per_s"], result["mb_per_s"]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    history = load_history(args.history)
+    if args.compare:
+        print_comparison(entry, history)
+    if not args.no_save:
+        history.append(entry)
+        save_history(args.history, history)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
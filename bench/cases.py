@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试用例：每个用例调用一个工具的核心函数，把 deck 处理到 output 目录。
+
+用例在工作进程中执行，所以工具模块在函数内部导入，只有被选中的用例才会加载对应的依赖。
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "ppt")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 用例注册表：用例名 -> 函数 fn(deck, output)
+CASES = {}
+
+# pipeline 用例的步骤，相当于依次运行三个工具
+PIPELINE_CONFIG = {"steps": [
+    {"step": "spacing", "mode": 1},
+    {"step": "font", "font_scale": 0.8, "line_spacing": 1.0},
+    {"step": "empty_paragraph", "font_scale": 0.8},
+]}
+
+
+def register_case(name):
+    """注册一个用例。"""
+    def decorator(func):
+        CASES[name] = func
+        return func
+    return decorator
+
+
+@register_case("spacing")
+def spacing_case(deck, output):
+    """统一间距.convert_pptx，模式 1。"""
+    import 统一间距
+    统一间距.convert_pptx(deck, output, 1)
+
+
+@register_case("translate")
+def translate_case(deck, output):
+    """译后预处理.process_ppt（只解析文字部件）。"""
+    import 译后预处理
+    译后预处理.process_ppt(deck, output, 0.8, 1.2, True)
+
+
+@register_case("translate_full")
+def translate_full_case(deck, output):
+    """译后预处理.process_ppt，用 Presentation 完整加载，作为对照。"""
+    import 译后预处理
+    译后预处理.process_ppt(deck, output, 0.8, 1.2, True, text_only=False)
+
+
+@register_case("translate_fill")
+def translate_fill_case(deck, output):
+    """pptx译后预处理.process_ppt（补空段落）。"""
+    import pptx译后预处理
+    pptx译后预处理.process_ppt(deck, output, 0.8, 1.2, True)
+
+
+@register_case("pipeline")
+def pipeline_case(deck, output):
+    """pptx_pipeline.run_pipeline，一次完成三个工具的处理。"""
+    import pptx_pipeline
+    pptx_pipeline.run_pipeline(deck, output, pptx_pipeline.parse_config(PIPELINE_CONFIG))
+
+
+@register_case("extract_images")
+def extract_images_case(deck, output):
+    """ppt/extract_images_cmd.extract_images_from_ppt。"""
+    import extract_images_cmd
+    # 它会打印提取结果，不让它混进基准测试的输出
+    with contextlib.redirect_stdout(io.StringIO()):
+        extract_images_cmd.extract_images_from_ppt(deck, output)
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），无法取得时返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource，装了 psutil 时用它
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024.0 / 1024.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 1024.0 / 1024.0 if sys.platform == "darwin" else peak / 1024.0
+
+
+def measure(name, deck, repeat):
+    """在工作进程中执行用例 repeat 次，返回 (每次耗时, 峰值内存)。每次输出到新的临时目录。"""
+    func = CASES[name]
+    times = []
+    for _ in range(repeat):
+        output = tempfile.mkdtemp(prefix="bench-")
+        try:
+            start = time.perf_counter()
+            func(deck, output)
+            times.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(output, ignore_errors=True)
+    return times, peak_rss_mb()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+生成基准测试用的 pptx。
+
+每张幻灯片包含若干文本框（带软回车、字符间距和空段落）、一个嵌套组合、一个表格，
+图片平均分配到各张幻灯片，媒体文件（不可压缩的随机字节）放在第一张幻灯片上。
+相同的参数和随机种子总是生成相同的内容。
+"""
+import io
+import random
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+# 默认参数，命令行和历史记录都按这些键名保存
+DEFAULTS = {
+    "slides": 20,
+    "shapes": 4,          # 每张幻灯片的文本框数
+    "runs": 20,           # 每个形状的 run 数
+    "group_depth": 2,     # 组合嵌套层数，0 表示不加组合
+    "table_rows": 4,
+    "table_cols": 4,
+    "images": 10,
+    "media_mb": 0.0,      # 媒体文件大小（MB），0 表示不加
+    "seed": 0,
+}
+
+RUNS_PER_PARAGRAPH = 5
+WORDS = ["alpha", "beta", "gamma", "delta", "翻译", "预处理", "字体", "间距", "表格", "段落"]
+
+
+def deck_params(**overrides):
+    """用默认值补全参数，遇到未知参数时抛出 ValueError。"""
+    unknown = set(overrides) - set(DEFAULTS)
+    if unknown:
+        raise ValueError("未知参数：%s" % ", ".join(sorted(unknown)))
+    params = dict(DEFAULTS)
+    params.update(overrides)
+    return params
+
+
+def fill_text(text_frame, runs, rng):
+    """写入 runs 个 run：每段 RUNS_PER_PARAGRAPH 个，段内插入软回车，部分 run 带字符间距，最后留一个空段落。"""
+    paragraph = text_frame.paragraphs[0]
+    for index in range(runs):
+        if index and index % RUNS_PER_PARAGRAPH == 0:
+            paragraph = text_frame.add_paragraph()
+        elif index:
+            # 与 PowerPoint 一样写成带 a:rPr 的 <a:br>…</a:br>，统一间距只匹配这种形式
+            paragraph._p.add_br().get_or_add_rPr().set("lang", "en-US")
+        run = paragraph.add_run()
+        run.text = " ".join(rng.choice(WORDS) for _ in range(3))
+        run.font.size = Pt(rng.choice((10, 12, 14, 18, 24, 28)))
+        if index % 3 == 0:
+            run._r.get_or_add_rPr().set("spc", str(rng.randint(-50, 50)))
+    text_frame.add_paragraph()
+
+
+def make_image(rng):
+    """生成一张 64x64 的随机色块 PNG。"""
+    image = Image.new("RGB", (64, 64), tuple(rng.randrange(256) for _ in range(3)))
+    for _ in range(8):
+        x, y = rng.randrange(48), rng.randrange(48)
+        image.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 16, y + 16))
+    stream = io.BytesIO()
+    image.save(stream, "PNG")
+    stream.seek(0)
+    return stream
+
+
+def add_nested_group(shapes, depth, runs, rng):
+    """在 shapes 中加入 depth 层嵌套的组合，最内层放一个文本框。"""
+    for _ in range(depth):
+        shapes = shapes.add_group_shape().shapes
+    textbox = shapes.add_textbox(Inches(6), Inches(1), Inches(3), Inches(1))
+    fill_text(textbox.text_frame, runs, rng)
+
+
+def make_deck(path, **overrides):
+    """
+    按参数生成 pptx 并保存到 path。
+
+    返回:
+        dict: 实际使用的完整参数。
+    """
+    params = deck_params(**overrides)
+    rng = random.Random(params["seed"])
+    prs = Presentation()
+    layout = prs.slide_layouts[6]
+    slides = params["slides"]
+    images_left = params["images"]
+    for slide_index in range(slides):
+        slide = prs.slides.add_slide(layout)
+        for shape_index in range(params["shapes"]):
+            textbox = slide.shapes.add_textbox(Inches(0.5), Inches(0.5 + shape_index), Inches(5), Inches(1))
+            fill_text(textbox.text_frame, params["runs"], rng)
+        if params["group_depth"]:
+            add_nested_group(slide.shapes, params["group_depth"], params["runs"], rng)
+        if params["table_rows"] and params["table_cols"]:
+            table = slide.shapes.add_table(params["table_rows"], params["table_cols"],
+                                           Inches(0.5), Inches(5), Inches(9), Inches(2)).table
+            for row in table.rows:
+                for cell in row.cells:
+                    fill_text(cell.text_frame, RUNS_PER_PARAGRAPH, rng)
+        # 图片平均分配，余数放在后面的幻灯片
+        count = images_left // (slides - slide_index)
+        images_left -= count
+        for image_index in range(count):
+            slide.shapes.add_picture(make_image(rng), Inches(6 + image_index % 4), Inches(4), Inches(0.8))
+        if slide_index == 0 and params["media_mb"]:
+            media = io.BytesIO(rng.randbytes(int(params["media_mb"] * 1024 * 1024)))
+            slide.shapes.add_movie(media, Inches(6), Inches(5), Inches(3), Inches(2), mime_type="video/mp4")
+    prs.save(path)
+    return params
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+把一个批次提取出的所有图片写进一个归档文件，而不是每张图片一个文件。
+
+    zip   不压缩（STORED）的 ZIP，总是带 ZIP64 扩展字段，可以超过 4 GB；
+    tar   不压缩的 POSIX tar；
+    pack  只有图片数据的追加式文件，靠索引读取。
+
+归档文件旁边有一个索引（<归档文件>.index.jsonl），每张图片一行，记录来源文档、在归档中的
+名称（图片-<文档名>/<图片名>，与文件夹输出的相对路径相同）、数据的起始位置和字节数，
+按索引项 seek 之后读 size 个字节就是图片内容（read_entry），不需要解析整个归档。
+
+所有工作进程追加写同一个归档文件：写一张图片时持有进程间的锁，在文件末尾依次写入头、
+数据，再回填头中的大小和 CRC，刷新后追加索引行。文档中途提取失败时，它已经写入的图片
+从索引中删除，位于文件末尾时直接截掉。批次结束后由主进程调用 finish：截掉写了一半的图片，
+把失败文档留下的空隙之后的图片前移（不在索引中的数据不会留在 tar 里），再写入 ZIP 的
+中央目录或 tar 的结束块。
+"""
+import os
+import json
+import time
+import zlib
+import struct
+import tarfile
+import threading
+import contextlib
+
+from image_store import iter_chunks
+
+SINKS = ("zip", "tar", "pack")
+ARCHIVE_NAMES = {"zip": "图片.zip", "tar": "图片.tar", "pack": "图片.pack"}
+INDEX_SUFFIX = ".index.jsonl"
+PACK_MAGIC = b"IMGPACK1"
+BUFFER_SIZE = 1024 * 1024
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+# ZIP 的各个结构，大小都用 ZIP64 扩展字段记录
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+ZIP_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+ZIP64_LOCAL_EXTRA = struct.Struct("<2H2Q")
+ZIP64_CENTRAL_EXTRA = struct.Struct("<2H3Q")
+ZIP64_END = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+ZIP_END = struct.Struct("<4s4H2LH")
+ZIP_VERSION = 45
+ZIP_UTF8 = 0x0800
+ZIP64_EXTRA_ID = 0x0001
+MAX32 = 0xFFFFFFFF
+
+# 进程间的锁，由 init_worker 在每个工作进程中设置；没有设置时只在本进程内互斥
+_lock = threading.Lock()
+# 每个进程中打开的归档文件，写完一张图片就刷新，其他进程随后能看到
+_handles = {}
+
+
+def init_worker(lock):
+    """进程池的 initializer：设置写归档时使用的进程间的锁。"""
+    global _lock
+    _lock = lock
+
+
+def dos_time(timestamp):
+    """ZIP 使用的 (时间, 日期)，早于 1980 年时取 1980-01-01。"""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def zip_local_header(name, crc=0, size=0, timestamp=0):
+    encoded = name.encode("utf-8")
+    mtime, mdate = dos_time(timestamp)
+    extra = ZIP64_LOCAL_EXTRA.pack(ZIP64_EXTRA_ID, 16, size, size)
+    return ZIP_LOCAL_HEADER.pack(b"PK\x03\x04", ZIP_VERSION, ZIP_UTF8, 0, mtime, mdate, crc, MAX32, MAX32,
+                                 len(encoded), len(extra)) + encoded + extra
+
+
+def tar_header(name, size=0, timestamp=0):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(timestamp)
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+class Archive:
+    """
+    一个批次的归档文件。对象本身只记录路径，可以传给工作进程。
+
+    参数:
+        path (str): 归档文件路径，索引为 path + INDEX_SUFFIX。
+        kind (str): zip、tar 或 pack。
+    """
+
+    def __init__(self, path, kind):
+        if kind not in SINKS:
+            raise ValueError("未知的输出方式：%s" % kind)
+        self.path = path
+        self.kind = kind
+        self.index_path = path + INDEX_SUFFIX
+
+    def create(self):
+        """新建（或清空）归档文件和索引，在批次开始前由主进程调用。"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "wb") as f:
+            if self.kind == "pack":
+                f.write(PACK_MAGIC)
+        open(self.index_path, "w", encoding="utf-8").close()
+
+    def writer(self, prefix, document=None):
+        """返回把图片写成 prefix/<图片名> 的写入对象，接口与 image_store 的写入对象相同。"""
+        return ArchiveWriter(self, prefix, document)
+
+    def finish(self):
+        """
+        截掉写了一半的图片，前移空隙之后的图片，写入 ZIP 的中央目录或 tar 的结束块，
+        返回索引项列表。移动过图片时索引按新的位置重写。
+        """
+        entries = read_index(self.path)
+        end = len(PACK_MAGIC) if self.kind == "pack" else 0
+        moved = False
+        with open(self.path, "r+b", buffering=BUFFER_SIZE) as f:
+            # 索引按写入顺序排列，也就是按位置排列；前面的空隙是失败的文档留下的
+            for entry in entries:
+                shift = entry["header"] - end
+                if shift:
+                    move_range(f, entry["header"], entry["end"], end)
+                    for key in ("header", "offset", "end"):
+                        entry[key] -= shift
+                    moved = True
+                end = entry["end"]
+            f.truncate(end)
+            f.seek(end)
+            if self.kind == "tar":
+                f.write(b"\0" * TAR_BLOCK * 2)
+            elif self.kind == "zip":
+                self.write_central_directory(f, entries, end)
+        if moved:
+            write_index(self.index_path, entries)
+        return entries
+
+    @staticmethod
+    def write_central_directory(f, entries, start):
+        for entry in entries:
+            encoded = entry["name"].encode("utf-8")
+            mtime, mdate = dos_time(entry["mtime"])
+            extra = ZIP64_CENTRAL_EXTRA.pack(ZIP64_EXTRA_ID, 24, entry["size"], entry["size"], entry["header"])
+            f.write(ZIP_CENTRAL_HEADER.pack(b"PK\x01\x02", ZIP_VERSION, ZIP_VERSION, ZIP_UTF8, 0, mtime, mdate,
+                                            entry["crc32"], MAX32, MAX32, len(encoded), len(extra), 0, 0, 0, 0, MAX32)
+                    + encoded + extra)
+        end = f.tell()
+        f.write(ZIP64_END.pack(b"PK\x06\x06", ZIP64_END.size - 12, ZIP_VERSION, ZIP_VERSION, 0, 0,
+                               len(entries), len(entries), end - start, start))
+        f.write(ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, end, 1))
+        f.write(ZIP_END.pack(b"PK\x05\x06", 0, 0, 0xFFFF, 0xFFFF, MAX32, MAX32, 0))
+
+
+def move_range(f, start, end, dst):
+    """把文件中 [start, end) 的内容移到 dst（dst < start），按块从前往后拷贝。"""
+    while start < end:
+        f.seek(start)
+        chunk = f.read(min(BUFFER_SIZE, end - start))
+        f.seek(dst)
+        f.write(chunk)
+        start += len(chunk)
+        dst += len(chunk)
+
+
+def archive_handle(path):
+    f = _handles.get(path)
+    if f is None or f.closed:
+        f = _handles[path] = open(path, "r+b", buffering=BUFFER_SIZE)
+    return f
+
+
+class ArchiveWriter:
+    """把一个文档的图片追加写入归档。文档提取失败时（with 块中抛出异常）撤销已经写入的图片。"""
+
+    def __init__(self, archive, prefix, document=None):
+        self.archive = archive
+        self.prefix = prefix
+        self.document = document
+        self.start = None       # 这个文档写入的第一张图片的位置
+        self.headers = set()    # 这个文档写入的图片的头位置，用来找出它的索引行
+
+    def write(self, filename, source):
+        """写入一张图片，source 见 image_store.iter_chunks。返回图片在归档中的名称。"""
+        name = "%s/%s" % (self.prefix, filename)
+        kind = self.archive.kind
+        timestamp = time.time()
+        with _lock:
+            f = archive_handle(self.archive.path)
+            f.seek(0, os.SEEK_END)
+            start = f.tell()
+            try:
+                header = zip_local_header(name) if kind == "zip" else tar_header(name) if kind == "tar" else b""
+                f.write(header)
+                crc = size = 0
+                with contextlib.closing(iter_chunks(source)) as chunks:
+                    for chunk in chunks:
+                        crc = zlib.crc32(chunk, crc)
+                        size += len(chunk)
+                        f.write(chunk)
+                end = start + len(header) + size
+                if kind == "tar" and size % TAR_BLOCK:
+                    f.write(b"\0" * (TAR_BLOCK - size % TAR_BLOCK))
+                    end += TAR_BLOCK - size % TAR_BLOCK
+                if header:
+                    final = (zip_local_header(name, crc, size, timestamp) if kind == "zip"
+                             else tar_header(name, size, timestamp))
+                    if len(final) != len(header):
+                        raise ValueError("图片过大，无法写入 tar：%s" % name)
+                    f.seek(start)
+                    f.write(final)
+                f.flush()
+            except BaseException:
+                f.seek(0, os.SEEK_END)
+                f.truncate(start)
+                f.flush()
+                raise
+            entry = {"document": self.document, "name": name, "offset": start + len(header), "size": size,
+                     "crc32": crc, "header": start, "end": end, "mtime": int(timestamp)}
+            with open(self.archive.index_path, "a", encoding="utf-8") as index:
+                index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.start is None:
+                self.start = start
+            self.headers.add(start)
+        return name
+
+    def discard(self):
+        """
+        撤销这个文档已经写入的图片：删除它的索引行；它的图片之后没有其他文档的图片时截掉
+        归档文件，否则留下的空隙由 finish 去掉。
+        """
+        if not self.headers:
+            return
+        with _lock:
+            entries = read_index(self.archive.path)
+            kept = [entry for entry in entries if entry["header"] not in self.headers]
+            write_index(self.archive.index_path, kept)
+            if all(entry["header"] < self.start for entry in kept):
+                f = archive_handle(self.archive.path)
+                f.seek(0, os.SEEK_END)
+                f.truncate(self.start)
+                f.flush()
+        self.start = None
+        self.headers.clear()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        self.close()
+
+
+def read_index(archive_path):
+    """读取归档的索引，返回索引项列表，按写入顺序排列。"""
+    entries = []
+    with open(archive_path + INDEX_SUFFIX, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+
+def write_index(index_path, entries):
+    """整个重写索引。"""
+    with open(index_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_entry(archive_path, entry, f=None):
+    """按索引项读出一张图片的内容。f 为已经打开的归档文件，读取多张图片时可以复用。"""
+    if f is None:
+        with open(archive_path, "rb") as f:
+            return read_entry(archive_path, entry, f)
+    f.seek(entry["offset"])
+    data = f.read(entry["size"])
+    if len(data) != entry["size"]:
+        raise ValueError("归档文件不完整：%s" % entry["name"])
+    return data
@@ -1,33 +1,25 @@
-import sys
 import os
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
+import argparse
+from image_store import DEDUP_MODES, open_writer
+from ooxml_media import write_pptx_images
 
-def extract_images_from_ppt(ppt_path, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def extract_images_from_ppt(ppt_path, output_dir, dedup=None, store_dir=None):
+    # 按关系从 ZIP 包中直接读取图片，组合、占位符、背景、母版和版式中的图片都包括在内
+    with open_writer(output_dir, dedup, store_dir) as writer:
+        image_count = write_pptx_images(ppt_path, writer)
 
-    presentation = Presentation(ppt_path)
-    image_count = 0
-
-    for slide_index, slide in enumerate(presentation.slides):
-        for shape_index, shape in enumerate(slide.shapes):
-            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                image = shape.image
-                image_bytes = image.blob
-                image_format = image.ext
-
-                image_count += 1
-                image_filename = f"slide_{slide_index+1}_image_{image_count}.{image_format}"
-                image_path = os.path.join(output_dir, image_filename)
-
-                with open(image_path, "wb") as f:
-                    f.write(image_bytes)
-
-    print(f"图片提取完成！共提取 {image_count} 张图片。")
+    if dedup:
+        print(f"图片提取完成！共提取 {image_count} 张图片，其中不同的图片 {len(writer.hashes)} 张，新写入图片库 {writer.stored} 张。")
+    else:
+        print(f"图片提取完成！共提取 {image_count} 张图片。")
 
 if __name__ == "__main__":
-    ppt_file = sys.argv[1]
+    parser = argparse.ArgumentParser(description="提取 pptx 幻灯片中的图片")
+    parser.add_argument("ppt_file")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="相同的图片只保存一次：hardlink 用硬链接，manifest 只写 manifest.jsonl")
+    args = parser.parse_args()
+    ppt_file = args.ppt_file
     output_dir = os.path.join(os.path.dirname(ppt_file), os.path.splitext(os.path.basename(ppt_file))[0])
-    extract_images_from_ppt(ppt_file, output_dir)
+    extract_images_from_ppt(ppt_file, output_dir, args.dedup)
 
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+增量提取的索引，保存在输出目录下的 _index.sqlite 中。
+
+每个提取过的文档记录一行：路径、大小、修改时间、内容的 SHA-256、去重方式、转码设置、
+输出目录和图片数，以及它在输出目录中写出的文件。再次提取同一批文档时：
+
+    大小和修改时间都没变          跳过，只需要 stat，不读文件；
+    大小或修改时间变了、内容没变  只更新记录，不重新提取；
+    内容、去重方式或转码设置变了  删除上次写出的文件后重新提取，输出目录不变；
+    文档已经不存在                删除它上次写出的文件和记录。
+
+新文档的内容哈希在提取成功、记录结果时计算（多读一遍文件），所以复制、同步或杀毒软件
+只改动了修改时间时也不会重新提取。去重模式下图片库（_blobs）中的文件由多个文档共用，
+删除文档时不清理图片库。
+"""
+import os
+import time
+import sqlite3
+
+from image_store import file_sha256
+
+INDEX_NAME = "_index.sqlite"
+COMMIT_INTERVAL = 1.0       # 记录结果后最多隔多久提交一次（秒）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    dedup TEXT,
+    output_dir TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    extracted_at REAL NOT NULL,
+    transcode TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (path, name)
+);
+"""
+
+
+def index_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ExtractIndex:
+    """
+    一个输出目录的提取索引。
+
+    用法：prune 清理已删除的文档，plan 把文档分为未变化、需要重新提取和新文档三类，
+    每个文档提取完成后调用 record（成功）或 forget（失败），最后 close。
+    """
+
+    def __init__(self, output_root, path=None):
+        os.makedirs(output_root, exist_ok=True)
+        self.db = sqlite3.connect(path or os.path.join(output_root, INDEX_NAME))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(documents)")}
+        if "transcode" not in columns:
+            self.db.execute("ALTER TABLE documents ADD COLUMN transcode TEXT")
+        # 路径 -> (大小, 修改时间, 内容哈希, (去重方式, 转码设置), 输出目录, 图片数)
+        self.records = {row[0]: row[1:4] + (row[4:6],) + row[6:] for row in self.db.execute(
+            "SELECT path, size, mtime_ns, sha256, dedup, transcode, output_dir, count FROM documents")}
+        self.fingerprints = {}      # 本次要提取的文档 -> (大小, 修改时间, 内容哈希)
+        self.last_commit = time.monotonic()
+
+    def output_dirs(self):
+        """已经分配给文档的输出目录。"""
+        return {record[4] for record in self.records.values()}
+
+    def remove_outputs(self, key):
+        """删除文档上次写出的文件，输出目录空了时一并删除。"""
+        record = self.records.get(key)
+        if record is None:
+            return
+        output_dir = record[4]
+        for (name,) in self.db.execute("SELECT name FROM outputs WHERE path = ?", (key,)):
+            try:
+                os.remove(os.path.join(output_dir, name))
+            except FileNotFoundError:
+                pass
+        self.db.execute("DELETE FROM outputs WHERE path = ?", (key,))
+        try:
+            os.rmdir(output_dir)
+        except OSError:
+            pass
+
+    def forget(self, path, output_dir=None):
+        """
+        删除文档的输出和记录。
+
+        提取失败时 output_dir 为这次使用的输出目录：plan 已经删除了上次的输出记录，失败的这次
+        写出的文件没有记录，所以删除目录中的所有文件。每个输出目录只分配给一个文档。
+        """
+        key = index_key(path)
+        self.remove_outputs(key)
+        if output_dir is not None and os.path.isdir(output_dir):
+            for entry in os.scandir(output_dir):
+                if entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+            try:
+                os.rmdir(output_dir)
+            except OSError:
+                pass
+        self.db.execute("DELETE FROM documents WHERE path = ?", (key,))
+        self.records.pop(key, None)
+        self.fingerprints.pop(key, None)
+        self.maybe_commit()
+
+    def prune(self, file_paths):
+        """删除已经不存在的文档的输出和记录，返回这些文档的路径。本次要处理的文档不需要检查。"""
+        current = {index_key(path) for path in file_paths}
+        removed = [key for key in self.records if key not in current and not os.path.exists(key)]
+        for key in removed:
+            self.forget(key)
+        self.commit()
+        return removed
+
+    def plan(self, file_paths, dedup=None, transcode=None):
+        """
+        返回 (未变化, 需要重新提取, 新文档)：未变化的为 [(路径, 图片数)]，需要重新提取的为
+        [(路径, 输出目录)]，它们上次写出的文件已经删除；新文档为路径列表。
+        transcode 为转码设置的字符串表示（transcode.settings_key），不转码时为 None。
+        """
+        unchanged, changed, new = [], [], []
+        for path in file_paths:
+            key = index_key(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                new.append(path)
+                continue
+            record = self.records.get(key)
+            if record is None:
+                self.fingerprints[key] = (st.st_size, st.st_mtime_ns, None)
+                new.append(path)
+                continue
+            size, mtime_ns, sha256, settings, output_dir, count = record
+            fresh = settings == (dedup, transcode) and os.path.isdir(output_dir)
+            if fresh and (size, mtime_ns) == (st.st_size, st.st_mtime_ns):
+                unchanged.append((path, count))
+                continue
+            new_sha256 = file_sha256(path)
+            if fresh and sha256 is not None and sha256 == new_sha256:
+                # 只是修改时间变了
+                self.db.execute("UPDATE documents SET size = ?, mtime_ns = ? WHERE path = ?",
+                                (st.st_size, st.st_mtime_ns, key))
+                self.records[key] = (st.st_size, st.st_mtime_ns) + record[2:]
+                unchanged.append((path, count))
+                continue
+            self.remove_outputs(key)
+            self.fingerprints[key] = (st.st_size, st.st_mtime_ns, new_sha256)
+            changed.append((path, output_dir))
+        self.commit()
+        return unchanged, changed, new
+
+    def record(self, path, output_dir, count, dedup=None, transcode=None):
+        """
+        记录一次成功的提取，输出目录中现有的文件都记为这个文档的输出。
+        新文档在这里计算内容哈希；计算前后大小或修改时间变了（提取时文档被改动）时不记录哈希，
+        下次按内容变化重新提取。
+        """
+        key = index_key(path)
+        size, mtime_ns, sha256 = self.fingerprints.pop(key, None) or (None, None, None)
+        if sha256 is None:
+            try:
+                sha256 = file_sha256(path)
+                st = os.stat(path)
+            except OSError:
+                sha256, st = None, None
+            if size is None and st is not None:
+                size, mtime_ns = st.st_size, st.st_mtime_ns
+            if st is None or (size, mtime_ns) != (st.st_size, st.st_mtime_ns):
+                sha256 = None
+        self.db.execute("INSERT OR REPLACE INTO documents (path, size, mtime_ns, sha256, dedup, output_dir, count, "
+                        "extracted_at, transcode) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, size, mtime_ns, sha256, dedup, output_dir, count, time.time(), transcode))
+        self.db.execute("DELETE FROM outputs WHERE path = ?", (key,))
+        names = [entry.name for entry in os.scandir(output_dir) if entry.is_file()] if os.path.isdir(output_dir) else []
+        self.db.executemany("INSERT INTO outputs VALUES (?, ?)", [(key, name) for name in names])
+        self.records[key] = (size, mtime_ns, sha256, (dedup, transcode), output_dir, count)
+        self.maybe_commit()
+
+    def maybe_commit(self):
+        if time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
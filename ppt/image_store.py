@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+提取出的图片的写入方式，office_img.py 和 extract_images_cmd.py 共用。
+
+默认每张图片写一个文件（DirectoryWriter）。去重模式（DedupWriter）下图片按内容的 SHA-256
+保存在一个共用的图片库中，同一批次里重复出现的图片（每页都有的 logo、背景）只写一次：
+
+    hardlink  输出目录中的文件是图片库中文件的硬链接，不支持硬链接时退回为复制；
+    manifest  输出目录中不放图片，只写 manifest.jsonl，每行记录一次出现对应的库文件。
+
+图片库按哈希的前两位分子目录。哈希在写入临时文件的同时计算，不需要把图片整个读进内存；
+多个进程同时写同一张图片时，只有一个 os.link 能成功，其余的直接丢弃临时文件。
+"""
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import contextlib
+
+DEDUP_MODES = ("hardlink", "manifest")
+STORE_DIR_NAME = "_blobs"
+MANIFEST_NAME = "manifest.jsonl"
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(source):
+    """
+    source 为 bytes、memoryview、可读的文件对象或产出块的迭代器，按块产出内容；
+    bytes 和 memoryview 按切片产出，不拷贝。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with memoryview(source) as view:
+            for start in range(0, len(view), CHUNK_SIZE):
+                with view[start:start + CHUNK_SIZE] as chunk:
+                    yield chunk
+        return
+    if not hasattr(source, "read"):
+        yield from source
+        return
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def file_sha256(path):
+    """文件内容的 SHA-256，按块读取。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remove_existing(path):
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+class DirectoryWriter:
+    """每张图片在输出目录中写一个文件。"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, filename, source):
+        """写入一张图片，source 见 iter_chunks。返回图片路径。"""
+        path = os.path.join(self.output_dir, filename)
+        # 之前去重运行留下的可能是图片库的硬链接，直接覆盖写会改掉库中的文件
+        remove_existing(path)
+        with open(path, "wb") as f, contextlib.closing(iter_chunks(source)) as chunks:
+            for chunk in chunks:
+                f.write(chunk)
+        return path
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DedupWriter(DirectoryWriter):
+    """
+    按内容去重的写入方式。
+
+    参数:
+        output_dir (str): 这个文档的输出目录。
+        store_dir (str): 图片库目录，同一批次的所有文档（包括其他进程）共用。
+        mode (str): hardlink 或 manifest，见模块说明。
+    """
+
+    def __init__(self, output_dir, store_dir, mode="hardlink"):
+        if mode not in DEDUP_MODES:
+            raise ValueError("未知的去重方式：%s" % mode)
+        super().__init__(output_dir)
+        self.store_dir = store_dir
+        self.mode = mode
+        self.stored = 0         # 新写入图片库的图片数
+        self.hashes = set()     # 这个文档中出现过的不同图片
+        self.manifest = []
+        os.makedirs(store_dir, exist_ok=True)
+
+    def store(self, filename, source):
+        """把图片写入图片库，返回 (库文件路径, sha256, 字节数)。"""
+        ext = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+        tmp = os.path.join(self.store_dir, uuid.uuid4().hex + ".tmp")
+        try:
+            with open(tmp, "xb") as f, contextlib.closing(iter_chunks(source)) as chunks:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            self.hashes.add(sha256)
+            blob = os.path.join(self.store_dir, sha256[:2], sha256 + ext)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    os.link(tmp, blob)
+                    self.stored += 1
+                except FileExistsError:
+                    # 另一个进程刚刚写入了同样的图片
+                    pass
+                except OSError:
+                    # 文件系统不支持硬链接
+                    if not os.path.exists(blob):
+                        os.replace(tmp, blob)
+                        self.stored += 1
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return blob, sha256, size
+
+    def write(self, filename, source):
+        """写入一张图片，返回输出目录中的路径（manifest 模式下为库文件路径）。"""
+        blob, sha256, size = self.store(filename, source)
+        if self.mode == "manifest":
+            self.manifest.append({"name": filename, "blob": os.path.relpath(blob, self.output_dir),
+                                  "sha256": sha256, "size": size})
+            return blob
+        path = os.path.join(self.output_dir, filename)
+        remove_existing(path)
+        try:
+            os.link(blob, path)
+        except OSError:
+            shutil.copyfile(blob, path)
+        return path
+
+    def close(self):
+        """manifest 模式下写出 manifest.jsonl。"""
+        if self.mode != "manifest":
+            return
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            for entry in self.manifest:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def open_writer(output_dir, dedup=None, store_dir=None):
+    """
+    返回一个文档的图片写入对象。
+
+    参数:
+        dedup (str): None 表示不去重，否则为 hardlink 或 manifest。
+        store_dir (str): 图片库目录，默认为输出目录同级的 _blobs。
+    """
+    if dedup is None:
+        return DirectoryWriter(output_dir)
+    if store_dir is None:
+        store_dir = os.path.join(os.path.dirname(os.path.abspath(output_dir)), STORE_DIR_NAME)
+    return DedupWriter(output_dir, store_dir, dedup)
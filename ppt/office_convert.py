@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+把 .doc / .xls / .ppt 转换为 .docx / .xlsx / .pptx 的常驻转换进程。
+
+原来每个文件都要 CoInitialize、启动一次 Word / Excel / PowerPoint、打开、另存为再 Quit，
+应用程序的启动时间占了旧格式批次的大部分。这里由 ConverterPool 启动若干个常驻的转换进程，
+每个进程只创建一次转换后端（一个应用程序实例或一个无界面的 LibreOffice），从任务队列中
+依次取文件转换。转换进程处理 recycle_after 个文件后退出并由新的进程接替（释放应用程序
+积累的内存和句柄）；进程崩溃或单个文件超时时，正在转换的文件重试一次，之后记为失败。
+
+转换后端按名称注册在 BACKENDS 中：
+
+    com          Windows 上通过 pywin32 调用 Office；
+    libreoffice  无界面的 LibreOffice，有 Python UNO 时连接一个常驻的 soffice，否则每个文件
+                 调用一次 soffice --convert-to（共用同一个用户配置目录，启动较快）；
+    fake         直接复制文件，用于测试，可以模拟耗时和崩溃。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import collections
+import multiprocessing
+import multiprocessing.connection
+
+# 后端注册表：名称 -> 后端类
+BACKENDS = {}
+
+RECYCLE_AFTER = 50          # 每个转换进程处理的文件数
+TIMEOUT = 300               # 单个文件的转换超时（秒）
+MAX_ATTEMPTS = 2            # 转换进程崩溃或超时时，每个文件最多尝试的次数
+POLL_INTERVAL = 0.2
+# 旧格式 -> 新格式的扩展名
+NEW_EXTS = {".doc": ".docx", ".xls": ".xlsx", ".ppt": ".pptx"}
+
+
+def register_backend(name):
+    """注册一个转换后端。"""
+    def decorator(cls):
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def new_format_path(file_path):
+    """旧格式文件转换后的默认文件名（原文件名加 x）。"""
+    return file_path + "x"
+
+
+@register_backend("com")
+class ComBackend:
+    """
+    通过 COM 调用 Office。每个应用程序在第一次用到时用 DispatchEx 单独启动，之后一直复用。
+
+    PowerPoint 在一台机器上只有一个实例，多个转换进程会共用它，一个进程 Quit 时其他进程
+    打开的文稿也会被关掉；含 .ppt 的批次应只用一个转换进程（ConverterPool 的默认值）。
+    """
+    PROG_IDS = {".doc": "Word.Application", ".xls": "Excel.Application", ".ppt": "PowerPoint.Application"}
+
+    def __init__(self):
+        self.apps = {}
+
+    def start(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def app(self, ext):
+        prog_id = self.PROG_IDS[ext]
+        if prog_id not in self.apps:
+            from win32com.client import DispatchEx
+            app = DispatchEx(prog_id)
+            if ext != ".ppt":
+                # PowerPoint 不能隐藏窗口，打开文稿时用 WithWindow=False
+                app.Visible = False
+                app.DisplayAlerts = False
+            self.apps[prog_id] = app
+        return self.apps[prog_id]
+
+    def convert(self, src, dst):
+        src, dst = os.path.abspath(src), os.path.abspath(dst)
+        ext = os.path.splitext(src)[1].lower()
+        if ext == ".doc":
+            doc = self.app(ext).Documents.Open(src, ReadOnly=True)
+            try:
+                doc.SaveAs(dst, FileFormat=12)
+            finally:
+                doc.Close(False)
+        elif ext == ".xls":
+            wb = self.app(ext).Workbooks.Open(src, ReadOnly=True)
+            try:
+                wb.SaveAs(dst, FileFormat=51)
+            finally:
+                wb.Close(False)
+        elif ext == ".ppt":
+            ppt = self.app(ext).Presentations.Open(src, ReadOnly=True, WithWindow=False)
+            try:
+                ppt.SaveAs(dst, 24)
+            finally:
+                ppt.Close()
+        else:
+            raise ValueError("不支持的文件类型：%s" % ext)
+
+    def close(self):
+        for app in self.apps.values():
+            try:
+                app.Quit()
+            except Exception:
+                pass
+        self.apps = {}
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+
+def find_soffice():
+    """查找 LibreOffice 的可执行文件，找不到时返回 None。"""
+    for name in ("soffice", "libreoffice"):
+        path = shutil.which(name)
+        if path:
+            return path
+    for base in (os.environ.get("PROGRAMFILES"), os.environ.get("PROGRAMFILES(X86)")):
+        if base:
+            path = os.path.join(base, "LibreOffice", "program", "soffice.exe")
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def file_url(path):
+    from pathlib import Path
+    return Path(os.path.abspath(path)).as_uri()
+
+
+@register_backend("libreoffice")
+class LibreOfficeBackend:
+    """无界面的 LibreOffice，每个转换进程使用自己的用户配置目录，互不干扰。"""
+    FILTERS = {".doc": "MS Word 2007 XML", ".xls": "Calc MS Excel 2007 XML", ".ppt": "Impress MS PowerPoint 2007 XML"}
+    CONNECT_TIMEOUT = 60
+
+    def __init__(self, soffice=None):
+        self.soffice = soffice or find_soffice()
+        self.profile = None
+        self.process = None
+        self.desktop = None
+
+    def start(self):
+        if self.soffice is None:
+            raise RuntimeError("找不到 LibreOffice（soffice）")
+        self.profile = tempfile.mkdtemp(prefix="office_convert_")
+        try:
+            import uno
+        except ImportError:
+            return
+        pipe = "office_convert_%d" % os.getpid()
+        self.process = subprocess.Popen(
+            [self.soffice, "-env:UserInstallation=" + file_url(self.profile), "--headless", "--invisible",
+             "--nologo", "--norestore", "--accept=pipe,name=%s;urp;StarOffice.ComponentContext" % pipe],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + self.CONNECT_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve("uno:pipe,name=%s;urp;StarOffice.ComponentContext" % pipe)
+                break
+            except Exception:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise RuntimeError("无法连接 LibreOffice")
+                time.sleep(0.5)
+        self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def convert(self, src, dst):
+        ext = os.path.splitext(src)[1].lower()
+        if ext not in self.FILTERS:
+            raise ValueError("不支持的文件类型：%s" % ext)
+        if self.desktop is None:
+            self.convert_cli(src, dst)
+            return
+        from com.sun.star.beans import PropertyValue
+
+        def props(**values):
+            items = []
+            for name, value in values.items():
+                item = PropertyValue()
+                item.Name, item.Value = name, value
+                items.append(item)
+            return tuple(items)
+
+        doc = self.desktop.loadComponentFromURL(file_url(src), "_blank", 0, props(Hidden=True, ReadOnly=True))
+        if doc is None:
+            raise RuntimeError("LibreOffice 无法打开文件")
+        try:
+            doc.storeToURL(file_url(dst), props(FilterName=self.FILTERS[ext], Overwrite=True))
+        finally:
+            doc.close(True)
+
+    def convert_cli(self, src, dst):
+        """没有 UNO 时用命令行转换，输出到临时目录后再移到 dst。"""
+        outdir = tempfile.mkdtemp(dir=self.profile)
+        try:
+            subprocess.run([self.soffice, "-env:UserInstallation=" + file_url(self.profile), "--headless",
+                            "--convert-to", NEW_EXTS[os.path.splitext(src)[1].lower()].lstrip("."),
+                            "--outdir", outdir, os.path.abspath(src)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=TIMEOUT, check=True)
+            outputs = os.listdir(outdir)
+            if not outputs:
+                raise RuntimeError("LibreOffice 没有生成文件")
+            shutil.move(os.path.join(outdir, outputs[0]), dst)
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def close(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.profile is not None:
+            shutil.rmtree(self.profile, ignore_errors=True)
+            self.profile = None
+
+
+@register_backend("fake")
+class FakeBackend:
+    """
+    测试用的后端：把源文件复制为目标文件。
+
+    参数:
+        delay (float): 每个文件的耗时（秒）。
+        start_delay (float): 启动耗时（秒），模拟应用程序的冷启动。
+        crash_every (int): 每个进程每转换这么多个文件就直接退出一次，模拟崩溃；0 表示不崩溃。
+        fail_names (list): 文件名包含其中任何一个时转换失败。
+    """
+
+    def __init__(self, delay=0.0, start_delay=0.0, crash_every=0, fail_names=()):
+        self.delay = delay
+        self.start_delay = start_delay
+        self.crash_every = crash_every
+        self.fail_names = fail_names
+        self.count = 0
+
+    def start(self):
+        time.sleep(self.start_delay)
+
+    def convert(self, src, dst):
+        self.count += 1
+        if self.crash_every and self.count % self.crash_every == 0:
+            os._exit(3)
+        time.sleep(self.delay)
+        if any(name in os.path.basename(src) for name in self.fail_names):
+            raise RuntimeError("模拟的转换失败")
+        shutil.copyfile(src, dst)
+
+    def close(self):
+        pass
+
+
+def default_backend():
+    """Windows 上装了 pywin32 时用 com，否则有 LibreOffice 时用 libreoffice。"""
+    if sys.platform == "win32":
+        try:
+            import win32com.client  # noqa: F401
+            return "com"
+        except ImportError:
+            pass
+    if find_soffice():
+        return "libreoffice"
+    return "com" if sys.platform == "win32" else "libreoffice"
+
+
+def worker_main(backend_name, options, recycle_after, conn):
+    """
+    转换进程：启动一次后端，依次转换从管道收到的 (任务号, 源文件, 目标文件)，每个回复
+    (任务号, 错误信息)；处理 recycle_after 个文件或收到 None 后退出。
+    """
+    try:
+        backend = BACKENDS[backend_name](**options)
+        backend.start()
+    except Exception as e:
+        conn.send((None, "转换后端启动失败：%s" % e))
+        return
+    try:
+        for _ in range(recycle_after):
+            try:
+                task = conn.recv()
+            except EOFError:
+                break
+            if task is None:
+                break
+            job_id, src, dst = task
+            try:
+                backend.convert(src, dst)
+                error = None
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            conn.send((job_id, error))
+    finally:
+        try:
+            backend.close()
+        except Exception:
+            pass
+
+
+class Worker:
+    """父进程中记录的一个转换进程。"""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.job_id = None      # 正在转换的任务
+        self.since = None       # 开始转换的时间
+        self.done = 0           # 已经发出的任务数
+        self.retiring = False   # 已达到 recycle_after，等它退出
+
+
+class ConverterPool:
+    """
+    常驻转换进程池。
+
+    参数:
+        backend (str): BACKENDS 中的后端名，默认见 default_backend。
+        workers (int): 转换进程数，默认为 1。
+        recycle_after (int): 每个转换进程处理的文件数，之后换一个新进程。
+        timeout (float): 单个文件的超时（秒），超时的进程会被结束，按崩溃处理。
+        options: 传给后端的参数。
+
+    每个转换进程通过自己的管道接收任务，任务由父进程逐个分派，因此进程崩溃时能确定是哪个
+    文件。started / recycled / crashed 记录启动、正常轮换和崩溃（含超时）的进程数。
+    """
+
+    def __init__(self, backend=None, workers=1, recycle_after=RECYCLE_AFTER, timeout=TIMEOUT, **options):
+        self.backend = backend or default_backend()
+        if self.backend not in BACKENDS:
+            raise ValueError("未知的转换后端：%s" % self.backend)
+        self.workers = max(1, workers)
+        self.recycle_after = max(1, recycle_after)
+        self.timeout = timeout
+        self.options = options
+        self.started = 0
+        self.recycled = 0
+        self.crashed = 0
+
+    def spawn(self):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=worker_main, args=(self.backend, self.options, self.recycle_after, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        self.started += 1
+        return Worker(process, conn)
+
+    def iter_convert(self, jobs, cancel_event=None):
+        """
+        转换 [(源文件, 目标文件), ...]，按完成顺序逐个产出 (源文件, 目标文件, 错误信息)，
+        成功时错误信息为 None。cancel_event 被设置后不再开始新的文件，未开始的错误信息为"已取消"。
+        """
+        jobs = list(jobs)
+        pending = collections.deque(range(len(jobs)))
+        attempts = dict.fromkeys(pending, 0)
+        unfinished = set(pending)
+        workers = []
+
+        def finish(job_id, error):
+            unfinished.discard(job_id)
+            return jobs[job_id][0], jobs[job_id][1], error
+
+        try:
+            while unfinished:
+                if cancel_event is not None and cancel_event.is_set():
+                    while pending:
+                        yield finish(pending.popleft(), "已取消")
+                # 分派任务，没有空闲的进程时启动新的进程
+                while pending:
+                    idle = [w for w in workers if w.job_id is None and not w.retiring]
+                    if not idle:
+                        if len([w for w in workers if not w.retiring]) >= self.workers:
+                            break
+                        workers.append(self.spawn())
+                        continue
+                    worker = idle[0]
+                    job_id = pending.popleft()
+                    attempts[job_id] += 1
+                    worker.job_id, worker.since = job_id, time.monotonic()
+                    worker.done += 1
+                    worker.retiring = worker.done >= self.recycle_after
+                    try:
+                        worker.conn.send((job_id,) + tuple(jobs[job_id]))
+                    except OSError:
+                        # 进程已经退出（例如后端无法启动）：不再分派任务，等它退出后按崩溃处理，
+                        # 管道中的启动错误会在下面读出
+                        worker.retiring = True
+                if not workers:
+                    break
+                multiprocessing.connection.wait([w.conn for w in workers] + [w.process.sentinel for w in workers],
+                                                timeout=POLL_INTERVAL)
+                now = time.monotonic()
+                for worker in list(workers):
+                    if (self.timeout and worker.job_id is not None and now - worker.since > self.timeout
+                            and worker.process.is_alive()):
+                        worker.process.kill()
+                    # 先判断是否已经退出再读取管道，退出前发出的结果都已经在管道中
+                    alive = worker.process.is_alive()
+                    try:
+                        while worker.conn.poll():
+                            job_id, error = worker.conn.recv()
+                            if job_id is None:
+                                # 后端无法启动，其余的文件也无法转换
+                                pending.clear()
+                                worker.job_id = None
+                                for failed in sorted(unfinished):
+                                    yield finish(failed, error)
+                                break
+                            worker.job_id = None
+                            if job_id in unfinished:
+                                yield finish(job_id, error)
+                    except (EOFError, OSError):
+                        pass
+                    if alive:
+                        continue
+                    worker.process.join()
+                    worker.conn.close()
+                    workers.remove(worker)
+                    if worker.job_id is None:
+                        self.recycled += 1
+                        continue
+                    self.crashed += 1
+                    if worker.job_id not in unfinished:
+                        continue
+                    if attempts[worker.job_id] < MAX_ATTEMPTS:
+                        pending.appendleft(worker.job_id)
+                    else:
+                        yield finish(worker.job_id, "转换进程异常退出（退出码 %s）" % worker.process.exitcode)
+        finally:
+            for worker in workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+            deadline = time.monotonic() + 10
+            for worker in workers:
+                worker.process.join(max(0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join()
+                worker.conn.close()
+
+    def convert(self, src, dst=None):
+        """转换一个文件，返回目标文件路径；失败时抛出 RuntimeError。"""
+        dst = dst or new_format_path(src)
+        for _, _, error in self.iter_convert([(src, dst)]):
+            if error is not None:
+                raise RuntimeError(error)
+        return dst
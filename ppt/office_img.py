@@ -1,13 +1,22 @@
 import os
+import queue
+import shutil
+import tempfile
+import threading
+import multiprocessing
 import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import TkinterDnD, DND_FILES
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-import zipfile
-from PyPDF2 import PdfReader
-import pythoncom
-from win32com.client import Dispatch
+from archive_sink import ARCHIVE_NAMES, Archive, init_worker
+from extract_index import ExtractIndex
+from image_store import STORE_DIR_NAME, open_writer
+from office_convert import NEW_EXTS, ConverterPool
+from ole_media import extract_ole_images, write_ole_images
+from ooxml_media import extract_pptx_images, extract_zip_media, write_pptx_images, write_zip_media
+from pdf_img import extract_pdf_images, write_pdf_images
+from transcode import CACHE_DIR_NAME as TRANSCODE_CACHE_DIR_NAME, transcode_dir
+from transcode import check_settings as check_transcode_settings, settings_key as transcode_settings_key
 
 def select_file():
     file_path = filedialog.askopenfilename(filetypes=[("Office and PDF files", "*.pptx *.docx *.xlsx *.pdf *.doc *.xls *.ppt")])
@@ -36,135 +45,339 @@ def get_supported_files(folder, selected_types):
                 files.append(os.path.join(root, f))
     return files
 
-def convert_to_office_new_format(file_path):
-    pythoncom.CoInitialize()
-    ext = os.path.splitext(file_path)[1].lower()
-    new_path = file_path + 'x'
+def extract_images_from_ppt(ppt_path, output_dir, dedup=None, store_dir=None):
+    return extract_pptx_images(ppt_path, output_dir, dedup, store_dir)
+
+def extract_images_from_word(word_path, output_dir, dedup=None, store_dir=None):
+    return extract_zip_media(word_path, "word/media/", output_dir, dedup, store_dir)
+
+def extract_images_from_excel(excel_path, output_dir, dedup=None, store_dir=None):
+    return extract_zip_media(excel_path, "xl/media/", output_dir, dedup, store_dir)
+
+def extract_images_from_legacy(path, output_dir, dedup=None, store_dir=None):
+    return extract_ole_images(path, output_dir, dedup, store_dir)
+
+def extract_images_from_pdf(pdf_path, output_dir, dedup=None, store_dir=None, workers=None):
+    return extract_pdf_images(pdf_path, output_dir, dedup, store_dir, workers)
+
+LEGACY_EXTS = ['.doc', '.xls', '.ppt']
+# 界面上的去重选项 -> image_store 的去重方式
+DEDUP_CHOICES = {"不去重": None, "硬链接": "hardlink", "清单": "manifest"}
+# 界面上的转码选项 -> transcode 的目标格式
+TRANSCODE_CHOICES = {"保持原格式": None, "PNG": "png", "WebP": "webp", "JPEG": "jpeg"}
+# 界面上的输出方式 -> archive_sink 的归档类型，None 为每张图片一个文件
+SINK_CHOICES = {"文件夹": None, "ZIP": "zip", "TAR": "tar", "单文件包": "pack"}
+# 界面上的旧格式处理方式 -> office_convert 的转换后端，None 为直接从复合文档中提取，auto 为自动选择
+LEGACY_CHOICES = {"直接读取": None, "转换（自动选择）": "auto", "Office 转换": "com", "LibreOffice 转换": "libreoffice"}
+
+def write_images(source, writer, pdf_workers=1):
+    """按扩展名把 source 中的图片交给 writer 写出，返回图片数；不支持的类型返回 None。"""
+    ext = os.path.splitext(source)[1].lower()
+    if ext in LEGACY_EXTS:
+        return write_ole_images(source, writer)
+    if ext == '.pptx':
+        return write_pptx_images(source, writer)
+    if ext == '.docx':
+        return write_zip_media(source, "word/media/", writer)
+    if ext == '.xlsx':
+        return write_zip_media(source, "xl/media/", writer)
+    if ext == '.pdf':
+        return write_pdf_images(source, writer, pdf_workers)
+    return None
+
+def extract_file(file_path, output_dir, dedup=None, store_dir=None, pdf_workers=1, source=None, transcode=None,
+                 archive=None):
+    """
+    提取一个文件中的图片，在工作进程中执行。返回 (文件路径, 图片数, 错误信息)，成功时错误信息为 None。
+    dedup 和 store_dir 见 image_store.open_writer；pdf_workers 为 PDF 页面解码的进程数。
+    source 为旧格式文件转换好的新格式文件；不提供时旧格式文件直接从复合文档中提取（ole_media）。
+    transcode 为转码设置（见 transcode 模块），提取后在本进程中依次把输出目录中的图片转码，
+    缓存放在输出目录同级的 _transcoded 中；多个文件的转码由外层进程池并行，不再嵌套进程池。
+    archive 为 archive_sink.Archive 时图片写入归档，名称为 <输出目录名>/<图片名>，不创建输出目录。
+    """
     try:
-        if ext == '.doc':
-            word = Dispatch('Word.Application')
-            word.Visible = False
-            doc = word.Documents.Open(file_path)
-            doc.SaveAs(new_path, FileFormat=12)
-            doc.Close()
-            word.Quit()
-        elif ext == '.xls':
-            excel = Dispatch('Excel.Application')
-            excel.Visible = False
-            wb = excel.Workbooks.Open(file_path)
-            wb.SaveAs(new_path, FileFormat=51)
-            wb.Close()
-            excel.Quit()
-        elif ext == '.ppt':
-            powerpoint = Dispatch('PowerPoint.Application')
-            powerpoint.Visible = False
-            ppt = powerpoint.Presentations.Open(file_path, WithWindow=False)
-            ppt.SaveAs(new_path, FileFormat=24)
-            ppt.Close()
-            powerpoint.Quit()
+        if archive is not None:
+            writer = archive.writer(os.path.basename(output_dir), file_path)
         else:
-            return None
-        return new_path
-    except Exception:
-        return None
+            os.makedirs(output_dir, exist_ok=True)
+            writer = open_writer(output_dir, dedup, store_dir)
+        with writer:
+            count = write_images(source or file_path, writer, pdf_workers)
+        if count is None:
+            return file_path, 0, "不支持的文件类型"
+        if transcode:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(output_dir)), TRANSCODE_CACHE_DIR_NAME)
+            transcode_dir(output_dir, transcode, cache_dir, dedup == "hardlink")
+        return file_path, count, None
+    except Exception as e:
+        return file_path, 0, str(e)
 
-def extract_images_from_ppt(ppt_path, output_dir):
-    presentation = Presentation(ppt_path)
-    image_count = 0
-    for slide_index, slide in enumerate(presentation.slides):
-        for shape in slide.shapes:
-            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                image = shape.image
-                image_bytes = image.blob
-                image_format = image.ext
-                image_count += 1
-                image_filename = f"slide_{slide_index+1}_image_{image_count}.{image_format}"
-                image_path = os.path.join(output_dir, image_filename)
-                with open(image_path, "wb") as f:
-                    f.write(image_bytes)
-    return image_count
-
-def extract_images_from_word(word_path, output_dir):
-    count = 0
-    with zipfile.ZipFile(word_path) as docx_zip:
-        for name in docx_zip.namelist():
-            if name.startswith("word/media/"):
-                img_data = docx_zip.read(name)
-                img_filename = os.path.join(output_dir, os.path.basename(name))
-                with open(img_filename, "wb") as f:
-                    f.write(img_data)
-                count += 1
-    return count
-
-def extract_images_from_excel(excel_path, output_dir):
-    count = 0
-    with zipfile.ZipFile(excel_path) as xlsx_zip:
-        for name in xlsx_zip.namelist():
-            if name.startswith("xl/media/"):
-                img_data = xlsx_zip.read(name)
-                img_filename = os.path.join(output_dir, os.path.basename(name))
-                with open(img_filename, "wb") as f:
-                    f.write(img_data)
-                count += 1
-    return count
-
-def extract_images_from_pdf(pdf_path, output_dir):
-    reader = PdfReader(pdf_path)
-    image_count = 0
-    for page_index, page in enumerate(reader.pages):
-        if '/XObject' in page['/Resources']:
-            xObject = page['/Resources']['/XObject'].get_object()
-            for obj in xObject:
-                if xObject[obj]['/Subtype'] == '/Image':
-                    image_data = xObject[obj].get_data()
-                    if '/Filter' in xObject[obj]:
-                        filter_name = xObject[obj]['/Filter']
-                        if filter_name == '/DCTDecode':
-                            image_format = 'jpg'
-                        elif filter_name == '/JPXDecode':
-                            image_format = 'jp2'
-                        elif filter_name == '/FlateDecode':
-                            image_format = 'png'
-                        else:
-                            image_format = 'jpg'
-                    else:
-                        image_format = 'bin'
-                    image_count += 1
-                    image_filename = f"page_{page_index+1}_image_{image_count}.{image_format}"
-                    image_path = os.path.join(output_dir, image_filename)
-                    with open(image_path, "wb") as f:
-                        f.write(image_data)
-    return image_count
-
-def process_files(file_paths, output_root):
-    results = []
+def plan_output_dirs(file_paths, output_root, used=None):
+    """
+    每个文件一个输出目录（图片-文件名），重名时加序号，保证各个工作进程写不同的目录。
+    used 为已经被占用的目录名（normcase 后），不会再分配。
+    """
+    jobs = []
+    used = set(used or ())
     for file_path in file_paths:
-        ext = os.path.splitext(file_path)[1].lower()
         file_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_dir = os.path.join(output_root, f"图片-{file_name}")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        if ext in ['.doc', '.xls', '.ppt']:
-            new_file_path = convert_to_office_new_format(file_path)
-            if new_file_path and os.path.exists(new_file_path):
-                file_path = new_file_path
-                ext = os.path.splitext(file_path)[1].lower()
+        dir_name = f"图片-{file_name}"
+        index = 1
+        while os.path.normcase(dir_name) in used:
+            index += 1
+            dir_name = f"图片-{file_name}-{index}"
+        used.add(os.path.normcase(dir_name))
+        jobs.append((file_path, os.path.join(output_root, dir_name)))
+    return jobs
+
+def convert_legacy(converter, jobs, temp_dir, submit, results, stop_event):
+    """
+    在后台线程中用常驻转换进程依次转换旧格式文件，每转换好一个就提交提取；
+    转换失败的文件直接把结果放进 results。
+    """
+    pairs = []
+    outputs = {}
+    for index, (file_path, output_dir) in enumerate(jobs):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        converted = os.path.join(temp_dir, f"{index}_{name}{NEW_EXTS[os.path.splitext(file_path)[1].lower()]}")
+        pairs.append((file_path, converted))
+        outputs[file_path] = output_dir
+    try:
+        for file_path, converted, error in converter.iter_convert(pairs, stop_event):
+            output_dir = outputs[file_path]
+            if error is None and not os.path.exists(converted):
+                error = "无法转换为新格式"
+            if error is None:
+                submit(file_path, output_dir, converted)
+            else:
+                results.put((file_path, 0, error))
+            # 提交成功后才移除，submit 抛出异常时这个文件也由下面补上结果
+            del outputs[file_path]
+    except Exception as e:
+        for file_path in outputs:
+            results.put((file_path, 0, str(e)))
+
+def iter_process_files(file_paths, output_root, workers=None, cancel_event=None, dedup=None, converter=None,
+                       incremental=False, transcode=None, sink=None, pdf_workers=1):
+    """
+    多进程并行提取，按完成顺序逐个产出 (文件路径, 图片数, 错误信息)。
+
+    workers 为进程数，默认为 CPU 核数。.doc/.xls/.ppt 默认直接从复合文档中提取，不需要 Office；
+    提供 converter（office_convert.ConverterPool）时改为先由常驻转换进程转换为新格式（保存在
+    临时目录中，结束后删除），转换好的文件再和其他文件一样并行提取。
+    cancel_event 被设置后不再开始新的文件，未开始的文件错误信息为"已取消"。
+    dedup 为 hardlink 或 manifest 时整个批次共用 output_root 下的一个图片库，每张不同的图片只写一次。
+    incremental 为 True 时使用 output_root 下的提取索引（见 extract_index）：未变化的文件直接
+    产出上次的图片数，已删除的文件的输出会被清理。
+    transcode 为转码设置（见 transcode 模块），每个文件提取后在同一个工作进程中转码；清单去重
+    模式下输出目录中没有图片，不能转码。
+    sink 为 zip、tar 或 pack 时整个批次的图片写入 output_root 下的一个归档文件（见 archive_sink），
+    旁边的索引记录每张图片的位置；归档输出不支持去重、转码和增量提取。
+    pdf_workers 为每个 PDF 解码页面的进程数，默认为 1，只用外层进程池；大于 1 时每个提取进程
+    中再启动一个进程池，只适合文件很少、PDF 很大的批次。
+    """
+    if transcode:
+        transcode = check_transcode_settings(transcode)
+        if dedup == "manifest":
+            raise ValueError("清单模式下不能转码")
+    if sink:
+        if dedup or transcode or incremental:
+            raise ValueError("输出到归档文件时不能去重、转码或增量提取")
+        archive = Archive(os.path.join(output_root, ARCHIVE_NAMES[sink]), sink)
+        archive.create()
+        try:
+            yield from iter_extract_jobs(plan_output_dirs(file_paths, output_root), output_root, workers,
+                                         cancel_event, converter=converter, archive=archive,
+                                         pdf_workers=pdf_workers)
+        finally:
+            archive.finish()
+        return
+    if not incremental:
+        yield from iter_extract_jobs(plan_output_dirs(file_paths, output_root), output_root, workers,
+                                     cancel_event, dedup, converter, transcode, pdf_workers=pdf_workers)
+        return
+    output_root = os.path.abspath(output_root)
+    with ExtractIndex(output_root) as index:
+        index.prune(file_paths)
+        transcode_key = transcode_settings_key(transcode) if transcode else None
+        unchanged, jobs, new = index.plan(file_paths, dedup, transcode_key)
+        used = {os.path.normcase(os.path.basename(output_dir)) for output_dir in index.output_dirs()}
+        jobs += plan_output_dirs(new, output_root, used)
+        output_dirs = dict(jobs)
+        for file_path, count in unchanged:
+            yield file_path, count, None
+        for file_path, count, error in iter_extract_jobs(jobs, output_root, workers, cancel_event, dedup, converter,
+                                                         transcode, pdf_workers=pdf_workers):
+            if error is None:
+                index.record(file_path, output_dirs[file_path], count, dedup, transcode_key)
+            else:
+                index.forget(file_path, output_dirs[file_path])
+            yield file_path, count, error
+
+def iter_extract_jobs(jobs, output_root, workers=None, cancel_event=None, dedup=None, converter=None, transcode=None,
+                      archive=None, pdf_workers=1):
+    """并行提取 [(文件路径, 输出目录), ...]，参数和产出见 iter_process_files。"""
+    if not jobs:
+        return
+    store_dir = os.path.join(output_root, STORE_DIR_NAME) if dedup else None
+    legacy, modern = [], []
+    for job in jobs:
+        is_legacy = converter is not None and os.path.splitext(job[0])[1].lower() in LEGACY_EXTS
+        (legacy if is_legacy else modern).append(job)
+    workers = workers or max(1, min(len(jobs), os.cpu_count() or 1))
+    results = queue.Queue()
+    futures = []
+    lock = threading.Lock()
+    stop_event = threading.Event()
+    if archive is not None:
+        # 所有工作进程追加写同一个归档文件，写每张图片时持有这把锁
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(multiprocessing.Lock(),))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    temp_dir = tempfile.mkdtemp(prefix="office_img_") if legacy else None
+
+    def submit(file_path, output_dir, source=None):
+        with lock:
+            if stop_event.is_set():
+                results.put((file_path, 0, "已取消"))
+                return
+            future = pool.submit(extract_file, file_path, output_dir, dedup, store_dir, pdf_workers, source, transcode,
+                                 archive)
+            futures.append(future)
+
+        def done(future):
+            if future.cancelled():
+                results.put((file_path, 0, "已取消"))
+            elif future.exception() is not None:
+                results.put((file_path, 0, str(future.exception())))
+            else:
+                results.put(future.result())
+        future.add_done_callback(done)
+
+    def cancel():
+        with lock:
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+
+    thread = None
+    try:
+        for file_path, output_dir in modern:
+            submit(file_path, output_dir)
+        if legacy:
+            thread = threading.Thread(target=convert_legacy,
+                                      args=(converter, legacy, temp_dir, submit, results, stop_event),
+                                      daemon=True)
+            thread.start()
+        for _ in range(len(jobs)):
+            while True:
+                if cancel_event is not None and cancel_event.is_set() and not stop_event.is_set():
+                    cancel()
+                try:
+                    item = results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    pass
+            yield item
+    finally:
+        cancel()
+        if thread is not None:
+            thread.join()
+        # 临时目录中的文件可能还在被提取，归档在所有任务结束后才能收尾，这两种情况都要等待
+        pool.shutdown(wait=temp_dir is not None or archive is not None, cancel_futures=True)
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+def make_converter(legacy_backend):
+    """按 LEGACY_CHOICES 的取值为一个批次创建转换进程池，None 时不转换。"""
+    if not legacy_backend:
+        return None
+    return ConverterPool(None if legacy_backend == "auto" else legacy_backend)
+
+def process_files(file_paths, output_root, workers=None, dedup=None, incremental=False, transcode=None, sink=None,
+                  legacy_backend=None):
+    """
+    并行提取所有文件，返回按输入顺序排列的 [(文件路径, 图片数), ...]。
+    legacy_backend 为 LEGACY_CHOICES 中的转换后端时，整个批次的旧格式文件由同一个转换进程池转换。
+    """
+    counts = {file_path: count for file_path, count, _ in
+              iter_process_files(file_paths, output_root, workers, dedup=dedup,
+                                 converter=make_converter(legacy_backend), incremental=incremental,
+                                 transcode=transcode, sink=sink)}
+    return [(file_path, counts[file_path]) for file_path in file_paths]
+
+def run_in_background(file_paths, output_root, workers, dedup, incremental, transcode, sink, legacy_backend, results,
+                      cancel_event):
+    """在后台线程中运行 iter_process_files，结果逐个放进队列，结束时放入 None。"""
+    try:
+        for item in iter_process_files(file_paths, output_root, workers, cancel_event, dedup,
+                                       make_converter(legacy_backend), incremental=incremental,
+                                       transcode=transcode, sink=sink):
+            results.put(item)
+    finally:
+        results.put(None)
+
+def show_progress(file_paths, output_root, workers, dedup=None, incremental=False, transcode=None, sink=None,
+                  legacy_backend=None):
+    """打开进度窗口并在后台开始提取，每个文件完成后立即显示在窗口中。"""
+    results = queue.Queue()
+    cancel_event = threading.Event()
+    state = {"done": 0, "images": 0, "failed": 0}
+    total = len(file_paths)
+
+    window = tk.Toplevel(root)
+    window.title("提取进度")
+    status_label = tk.Label(window, text=f"已处理 0 / {total} 个文件")
+    status_label.grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+    result_text = tk.Text(window, wrap=tk.WORD, height=20, width=70, state=tk.DISABLED)
+    result_text.grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+    cancel_button = tk.Button(window, text="取消", command=cancel_event.set)
+    cancel_button.grid(row=2, column=0, padx=10, pady=10)
+    open_button = tk.Button(window, text="打开保存目录", state=tk.DISABLED, command=lambda: os.startfile(output_root))
+    open_button.grid(row=2, column=1, padx=10, pady=10)
+    window.columnconfigure(0, weight=1)
+    window.rowconfigure(1, weight=1)
+
+    def poll():
+        finished = False
+        lines = []
+        while True:
+            try:
+                item = results.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            file_path, count, error = item
+            state["done"] += 1
+            state["images"] += count
+            if error is None:
+                lines.append(f"{os.path.basename(file_path)}: {count} 张图片\n")
             else:
-                results.append((file_path, 0))
-                continue
-        if ext == '.pptx':
-            count = extract_images_from_ppt(file_path, output_dir)
-            results.append((file_path, count))
-        elif ext == '.docx':
-            count = extract_images_from_word(file_path, output_dir)
-            results.append((file_path, count))
-        elif ext == '.xlsx':
-            count = extract_images_from_excel(file_path, output_dir)
-            results.append((file_path, count))
-        elif ext == '.pdf':
-            count = extract_images_from_pdf(file_path, output_dir)
-            results.append((file_path, count))
-    return results
+                state["failed"] += 1
+                lines.append(f"{os.path.basename(file_path)}: 失败（{error}）\n")
+        summary = f"已处理 {state['done']} / {total} 个文件，提取 {state['images']} 张图片，失败 {state['failed']} 个"
+        if lines:
+            result_text.config(state=tk.NORMAL)
+            result_text.insert(tk.END, "".join(lines))
+            result_text.see(tk.END)
+            result_text.config(state=tk.DISABLED)
+        if finished:
+            status_label.config(text="提取完成：" + summary)
+            cancel_button.config(state=tk.DISABLED)
+            open_button.config(state=tk.NORMAL)
+            extract_button.config(state=tk.NORMAL)
+        else:
+            status_label.config(text=summary)
+            window.after(100, poll)
+
+    extract_button.config(state=tk.DISABLED)
+    threading.Thread(target=run_in_background,
+                     args=(file_paths, output_root, workers, dedup, incremental, transcode, sink, legacy_backend,
+                           results, cancel_event),
+                     daemon=True).start()
+    window.after(100, poll)
 
 def extract_images():
     output_root = output_dir_entry.get().strip() or os.getcwd()
@@ -190,53 +403,121 @@ def extract_images():
     else:
         messagebox.showerror("错误", "请选择有效的文件或文件夹！")
         return
-    results = process_files(file_paths, output_root)
-    total = sum([c for _, c in results])
-    msg = "\n".join([f"{os.path.basename(fp)}: {c} 张图片" for fp, c in results])
-    if messagebox.askyesno("提取完成", f"共处理 {len(results)} 个文件，提取 {total} 张图片。\n\n详细:\n{msg}\n\n是否打开保存目录？"):
-        os.startfile(output_root)
-
-root = TkinterDnD.Tk()
-root.title("Office和PDF图片批量提取工具")
-root.drop_target_register(DND_FILES)
-try:
-    root.iconbitmap('icon.ico')
-except Exception:
-    pass
-
-file_folder_label = tk.Label(root, text="选择文件或文件夹:")
-file_folder_label.grid(row=0, column=0, padx=10, pady=5, sticky="e")
-file_folder_entry = tk.Entry(root, width=50)
-file_folder_entry.grid(row=0, column=1, padx=10, pady=5)
-file_button = tk.Button(root, text="选择文件", command=select_file)
-file_button.grid(row=0, column=2, padx=5, pady=5)
-folder_button = tk.Button(root, text="选择文件夹", command=select_folder)
-folder_button.grid(row=0, column=3, padx=5, pady=5)
-
-file_type_label = tk.Label(root, text="筛选文件类型:")
-file_type_label.grid(row=1, column=0, padx=10, pady=5, sticky="ne")
-word_var = tk.BooleanVar(value=True)
-excel_var = tk.BooleanVar(value=True)
-ppt_var = tk.BooleanVar(value=True)
-pdf_var = tk.BooleanVar(value=True)
-word_checkbox = tk.Checkbutton(root, text="Word", variable=word_var)
-word_checkbox.grid(row=1, column=1, padx=5, pady=2, sticky="w")
-excel_checkbox = tk.Checkbutton(root, text="Excel", variable=excel_var)
-excel_checkbox.grid(row=2, column=1, padx=5, pady=2, sticky="w")
-ppt_checkbox = tk.Checkbutton(root, text="PPT", variable=ppt_var)
-ppt_checkbox.grid(row=3, column=1, padx=5, pady=2, sticky="w")
-pdf_checkbox = tk.Checkbutton(root, text="PDF", variable=pdf_var)
-pdf_checkbox.grid(row=4, column=1, padx=5, pady=2, sticky="w")
-
-output_dir_label = tk.Label(root, text="导出路径:")
-output_dir_label.grid(row=5, column=0, padx=10, pady=5, sticky="e")
-output_dir_entry = tk.Entry(root, width=50)
-output_dir_entry.insert(0, os.getcwd())
-output_dir_entry.grid(row=5, column=1, padx=10, pady=5)
-output_dir_button = tk.Button(root, text="浏览", command=select_output_dir)
-output_dir_button.grid(row=5, column=2, padx=10, pady=5)
-
-extract_button = tk.Button(root, text="批量提取图片", command=extract_images)
-extract_button.grid(row=6, column=1, padx=10, pady=20)
-
-root.mainloop()
+    if not file_paths:
+        return
+    try:
+        workers = int(workers_var.get())
+    except (ValueError, tk.TclError):
+        workers = None
+    dedup = DEDUP_CHOICES[dedup_var.get()]
+    transcode = None
+    if TRANSCODE_CHOICES[transcode_var.get()]:
+        transcode = {"target": TRANSCODE_CHOICES[transcode_var.get()], "quality": quality_var.get(),
+                     "max_size": max_size_var.get().strip() or None}
+        try:
+            transcode = check_transcode_settings(transcode)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        if dedup == "manifest":
+            messagebox.showerror("错误", "清单模式下不能转码！")
+            return
+    sink = SINK_CHOICES[sink_var.get()]
+    if sink and (dedup or transcode or incremental_var.get()):
+        messagebox.showerror("错误", "输出到归档文件时不能去重、转码或增量提取！")
+        return
+    show_progress(file_paths, output_root, workers, dedup, incremental_var.get(), transcode, sink,
+                  LEGACY_CHOICES[legacy_var.get()])
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
+
+    root = TkinterDnD.Tk()
+    root.title("Office和PDF图片批量提取工具")
+    root.drop_target_register(DND_FILES)
+    try:
+        root.iconbitmap('icon.ico')
+    except Exception:
+        pass
+
+    file_folder_label = tk.Label(root, text="选择文件或文件夹:")
+    file_folder_label.grid(row=0, column=0, padx=10, pady=5, sticky="e")
+    file_folder_entry = tk.Entry(root, width=50)
+    file_folder_entry.grid(row=0, column=1, padx=10, pady=5)
+    file_button = tk.Button(root, text="选择文件", command=select_file)
+    file_button.grid(row=0, column=2, padx=5, pady=5)
+    folder_button = tk.Button(root, text="选择文件夹", command=select_folder)
+    folder_button.grid(row=0, column=3, padx=5, pady=5)
+
+    file_type_label = tk.Label(root, text="筛选文件类型:")
+    file_type_label.grid(row=1, column=0, padx=10, pady=5, sticky="ne")
+    word_var = tk.BooleanVar(value=True)
+    excel_var = tk.BooleanVar(value=True)
+    ppt_var = tk.BooleanVar(value=True)
+    pdf_var = tk.BooleanVar(value=True)
+    word_checkbox = tk.Checkbutton(root, text="Word", variable=word_var)
+    word_checkbox.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+    excel_checkbox = tk.Checkbutton(root, text="Excel", variable=excel_var)
+    excel_checkbox.grid(row=2, column=1, padx=5, pady=2, sticky="w")
+    ppt_checkbox = tk.Checkbutton(root, text="PPT", variable=ppt_var)
+    ppt_checkbox.grid(row=3, column=1, padx=5, pady=2, sticky="w")
+    pdf_checkbox = tk.Checkbutton(root, text="PDF", variable=pdf_var)
+    pdf_checkbox.grid(row=4, column=1, padx=5, pady=2, sticky="w")
+
+    output_dir_label = tk.Label(root, text="导出路径:")
+    output_dir_label.grid(row=5, column=0, padx=10, pady=5, sticky="e")
+    output_dir_entry = tk.Entry(root, width=50)
+    output_dir_entry.insert(0, os.getcwd())
+    output_dir_entry.grid(row=5, column=1, padx=10, pady=5)
+    output_dir_button = tk.Button(root, text="浏览", command=select_output_dir)
+    output_dir_button.grid(row=5, column=2, padx=10, pady=5)
+
+    workers_label = tk.Label(root, text="进程数:")
+    workers_label.grid(row=6, column=0, padx=10, pady=5, sticky="e")
+    workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+    workers_spinbox = tk.Spinbox(root, from_=1, to=64, width=5, textvariable=workers_var)
+    workers_spinbox.grid(row=6, column=1, padx=10, pady=5, sticky="w")
+
+    dedup_label = tk.Label(root, text="相同图片:")
+    dedup_label.grid(row=7, column=0, padx=10, pady=5, sticky="e")
+    dedup_var = tk.StringVar(value="不去重")
+    dedup_menu = tk.OptionMenu(root, dedup_var, *DEDUP_CHOICES)
+    dedup_menu.grid(row=7, column=1, padx=10, pady=5, sticky="w")
+
+    transcode_label = tk.Label(root, text="转换格式:")
+    transcode_label.grid(row=8, column=0, padx=10, pady=5, sticky="e")
+    transcode_frame = tk.Frame(root)
+    transcode_frame.grid(row=8, column=1, padx=10, pady=5, sticky="w")
+    transcode_var = tk.StringVar(value="保持原格式")
+    transcode_menu = tk.OptionMenu(transcode_frame, transcode_var, *TRANSCODE_CHOICES)
+    transcode_menu.pack(side=tk.LEFT)
+    tk.Label(transcode_frame, text="质量:").pack(side=tk.LEFT, padx=(10, 0))
+    quality_var = tk.StringVar(value="85")
+    quality_spinbox = tk.Spinbox(transcode_frame, from_=1, to=100, width=5, textvariable=quality_var)
+    quality_spinbox.pack(side=tk.LEFT)
+    tk.Label(transcode_frame, text="最大边长:").pack(side=tk.LEFT, padx=(10, 0))
+    max_size_var = tk.StringVar(value="")
+    max_size_entry = tk.Entry(transcode_frame, width=7, textvariable=max_size_var)
+    max_size_entry.pack(side=tk.LEFT)
+
+    sink_label = tk.Label(root, text="输出方式:")
+    sink_label.grid(row=9, column=0, padx=10, pady=5, sticky="e")
+    sink_var = tk.StringVar(value="文件夹")
+    sink_menu = tk.OptionMenu(root, sink_var, *SINK_CHOICES)
+    sink_menu.grid(row=9, column=1, padx=10, pady=5, sticky="w")
+
+    legacy_label = tk.Label(root, text="旧格式文件:")
+    legacy_label.grid(row=10, column=0, padx=10, pady=5, sticky="e")
+    legacy_var = tk.StringVar(value="直接读取")
+    legacy_menu = tk.OptionMenu(root, legacy_var, *LEGACY_CHOICES)
+    legacy_menu.grid(row=10, column=1, padx=10, pady=5, sticky="w")
+
+    incremental_var = tk.BooleanVar(value=False)
+    incremental_checkbox = tk.Checkbutton(root, text="跳过上次提取后未变化的文件", variable=incremental_var)
+    incremental_checkbox.grid(row=11, column=1, padx=5, pady=2, sticky="w")
+
+    extract_button = tk.Button(root, text="批量提取图片", command=extract_images)
+    extract_button.grid(row=12, column=1, padx=10, pady=20)
+
+    root.mainloop()
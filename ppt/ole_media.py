@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+不经过 Office 转换，直接从 .doc / .xls / .ppt（OLE2 复合文档）中提取图片。
+
+复合文档是一个小型文件系统：文件按扇区划分，FAT 记录每个流占用的扇区链，小于 4096 字节的
+流放在迷你流中（64 字节的迷你扇区，由迷你 FAT 记录）。这里把文件 mmap 映射，每个流表示为
+映射上的若干连续片段（Runs），读取和写出都直接取映射上的切片，不把流整个读进内存。
+
+图片以 Office Art（Escher）的 BLIP 记录保存：
+
+    ppt  Pictures 流中依次存放所有 BLIP；
+    doc  嵌入型图片在 Data 流中，每张是一个 PICF 结构，其中的 FBSE 记录内嵌 BLIP；浮动图片在
+         表格流（0Table / 1Table）的 DggInfo 中登记，FBSE 指向 WordDocument 流中的 BLIP；
+    xls  Workbook 流的 MSODRAWINGGROUP 记录（及其后的 CONTINUE 记录）中的 FBSE 内嵌 BLIP。
+
+JPEG、PNG、TIFF 按原始字节写出；DIB 补上 BMP 文件头；EMF、WMF、PICT 在记录中通常是
+deflate 压缩的，边解压边写出。图片命名为 image<序号>.<扩展名>，序号按在文件中出现的顺序。
+"""
+import os
+import sys
+import mmap
+import zlib
+import array
+import bisect
+import struct
+import contextlib
+
+from image_store import CHUNK_SIZE, open_writer
+
+SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+HEADER = struct.Struct("<8s16s5H6s9L")
+HEADER_DIFAT = 109
+MAX_REG_SECT = 0xFFFFFFFA
+NO_STREAM = 0xFFFFFFFF
+DIR_ENTRY_SIZE = 128
+STREAM, ROOT = 2, 5
+
+# Escher 记录
+RECORD_HEADER = struct.Struct("<HHL")
+FBSE = 0xF007
+BLIP_FIRST, BLIP_LAST = 0xF018, 0xF117
+# BLIP 记录类型 -> 扩展名
+BLIP_EXTS = {0xF01A: "emf", 0xF01B: "wmf", 0xF01C: "pict", 0xF01D: "jpg", 0xF01E: "png",
+             0xF01F: "bmp", 0xF029: "tiff", 0xF02A: "jpg"}
+METAFILE_TYPES = {0xF01A, 0xF01B, 0xF01C}
+# 带第二个 UID 的 recInstance
+TWO_UID_INSTANCES = {0x3D5, 0x217, 0x543, 0x46B, 0x6E3, 0x6E1, 0x7A9, 0x6E5}
+METAFILE_HEADER = struct.Struct("<L16s8sLBB")
+COMPRESSION_DEFLATE = 0
+
+# Word：FIB 中的表格流标志和 fcDggInfo / lcbDggInfo 的位置，PICF 的头长度
+WORD_IDENT = 0xA5EC
+FIB_WHICH_TABLE = 0x0200
+FIB_DGG_INFO = 0x22A
+PICF_HEADER_SIZE = 0x44
+MM_SHAPE_FILE = 0x66
+# Excel：BIFF 记录类型
+BIFF_EOF = 0x000A
+BIFF_CONTINUE = 0x003C
+BIFF_MSO_DRAWING_GROUP = 0x00EB
+
+
+class Runs:
+    """映射上的一段逻辑字节序列，由若干 (起始位置, 长度) 片段依次拼成，相邻的片段会合并。"""
+
+    def __init__(self, view, runs):
+        self.view = view
+        self.runs = []
+        for start, length in runs:
+            length = min(length, len(view) - start)
+            if length <= 0:
+                raise ValueError("复合文档已损坏：扇区超出文件末尾")
+            if self.runs and sum(self.runs[-1]) == start:
+                self.runs[-1] = (self.runs[-1][0], self.runs[-1][1] + length)
+            else:
+                self.runs.append((start, length))
+        self.starts = [0]
+        for _, length in self.runs:
+            self.starts.append(self.starts[-1] + length)
+        self.size = self.starts[-1]
+
+    def pieces(self, offset, size):
+        """逐个产出逻辑区间 [offset, offset + size) 对应的 (映射中的起始位置, 长度)。"""
+        size = max(0, min(size, self.size - offset))
+        index = bisect.bisect_right(self.starts, offset) - 1
+        while size > 0:
+            start, length = self.runs[index]
+            skip = offset - self.starts[index]
+            n = min(length - skip, size)
+            yield start + skip, n
+            offset += n
+            size -= n
+            index += 1
+
+    def slice(self, offset, size):
+        return Runs(self.view, self.pieces(offset, size))
+
+    def read(self, offset, size):
+        """读取一小段（记录头等），返回 bytes；超出末尾时抛出 ValueError。"""
+        data = b"".join(bytes(self.view[start:start + n]) for start, n in self.pieces(offset, size))
+        if len(data) != size:
+            raise ValueError("记录超出流的末尾")
+        return data
+
+    def unpack(self, fmt, offset):
+        return fmt.unpack(self.read(offset, fmt.size))
+
+    def u16(self, offset):
+        return struct.unpack("<H", self.read(offset, 2))[0]
+
+    def iter_chunks(self, offset=0, size=None):
+        """按不超过 CHUNK_SIZE 的块产出映射上的切片，不拷贝；产出下一块时释放上一块。"""
+        if size is None:
+            size = self.size - offset
+        for start, n in self.pieces(offset, size):
+            for pos in range(start, start + n, CHUNK_SIZE):
+                with self.view[pos:min(pos + CHUNK_SIZE, start + n)] as chunk:
+                    yield chunk
+
+
+class CompoundFile:
+    """只读的 OLE2 复合文档，只支持根存储下的流（图片所在的流都在根存储下）。"""
+
+    def __init__(self, view):
+        if len(view) < 512 or bytes(view[:8]) != SIGNATURE:
+            raise ValueError("不是 OLE2 复合文档")
+        header = HEADER.unpack_from(view)
+        sector_shift, mini_shift = header[5], header[6]
+        (_, fat_count, first_dir, _, self.mini_cutoff, first_mini_fat, mini_fat_count,
+         first_difat, difat_count) = header[8:]
+        self.view = view
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_shift
+        difat = list(struct.unpack_from("<%dL" % HEADER_DIFAT, view, HEADER.size))
+        sector = first_difat
+        per_difat = self.sector_size // 4 - 1
+        for _ in range(difat_count):
+            if sector >= MAX_REG_SECT:
+                break
+            entries = struct.unpack_from("<%dL" % (per_difat + 1), view, self.sector_offset(sector))
+            difat.extend(entries[:-1])
+            sector = entries[-1]
+        fat_sectors = [s for s in difat if s < MAX_REG_SECT][:fat_count]
+        self.fat = self.read_table(Runs(view, [(self.sector_offset(s), self.sector_size) for s in fat_sectors]))
+        self.mini_fat = self.read_table(self.sector_stream(first_mini_fat, mini_fat_count * self.sector_size))
+        directory = self.sector_stream(first_dir)
+        self.entries = [directory.read(i * DIR_ENTRY_SIZE, DIR_ENTRY_SIZE)
+                        for i in range(directory.size // DIR_ENTRY_SIZE)]
+        if not self.entries or self.entries[0][66] != ROOT:
+            raise ValueError("复合文档已损坏：找不到根目录")
+        root_start, root_size = self.entry_location(0)
+        self.mini_stream = self.sector_stream(root_start, root_size)
+        self.streams = self.children(0)
+
+    def sector_offset(self, sector):
+        return (sector + 1) * self.sector_size
+
+    @staticmethod
+    def read_table(runs):
+        table = array.array("I")
+        table.frombytes(runs.read(0, runs.size))
+        if sys.byteorder == "big":
+            table.byteswap()
+        return table
+
+    def chain(self, table, start):
+        sectors = []
+        sector = start
+        while sector < MAX_REG_SECT and sector < len(table):
+            if len(sectors) > len(table):
+                raise ValueError("复合文档已损坏：扇区链有环")
+            sectors.append(sector)
+            sector = table[sector]
+        return sectors
+
+    def sector_stream(self, start, size=None):
+        runs = Runs(self.view, [(self.sector_offset(s), self.sector_size) for s in self.chain(self.fat, start)])
+        return runs if size is None else runs.slice(0, size)
+
+    def entry_location(self, index):
+        entry = self.entries[index]
+        start, size = struct.unpack_from("<LQ", entry, 116)
+        if self.sector_size == 512:
+            # 版本 3 的文件只使用低 32 位
+            size &= 0xFFFFFFFF
+        return start, size
+
+    def children(self, index):
+        """存储的直接子项 {大写的名称: 目录项序号}。"""
+        result = {}
+        seen = set()
+        stack = [struct.unpack_from("<L", self.entries[index], 76)[0]]
+        while stack:
+            node = stack.pop()
+            if node == NO_STREAM or node >= len(self.entries) or node in seen:
+                continue
+            seen.add(node)
+            entry = self.entries[node]
+            name_size = min(struct.unpack_from("<H", entry, 64)[0], 64)
+            name = entry[:max(0, name_size - 2)].decode("utf-16-le", "replace")
+            result[name.upper()] = node
+            stack.extend(struct.unpack_from("<LL", entry, 68))
+        return result
+
+    def open_stream(self, name):
+        """根存储下名为 name 的流，返回 Runs；不存在时返回 None。"""
+        index = self.streams.get(name.upper())
+        if index is None or self.entries[index][66] != STREAM:
+            return None
+        start, size = self.entry_location(index)
+        if size >= self.mini_cutoff:
+            return self.sector_stream(start, size)
+        pieces = []
+        for sector in self.chain(self.mini_fat, start):
+            pieces.extend(self.mini_stream.pieces(sector * self.mini_sector_size, self.mini_sector_size))
+        return Runs(self.view, pieces).slice(0, size)
+
+
+@contextlib.contextmanager
+def open_compound(path):
+    """打开复合文档，产出 CompoundFile。"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            yield CompoundFile(view)
+        finally:
+            view.release()
+
+
+def iter_blips(stream, start=0, end=None, delay=None):
+    """
+    在 stream 的 [start, end) 中逐条查找 Escher 记录，产出每个 BLIP 记录所在的 (Runs, 偏移)。
+    进入容器记录；FBSE 内嵌的 BLIP 直接产出，没有内嵌的按 foDelay 到 delay 流中查找。
+    """
+    end = stream.size if end is None else min(end, stream.size)
+    pos = start
+    while pos + RECORD_HEADER.size <= end:
+        ver_instance, rec_type, length = stream.unpack(RECORD_HEADER, pos)
+        body = pos + RECORD_HEADER.size
+        if ver_instance & 0xF == 0xF:
+            yield from iter_blips(stream, body, body + length, delay)
+        elif rec_type == FBSE and length >= 36:
+            size, _, offset = struct.unpack("<3L", stream.read(body + 20, 12))
+            embedded = body + 36 + stream.read(body + 33, 1)[0]
+            if embedded + RECORD_HEADER.size <= body + length:
+                yield stream, embedded
+            elif delay is not None and size and offset < delay.size:
+                yield delay, offset
+        elif BLIP_FIRST <= rec_type <= BLIP_LAST:
+            yield stream, pos
+        pos = body + length
+
+
+def inflate_chunks(chunks):
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk, CHUNK_SIZE)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+        if decompressor.eof:
+            return
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def bmp_file_header(stream, offset, size):
+    """DIB 前面补的 14 字节 BMP 文件头。"""
+    header_size, = struct.unpack("<L", stream.read(offset, 4))
+    bit_count, compression = struct.unpack("<HL", stream.read(offset + 14, 6))
+    colors, = struct.unpack("<L", stream.read(offset + 32, 4)) if header_size >= 36 else (0,)
+    if not colors and bit_count <= 8:
+        colors = 1 << bit_count
+    masks = 12 if header_size == 40 and compression == 3 else 0
+    return struct.pack("<2sL2HL", b"BM", 14 + size, 0, 0, 14 + header_size + masks + colors * 4)
+
+
+def blip_image(stream, offset):
+    """
+    解析 offset 处的 BLIP 记录，返回 (扩展名, 按块产出图片内容的迭代器)；不认识的类型返回 None。
+    """
+    ver_instance, rec_type, length = stream.unpack(RECORD_HEADER, offset)
+    ext = BLIP_EXTS.get(rec_type)
+    if ext is None:
+        return None
+    end = offset + RECORD_HEADER.size + length
+    data = offset + RECORD_HEADER.size + (32 if ver_instance >> 4 in TWO_UID_INSTANCES else 16)
+    if rec_type in METAFILE_TYPES:
+        _, _, _, saved, compression, _ = stream.unpack(METAFILE_HEADER, data)
+        data += METAFILE_HEADER.size
+        size = min(saved, end - data)
+        if compression == COMPRESSION_DEFLATE:
+            return ext, inflate_chunks(stream.iter_chunks(data, size))
+        return ext, stream.iter_chunks(data, size)
+    # 位图：UID 之后是 1 字节的标记
+    data += 1
+    size = end - data
+    if rec_type == 0xF01F:
+        header = bmp_file_header(stream, data, size)
+
+        def with_header():
+            yield header
+            yield from stream.iter_chunks(data, size)
+        return ext, with_header()
+    return ext, stream.iter_chunks(data, size)
+
+
+def iter_ppt_blips(cf):
+    stream = cf.open_stream("Pictures")
+    if stream is not None:
+        yield from iter_blips(stream)
+
+
+def iter_doc_blips(cf):
+    word = cf.open_stream("WordDocument")
+    if word is None or word.size < FIB_DGG_INFO + 8 or word.u16(0) != WORD_IDENT:
+        raise ValueError("不是有效的 Word 文档")
+    # 嵌入型图片：Data 流中依次存放的 PICF 结构，遇到无法识别的数据时停止
+    data = cf.open_stream("Data")
+    pos = 0
+    while data is not None and pos + PICF_HEADER_SIZE <= data.size:
+        length, header_size = struct.unpack("<LH", data.read(pos, 6))
+        if header_size != PICF_HEADER_SIZE or length < PICF_HEADER_SIZE or pos + length > data.size:
+            break
+        start = pos + PICF_HEADER_SIZE
+        if data.u16(pos + 6) == MM_SHAPE_FILE:
+            start += 1 + data.read(start, 1)[0]
+        yield from iter_blips(data, start, pos + length)
+        pos += length
+    # 浮动图片：表格流中的 DggInfo
+    table = cf.open_stream("1Table" if word.u16(0x0A) & FIB_WHICH_TABLE else "0Table")
+    fc, lcb = struct.unpack("<LL", word.read(FIB_DGG_INFO, 8))
+    if table is not None and lcb:
+        yield from iter_blips(table, fc, fc + lcb, delay=word)
+
+
+def iter_xls_blips(cf):
+    stream = cf.open_stream("Workbook")
+    if stream is None:
+        return
+    # 工作簿全局子流中的 MSODRAWINGGROUP 记录及其后的 CONTINUE 记录拼成一个 Escher 数据
+    pieces = []
+    pos = 0
+    while pos + 4 <= stream.size:
+        rec_type, length = struct.unpack("<HH", stream.read(pos, 4))
+        if rec_type == BIFF_MSO_DRAWING_GROUP or (pieces and rec_type == BIFF_CONTINUE):
+            pieces.extend(stream.pieces(pos + 4, length))
+        elif pieces or rec_type == BIFF_EOF:
+            break
+        pos += 4 + length
+    if pieces:
+        yield from iter_blips(Runs(stream.view, pieces))
+
+
+BLIP_FINDERS = {".ppt": iter_ppt_blips, ".doc": iter_doc_blips, ".xls": iter_xls_blips}
+
+
+def write_ole_images(path, writer, ext=None):
+    """
+    把 .doc / .xls / .ppt 中的所有图片交给 writer（见 image_store）写出，返回图片数。
+    ext 为文件类型，默认取文件扩展名。
+    """
+    finder = BLIP_FINDERS.get((ext or os.path.splitext(path)[1]).lower())
+    if finder is None:
+        raise ValueError("不支持的文件类型")
+    count = 0
+    with open_compound(path) as cf:
+        for stream, offset in finder(cf):
+            image = blip_image(stream, offset)
+            if image is None:
+                continue
+            count += 1
+            image_ext, chunks = image
+            writer.write(f"image{count}.{image_ext}", chunks)
+    return count
+
+
+def extract_ole_images(path, output_dir, dedup=None, store_dir=None):
+    """提取 .doc / .xls / .ppt 中的所有图片到 output_dir，返回图片数。dedup 和 store_dir 见 image_store.open_writer。"""
+    with open_writer(output_dir, dedup, store_dir) as writer:
+        return write_ole_images(path, writer)
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+把 PDF 中的图片 XObject 解码为真正的图片文件。
+
+PyPDF2 的 get_data() 得到的是解压后的原始像素，直接存成 .png 打不开。这里按图片字典还原：
+
+    DCTDecode / JPXDecode   原样写出 .jpg / .jp2；
+    FlateDecode             zlib 解压，用 NumPy 还原 PNG / TIFF 预测器，按 BitsPerComponent
+                            拆分采样，转换 DeviceGray / RGB / CMYK / Indexed / ICCBased /
+                            Separation 颜色空间，应用 /Decode 和 SMask（或遮罩）作为透明通道，
+                            再用 Pillow 编码为 PNG；
+    其他过滤器              用 PyPDF2 解压后同样处理，CCITTFaxDecode 写出 .tiff。
+
+无法解码的图片退回为原来的写法（原始数据，按 /Filter 猜扩展名）。所有像素运算都是整幅
+数组运算：PNG 预测器中只含 None / Sub / Up 的图片一次完成，含 Average / Paeth 的行按
+反对角线推进，循环次数为行数加列数而不是像素数。
+
+页面按 PAGES_PER_TASK 页一组分给进程池解码，解码结果按页码顺序交给 writer 写出；同一个
+XObject 被多页引用时（例如 logo），同一组内只解码一次。
+"""
+import os
+import io
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from image_store import open_writer
+
+PAGES_PER_TASK = 8
+# 只含这几种 PNG 行过滤类型时可以整幅一次还原
+ROW_INDEPENDENT_FILTERS = (0, 1, 2)
+# 无法解码时按 /Filter 猜扩展名（原来的写法）
+RAW_EXTS = {"/DCTDecode": "jpg", "/JPXDecode": "jp2", "/FlateDecode": "png"}
+COMPONENTS = {"/DeviceGray": 1, "/CalGray": 1, "/G": 1, "/DeviceRGB": 3, "/CalRGB": 3, "/RGB": 3,
+              "/Lab": 3, "/DeviceCMYK": 4, "/CMYK": 4}
+
+
+class UnsupportedImage(Exception):
+    """图片的某个特性不支持解码，调用方退回为写出原始数据。"""
+
+
+def resolve(obj):
+    return obj.get_object() if hasattr(obj, "get_object") else obj
+
+
+def as_list(obj):
+    obj = resolve(obj)
+    if obj is None:
+        return []
+    return [resolve(item) for item in obj] if isinstance(obj, list) else [obj]
+
+
+def as_bytes(obj):
+    """Indexed 颜色表等字符串或流对象的原始字节。"""
+    obj = resolve(obj)
+    if hasattr(obj, "get_data"):
+        return obj.get_data()
+    if hasattr(obj, "original_bytes"):
+        return obj.original_bytes
+    if isinstance(obj, bytes):
+        return obj
+    return str(obj).encode("latin-1")
+
+
+def stream_filters(xobj):
+    """返回 [(过滤器名, 参数字典), ...]。"""
+    names = [str(name) for name in as_list(xobj.get("/Filter"))]
+    parms = as_list(xobj.get("/DecodeParms"))
+    parms += [None] * (len(names) - len(parms))
+    return [(name, resolve(parm) or {}) for name, parm in zip(names, parms)]
+
+
+def inflate(data):
+    """zlib 解压，容忍末尾被截断或多出的数据。"""
+    return zlib.decompressobj().decompress(data)
+
+
+def unfilter_png_rows(data, rows, row_bytes, bpp):
+    """
+    还原 PNG 预测器（Predictor >= 10），返回 (rows, row_bytes) 的 uint8 数组。
+
+    每行第一个字节是过滤类型。只含 None / Sub / Up 时：Sub 行按像素通道做 cumsum，连续的 Up 行
+    按列做分段 cumsum；含 Average / Paeth 时，每个像素只依赖左、上、左上三个已还原的像素，
+    同一条反对角线上的像素互不依赖，按反对角线逐条整体计算。
+    """
+    stride = row_bytes + 1
+    rows = min(rows, len(data) // stride)
+    if rows == 0:
+        raise UnsupportedImage("预测器数据为空")
+    raw = np.frombuffer(data, np.uint8, rows * stride).reshape(rows, stride)
+    types = raw[:, 0]
+    filtered = raw[:, 1:]
+    if types.max() > 4:
+        raise UnsupportedImage("未知的 PNG 过滤类型")
+    pixels = row_bytes // bpp
+    if set(np.unique(types)) <= set(ROW_INDEPENDENT_FILTERS):
+        # None 和 Sub 行不依赖上一行
+        base = filtered.copy()
+        sub = types == 1
+        if sub.any():
+            lanes = base[sub].reshape(-1, pixels, bpp)
+            base[sub] = np.cumsum(lanes, axis=1, dtype=np.uint8).reshape(-1, row_bytes)
+        # Up 行 = 本段第一行（非 Up 行）加上之后各行的差值之和，uint8 的溢出正好是模 256
+        total = np.cumsum(base, axis=0, dtype=np.uint8)
+        starts = np.where(types != 2, np.arange(rows), -1)
+        starts = np.maximum.accumulate(starts)
+        before = np.zeros((rows, row_bytes), np.uint8)
+        has_prev = starts > 0
+        before[has_prev] = total[starts[has_prev] - 1]
+        return total - before
+    out = np.zeros((rows + 1, pixels + 1, bpp), np.int16)   # 多出的第 0 行、第 0 列为 0
+    src = filtered.reshape(rows, pixels, bpp).astype(np.int16)
+    row_types = types.astype(np.int8)
+    for diagonal in range(rows + pixels - 1):
+        r = np.arange(max(0, diagonal - pixels + 1), min(rows, diagonal + 1))
+        c = diagonal - r
+        a = out[r + 1, c]           # 左
+        b = out[r, c + 1]           # 上
+        ab = out[r, c]              # 左上
+        kind = row_types[r][:, None]
+        p = a + b - ab
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - ab)
+        paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, ab))
+        predicted = np.select([kind == 1, kind == 2, kind == 3, kind == 4],
+                              [a, b, (a + b) >> 1, paeth], 0)
+        out[r + 1, c + 1] = (src[r, c] + predicted) & 0xFF
+    return out[1:, 1:].reshape(rows, row_bytes).astype(np.uint8)
+
+
+def unfilter_tiff_rows(samples, bpc):
+    """还原 TIFF 预测器 2（水平差分），samples 为 (行, 列, 通道) 的数组。"""
+    if bpc not in (8, 16):
+        raise UnsupportedImage("TIFF 预测器只支持 8 / 16 位")
+    return np.cumsum(samples, axis=1, dtype=samples.dtype)
+
+
+def unpack_samples(data, width, height, components, bpc):
+    """按 BitsPerComponent 拆出采样值，返回 (height, width, components) 的 uint8 / uint16 数组。"""
+    if bpc == 16:
+        row_bytes = width * components * 2
+        samples = np.frombuffer(data, ">u2", height * row_bytes // 2).astype(np.uint16)
+        return samples.reshape(height, width, components)
+    row_bytes = (width * components * bpc + 7) // 8
+    raw = np.frombuffer(data, np.uint8, height * row_bytes).reshape(height, row_bytes)
+    if bpc == 8:
+        return raw[:, :width * components].reshape(height, width, components)
+    if bpc not in (1, 2, 4):
+        raise UnsupportedImage("不支持的 BitsPerComponent：%s" % bpc)
+    # 每行末尾按字节补齐，先拆成位再每 bpc 位组合成一个采样
+    bits = np.unpackbits(raw, axis=1)[:, :width * components * bpc]
+    weights = (1 << np.arange(bpc - 1, -1, -1)).astype(np.uint8)
+    values = bits.reshape(height, width * components, bpc) @ weights
+    return values.astype(np.uint8).reshape(height, width, components)
+
+
+def decoded_data(xobj):
+    """
+    按过滤器解压图片流，返回 (数据, 最后一个过滤器名, 已还原预测器前的参数)。
+    只有 FlateDecode 时自行解压并把预测器留给 NumPy；DCT / JPX 返回压缩数据本身。
+    """
+    filters = stream_filters(xobj)
+    if len(filters) == 1 and filters[0][0] in ("/FlateDecode", "/Fl"):
+        return inflate(xobj._data), "/FlateDecode", filters[0][1]
+    if filters and filters[-1][0] in ("/DCTDecode", "/DCT", "/JPXDecode"):
+        if len(filters) > 1:
+            return xobj.get_data(), filters[-1][0], {}
+        return xobj._data, filters[-1][0], {}
+    # LZW、ASCII85、RunLength 等：PyPDF2 解压，预测器也由它处理
+    return xobj.get_data(), filters[-1][0] if filters else None, {}
+
+
+def color_space(xobj):
+    """
+    返回 (基本颜色空间, 通道数, 颜色表)。基本颜色空间为 gray / rgb / cmyk / separation；
+    Indexed 时颜色表为 (hival + 1, 基本颜色空间的通道数) 的 uint8 数组，否则为 None。
+    """
+    if xobj.get("/ImageMask"):
+        return "mask", 1, None
+    cs = resolve(xobj.get("/ColorSpace", "/DeviceGray"))
+    items = as_list(cs) if isinstance(cs, list) else [cs]
+    name = str(items[0])
+    if name in COMPONENTS:
+        components = COMPONENTS[name]
+        return {1: "gray", 3: "rgb", 4: "cmyk"}[components], components, None
+    if name == "/ICCBased":
+        components = int(resolve(items[1]).get("/N", 3))
+        if components not in (1, 3, 4):
+            raise UnsupportedImage("ICCBased 通道数为 %d" % components)
+        return {1: "gray", 3: "rgb", 4: "cmyk"}[components], components, None
+    if name in ("/Indexed", "/I"):
+        base = {"/ColorSpace": items[1]}
+        base_kind, base_components, _ = color_space(base)
+        hival = int(items[2])
+        lookup = np.frombuffer(as_bytes(items[3]), np.uint8)
+        size = (hival + 1) * base_components
+        palette = np.zeros(size, np.uint8)
+        palette[:min(size, len(lookup))] = lookup[:size]
+        palette = to_rgb(palette.reshape(1, hival + 1, base_components), base_kind)[0]
+        return "indexed", 1, palette
+    if name == "/Separation":
+        return "separation", 1, None
+    raise UnsupportedImage("不支持的颜色空间：%s" % name)
+
+
+def to_rgb(pixels, kind):
+    """(h, w, c) 的 uint8 数组转换为可直接保存的灰度或 RGB 数组。"""
+    if kind == "cmyk":
+        cmyk = pixels.astype(np.uint16)
+        white = 255 - cmyk[..., 3:4]
+        return (white * (255 - cmyk[..., :3]) // 255).astype(np.uint8)
+    if kind == "separation":
+        # 色值 1 为满墨，显示为黑
+        return 255 - pixels
+    return pixels
+
+
+def scale_to_8bit(samples, bpc, decode):
+    """把采样值按 /Decode 映射到 0..255。"""
+    maximum = (1 << bpc) - 1
+    if decode:
+        low = np.array(decode[0::2], np.float32)
+        high = np.array(decode[1::2], np.float32)
+        values = low + samples.astype(np.float32) * ((high - low) / maximum)
+        return np.clip(np.rint(values * 255), 0, 255).astype(np.uint8)
+    if bpc == 8:
+        return samples.astype(np.uint8)
+    if bpc == 16:
+        return (samples >> 8).astype(np.uint8)
+    return (samples.astype(np.uint16) * 255 // maximum).astype(np.uint8)
+
+
+def decode_pixels(xobj):
+    """解码图片 XObject 的像素，返回 (h, w, c) 的 uint8 数组（c 为 1 或 3）。"""
+    data, last_filter, parms = decoded_data(xobj)
+    if last_filter in ("/DCTDecode", "/DCT", "/JPXDecode"):
+        # 带透明遮罩的 JPEG 需要解码后才能合成透明通道
+        with Image.open(io.BytesIO(data)) as image:
+            if image.mode == "CMYK":
+                # Pillow 读取 Adobe 的 CMYK JPEG 时已经做过反相（rawmode CMYK;I），
+                # 只有 /Decode 为 [1 0 1 0 ...] 时才需要再反相
+                pixels = np.asarray(image)
+                decode = [float(resolve(v)) for v in as_list(xobj.get("/Decode"))]
+                if decode[:2] == [1.0, 0.0]:
+                    pixels = 255 - pixels
+                return to_rgb(pixels, "cmyk")
+            image = image.convert("L" if image.mode in ("L", "1") else "RGB")
+            pixels = np.asarray(image)
+            return pixels[..., None] if pixels.ndim == 2 else pixels
+    width, height = int(xobj["/Width"]), int(xobj["/Height"])
+    kind, components, palette = color_space(xobj)
+    bpc = 1 if kind == "mask" else int(xobj.get("/BitsPerComponent", 8))
+    predictor = int(parms.get("/Predictor", 1))
+    if predictor >= 10:
+        colors = int(parms.get("/Colors", components))
+        columns = int(parms.get("/Columns", width))
+        row_bytes = (colors * bpc * columns + 7) // 8
+        bpp = max(1, colors * bpc // 8)
+        data = unfilter_png_rows(data, height, row_bytes, bpp).tobytes()
+    expected = height * ((width * components * bpc + 7) // 8)
+    if len(data) < expected:
+        # 数据不足时按 0 补齐，与阅读器的行为一致
+        data = data + bytes(expected - len(data))
+    samples = unpack_samples(data, width, height, components, bpc)
+    if predictor == 2:
+        samples = unfilter_tiff_rows(samples, bpc)
+    decode = [float(resolve(v)) for v in as_list(xobj.get("/Decode"))]
+    if kind == "indexed":
+        index = samples[..., 0].astype(np.intp)
+        if decode:
+            index = np.clip(np.rint(decode[0] + index * ((decode[1] - decode[0]) / ((1 << bpc) - 1))),
+                            0, len(palette) - 1).astype(np.intp)
+        return palette[np.minimum(index, len(palette) - 1)]
+    pixels = scale_to_8bit(samples, bpc, decode)
+    if kind == "mask":
+        return pixels
+    return to_rgb(pixels, kind)
+
+
+def alpha_channel(xobj, width, height):
+    """SMask（软遮罩）或遮罩图片（/Mask 为流）对应的 (h, w) uint8 透明通道，没有时返回 None。"""
+    smask = resolve(xobj.get("/SMask"))
+    mask = resolve(xobj.get("/Mask"))
+    if smask is not None and hasattr(smask, "get_data"):
+        alpha = decode_pixels(smask)[..., 0]
+    elif mask is not None and hasattr(mask, "get_data"):
+        # 遮罩图片中采样为 1（按 /Decode 映射后）的地方不绘制
+        alpha = 255 - decode_pixels(mask)[..., 0]
+    else:
+        return None
+    if alpha.shape != (height, width):
+        alpha = np.asarray(Image.fromarray(alpha).resize((width, height), Image.BILINEAR))
+    return alpha
+
+
+def encode_png(pixels, alpha=None):
+    if alpha is not None:
+        pixels = np.concatenate([pixels, alpha[..., None]], axis=2)
+    if pixels.shape[2] == 1:
+        pixels = pixels[..., 0]
+    stream = io.BytesIO()
+    Image.fromarray(pixels).save(stream, "PNG")
+    return stream.getvalue()
+
+
+def raw_image(xobj):
+    """原来的写法：PyPDF2 解压后的数据，按 /Filter 猜扩展名。"""
+    filters = [name for name, _ in stream_filters(xobj)]
+    ext = RAW_EXTS.get(filters[-1], "jpg") if filters else "bin"
+    return ext, xobj.get_data()
+
+
+def decode_image(xobj):
+    """解码一个图片 XObject，返回 (扩展名, 文件内容)。"""
+    filters = [name for name, _ in stream_filters(xobj)]
+    has_alpha = xobj.get("/SMask") is not None or hasattr(resolve(xobj.get("/Mask")), "get_data")
+    try:
+        if filters and filters[-1] in ("/DCTDecode", "/DCT", "/JPXDecode") and not has_alpha:
+            data, _, _ = decoded_data(xobj)
+            return ("jpg" if filters[-1] != "/JPXDecode" else "jp2"), data
+        if filters and filters[-1] in ("/CCITTFaxDecode", "/CCF"):
+            return "tiff", xobj.get_data()
+        pixels = decode_pixels(xobj)
+        alpha = alpha_channel(xobj, pixels.shape[1], pixels.shape[0])
+        return "png", encode_png(pixels, alpha)
+    except Exception:
+        return raw_image(xobj)
+
+
+def iter_page_images(page):
+    """产出页面用到的图片 XObject (名称, 对象)，包括表单 XObject 中嵌套的图片。"""
+    stack = [resolve(page.get("/Resources"))]
+    seen = set()
+    while stack:
+        resources = stack.pop()
+        if not resources or "/XObject" not in resources:
+            continue
+        xobjects = resolve(resources["/XObject"])
+        for name in xobjects:
+            ref = xobjects.raw_get(name) if hasattr(xobjects, "raw_get") else xobjects[name]
+            key = (ref.idnum, ref.generation) if hasattr(ref, "idnum") else id(ref)
+            if key in seen:
+                continue
+            seen.add(key)
+            xobj = resolve(ref)
+            subtype = xobj.get("/Subtype")
+            if subtype == "/Image":
+                yield key, xobj
+            elif subtype == "/Form":
+                stack.append(resolve(xobj.get("/Resources")))
+
+
+def decode_pages(pdf_path, page_indices):
+    """
+    解码一组页面中的图片，在工作进程中执行。
+    返回 [(页码索引, [(扩展名, 文件内容), ...]), ...]。
+    """
+    reader = PdfReader(pdf_path)
+    cache = {}
+    results = []
+    for page_index in page_indices:
+        images = []
+        for key, xobj in iter_page_images(reader.pages[page_index]):
+            if key not in cache:
+                cache[key] = decode_image(xobj)
+            images.append(cache[key])
+        results.append((page_index, images))
+    return results
+
+
+def iter_decoded_pages(pdf_path, workers=None):
+    """按页码顺序产出 (页码索引, [(扩展名, 文件内容), ...])，页面分组在进程池中并行解码。"""
+    page_count = len(PdfReader(pdf_path).pages)
+    chunks = [range(start, min(start + PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PAGES_PER_TASK)]
+    workers = workers or max(1, min(len(chunks), os.cpu_count() or 1))
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from decode_pages(pdf_path, chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(decode_pages, [pdf_path] * len(chunks), chunks):
+            yield from results
+
+
+def write_pdf_images(pdf_path, writer, workers=None):
+    """把 PDF 中的所有图片交给 writer（见 image_store）写出，返回图片数。文件名为 page_<页码>_image_<序号>。"""
+    image_count = 0
+    for page_index, images in iter_decoded_pages(pdf_path, workers):
+        for ext, data in images:
+            image_count += 1
+            writer.write(f"page_{page_index+1}_image_{image_count}.{ext}", data)
+    return image_count
+
+
+def extract_pdf_images(pdf_path, output_dir, dedup=None, store_dir=None, workers=None):
+    """提取 PDF 中的所有图片到 output_dir，返回图片数。workers 为解码页面的进程数，默认为 CPU 核数。"""
+    with open_writer(output_dir, dedup, store_dir) as writer:
+        return write_pdf_images(pdf_path, writer, workers)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+提取后的可选转码：把输出目录中的图片统一转换为 PNG / WebP / JPEG，可以限制最大边长。
+
+转码设置是一个字典 {"target": "png" | "webp" | "jpeg", "quality": 1-100, "max_size": 像素或 None}。
+转码结果按 SHA-256(原图内容) 加转码设置缓存在输出根目录的 _transcoded 中，再次运行（或同一批次
+中出现相同的图片）时直接取缓存，同一张图片在同样的设置下只转码一次。
+
+已经是目标格式（且是该格式的常规颜色模式，例如 RGB 而不是 CMYK 的 JPEG）、不超过最大边长的
+图片不重新编码；EMF / WMF / PICT 等矢量图和 Pillow 打不开的图片保持原样。转码成功后原文件被
+删除，新文件与原文件同名、扩展名为目标格式。
+"""
+import os
+import uuid
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from image_store import file_sha256, remove_existing
+
+CACHE_DIR_NAME = "_transcoded"
+# 目标 -> (Pillow 格式名, 扩展名)
+TARGETS = {"png": ("PNG", "png"), "webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+DEFAULT_QUALITY = 85
+VECTOR_EXTS = {".emf", ".wmf", ".pict", ".svg"}
+# Pillow 各格式能直接保存的模式
+SAVE_MODES = {"PNG": {"1", "L", "LA", "P", "RGB", "RGBA", "I;16"}, "WEBP": {"RGB", "RGBA"}, "JPEG": {"L", "RGB"}}
+
+
+def check_settings(settings):
+    """检查转码设置，返回补全默认值后的设置。"""
+    target = settings.get("target")
+    if target not in TARGETS:
+        raise ValueError("未知的转码格式：%s" % target)
+    quality = int(settings.get("quality") or DEFAULT_QUALITY)
+    if not 1 <= quality <= 100:
+        raise ValueError("转码质量应在 1 到 100 之间")
+    max_size = int(settings.get("max_size") or 0) or None
+    return {"target": target, "quality": quality, "max_size": max_size}
+
+
+def settings_key(settings):
+    """转码设置的字符串表示，用于缓存键和提取索引。"""
+    settings = check_settings(settings)
+    return "%s-q%d-m%d" % (settings["target"], settings["quality"], settings["max_size"] or 0)
+
+
+def convert_mode(image, fmt):
+    """把图片转换为 fmt 能保存的模式，JPEG 的透明部分铺白色底。"""
+    if image.mode in SAVE_MODES[fmt]:
+        return image
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if fmt == "JPEG" and has_alpha:
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode == "1" and fmt == "JPEG":
+        return image.convert("L")
+    return image.convert("RGBA" if has_alpha and fmt != "JPEG" else "RGB")
+
+
+def encode(path, dst, settings):
+    """把 path 转码写入 dst。"""
+    fmt = TARGETS[settings["target"]][0]
+    with Image.open(path) as image:
+        image.seek(0)
+        if settings["max_size"]:
+            image.thumbnail((settings["max_size"], settings["max_size"]), Image.LANCZOS)
+        image = convert_mode(image, fmt)
+        options = {"quality": settings["quality"]} if fmt in ("JPEG", "WEBP") else {"optimize": True}
+        image.save(dst, fmt, **options)
+
+
+def transcode_image(path, settings, cache_dir, link=False):
+    """
+    转码一张图片，返回转码后的路径；不需要或无法转码时返回原路径。
+    link 为 True 时输出文件是缓存文件的硬链接（去重模式），否则复制一份。
+
+    各个提取函数给同一文档中的图片取的文件名（不含扩展名）互不相同，同名的目标文件只可能是
+    上次运行留下的，直接覆盖。
+    """
+    settings = check_settings(settings)
+    fmt, ext = TARGETS[settings["target"]]
+    if os.path.splitext(path)[1].lower() in VECTOR_EXTS:
+        return path
+    try:
+        with Image.open(path) as image:
+            same_format = image.format == fmt and image.mode in SAVE_MODES[fmt]
+            small = not settings["max_size"] or max(image.size) <= settings["max_size"]
+    except Exception:
+        return path
+    if same_format and small:
+        return path
+    key = hashlib.sha256(("%s:%s" % (file_sha256(path), settings_key(settings))).encode()).hexdigest()
+    cached = os.path.join(cache_dir, key[:2], "%s.%s" % (key, ext))
+    if not os.path.exists(cached):
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp = os.path.join(cache_dir, uuid.uuid4().hex + ".tmp")
+        try:
+            encode(path, tmp, settings)
+            os.replace(tmp, cached)
+        except Exception:
+            return path
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    dst = "%s.%s" % (os.path.splitext(path)[0], ext)
+    remove_existing(dst)
+    if link:
+        try:
+            os.link(cached, dst)
+        except OSError:
+            shutil.copyfile(cached, dst)
+    else:
+        shutil.copyfile(cached, dst)
+    if os.path.normcase(dst) != os.path.normcase(path):
+        os.remove(path)
+    return dst
+
+
+def transcode_dir(output_dir, settings, cache_dir, link=False, workers=1):
+    """转码输出目录中的所有图片，返回转码了的图片数。workers 大于 1 时用进程池并行转码。"""
+    paths = [entry.path for entry in os.scandir(output_dir) if entry.is_file()]
+    n = len(paths)
+    if workers > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, n)) as pool:
+            results = list(pool.map(transcode_image, paths, [settings] * n, [cache_dir] * n, [link] * n))
+    else:
+        results = [transcode_image(path, settings, cache_dir, link) for path in paths]
+    return sum(result != path for result, path in zip(results, paths))
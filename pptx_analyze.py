@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+只读分析 pptx 的文字负载，帮助在运行 译后预处理.py 之前选择 font_scale 和 line_spacing。
+
+与 adjust_text_format 使用相同的遍历（pptx_text.iter_paragraphs），但只通过 TextPackage 读取
+幻灯片及其备注页、图表和 SmartArt 的 XML，不补 txBody，也不写任何文件。按幻灯片（含它引用的
+部件）和整个 deck 统计：段落数、run 数、字符数、字号分布、<a:br> 和 spc 的个数、表格和单元格数，
+以及译文变长后文字超出文本框的风险。
+
+风险按 pptx_fit 的字体度量估算：文字宽度乘以译文膨胀系数后按文本框宽度折行，行高取字号的
+1.2 倍，所需高度与文本框高度之比即为填充率。只估算文本框和表格单元格（被合并的单元格除外），
+没有 a:xfrm 的占位符（位置继承自版式）不参与估算。
+
+结果以 JSON lines 或 CSV 输出，每个 deck 一行汇总（level=deck），加每张幻灯片一行（level=slide）。
+"""
+import os
+import sys
+import csv
+import json
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from pptx_fit import LINE_HEIGHT, body_extent, measure_paragraphs, needed_height
+from pptx_text import A_BR, A_TBL, A_TC, NAMESPACES, PartLedger, TextPackage, default_size, iter_bodies, iter_paragraphs
+
+# 填充率超过这些值时分别记为 medium / high
+RISK_MEDIUM = 0.8
+RISK_HIGH = 1.0
+DEFAULT_EXPANSION = 1.3
+
+SPC_XPATH = etree.XPath("count(.//a:rPr[@spc] | .//a:defRPr[@spc] | .//a:endParaRPr[@spc])", namespaces=NAMESPACES)
+
+CSV_FIELDS = ["level", "deck", "slide", "part", "slides", "paragraphs", "runs", "chars", "br", "spc",
+              "tables", "table_cells", "min_size", "max_size", "font_sizes", "shapes_measured",
+              "shapes_at_risk", "max_fill", "risk", "error"]
+
+
+def size_label(sz):
+    """百分之一磅的字号转换为直方图的键，没有设置字号时为 default。"""
+    return "default" if sz is None else "%g" % (int(sz) / 100.0)
+
+
+def risk_level(fill):
+    if fill is None:
+        return None
+    if fill > RISK_HIGH:
+        return "high"
+    if fill > RISK_MEDIUM:
+        return "medium"
+    return "low"
+
+
+def estimate_fill(container, paragraphs, expansion):
+    """估算译文在文本框或单元格中的填充率，无法确定尺寸的容器返回 None。"""
+    if container.tag == A_TC and (container.get("hMerge") or container.get("vMerge")):
+        return None
+    extent = body_extent(container)
+    if extent is None:
+        return None
+    width, height, wrap = extent
+    # 译文只变长不变高：膨胀系数只作用于行宽，行高按原字号计算
+    measured = [([line * expansion for line in lines], size)
+                for lines, size in measure_paragraphs(paragraphs, default_size(container))]
+    return needed_height(measured, width if wrap else float("inf"), 1.0, LINE_HEIGHT) / height
+
+
+def new_stats():
+    return {"paragraphs": 0, "runs": 0, "chars": 0, "br": 0, "spc": 0, "tables": 0, "table_cells": 0,
+            "font_sizes": {}, "shapes_measured": 0, "shapes_at_risk": 0, "max_fill": None}
+
+
+def add_fill(stats, fill):
+    if fill is None:
+        return
+    stats["shapes_measured"] += 1
+    if fill > RISK_HIGH:
+        stats["shapes_at_risk"] += 1
+    if stats["max_fill"] is None or fill > stats["max_fill"]:
+        stats["max_fill"] = fill
+
+
+def count_paragraphs(stats, paragraphs):
+    for p in paragraphs:
+        stats["paragraphs"] += 1
+        stats["br"] += len(p.findall(A_BR))
+        for r in p.r_lst:
+            stats["runs"] += 1
+            stats["chars"] += len(r.t.text or "")
+            label = size_label(r.rPr.get("sz") if r.rPr is not None else None)
+            stats["font_sizes"][label] = stats["font_sizes"].get(label, 0) + 1
+
+
+def analyze_slide(package, partname, ledger, expansion=DEFAULT_EXPANSION):
+    """
+    统计一张幻灯片及其引用的备注页、图表和 SmartArt，不修改 XML。
+
+    参数:
+        package (TextPackage): 已打开的 pptx。
+        partname (str): 幻灯片部件名。
+        ledger (PartLedger): 整个 deck 共用，多张幻灯片共用的部件只统计一次。
+        expansion (float): 译文相对原文的长度膨胀系数。
+
+    返回:
+        dict: 统计结果。
+    """
+    stats = new_stats()
+    parts = []
+    tables = set()
+
+    def items():
+        for name, container, p in iter_paragraphs(package, ledger, roots=[partname], add_missing=False):
+            if not parts or parts[-1] != name:
+                parts.append(name)
+            yield container, p
+
+    for container, paragraphs in iter_bodies(items()):
+        count_paragraphs(stats, paragraphs)
+        if container.tag == A_TC:
+            stats["table_cells"] += 1
+            tables.add(next(container.iterancestors(A_TBL)))
+        add_fill(stats, estimate_fill(container, paragraphs, expansion))
+    stats["tables"] = len(tables)
+    # 统一间距按部件的全部内容替换，这里也统计整个部件
+    stats["spc"] = sum(int(SPC_XPATH(package.part(name))) for name in dict.fromkeys(parts))
+    return stats
+
+
+def merge_stats(total, stats):
+    for key in ("paragraphs", "runs", "chars", "br", "spc", "tables", "table_cells",
+                "shapes_measured", "shapes_at_risk"):
+        total[key] += stats[key]
+    for label, count in stats["font_sizes"].items():
+        total["font_sizes"][label] = total["font_sizes"].get(label, 0) + count
+    if stats["max_fill"] is not None and (total["max_fill"] is None or stats["max_fill"] > total["max_fill"]):
+        total["max_fill"] = stats["max_fill"]
+
+
+def finish_record(record):
+    """补上最小 / 最大字号和风险等级，字号分布按字号排序。"""
+    sizes = sorted(float(label) for label in record["font_sizes"] if label != "default")
+    record["min_size"] = sizes[0] if sizes else None
+    record["max_size"] = sizes[-1] if sizes else None
+    record["font_sizes"] = dict(sorted(record["font_sizes"].items(),
+                                       key=lambda item: (item[0] == "default", float(item[0]) if item[0] != "default" else 0)))
+    if record["max_fill"] is not None:
+        record["max_fill"] = round(record["max_fill"], 3)
+    record["risk"] = risk_level(record["max_fill"])
+    return record
+
+
+def analyze_deck(path, expansion=DEFAULT_EXPANSION):
+    """
+    分析一个 pptx，在工作进程中执行。
+
+    返回:
+        list: 第一项为 deck 汇总，之后每张幻灯片一项；出错时只有一项，带 error。
+    """
+    try:
+        package = TextPackage(path, layouts=False, lazy=True)
+        total = new_stats()
+        records = []
+        ledger = PartLedger()
+        # 逐张解析、统计后释放，内存中只有一张幻灯片及其引用的部件
+        with zipfile.ZipFile(path) as zf:
+            for index, partname in enumerate(package.slide_parts, 1):
+                package.load(zf, partname)
+                stats = analyze_slide(package, partname, ledger, expansion)
+                package.release()
+                merge_stats(total, stats)
+                record = {"level": "slide", "deck": path, "slide": index, "part": partname}
+                record.update(stats)
+                records.append(finish_record(record))
+    except Exception as e:
+        # 任何一张幻灯片出错都只影响这个 deck，不中断整个批次
+        return [{"level": "deck", "deck": path, "error": str(e) or type(e).__name__}]
+    summary = {"level": "deck", "deck": path, "slides": len(records)}
+    summary.update(total)
+    return [finish_record(summary)] + records
+
+
+def find_decks(paths):
+    """展开文件和目录（递归），跳过 Office 的临时锁文件。"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(".pptx") and not name.startswith("~$"))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_analyze(paths, expansion=DEFAULT_EXPANSION, workers=None, deck_only=False):
+    """多进程分析，按输入顺序逐个产出记录。"""
+    files = find_decks(paths)
+    workers = workers or max(1, min(len(files), os.cpu_count() or 1))
+    if workers == 1:
+        results = (analyze_deck(path, expansion) for path in files)
+        for records in results:
+            yield from records[:1] if deck_only else records
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records in pool.map(analyze_deck, files, [expansion] * len(files), chunksize=4):
+            yield from records[:1] if deck_only else records
+
+
+def csv_row(record):
+    row = dict(record)
+    if "font_sizes" in row:
+        row["font_sizes"] = " ".join("%s:%d" % item for item in row["font_sizes"].items())
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="只读分析 pptx 的文字负载，结果输出为 JSON lines 或 CSV")
+    parser.add_argument("paths", nargs="+", help="pptx 文件或目录（递归查找）")
+    parser.add_argument("-f", "--format", choices=("jsonl", "csv"), default="jsonl", help="输出格式（默认 jsonl）")
+    parser.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    parser.add_argument("-x", "--expansion", type=float, default=DEFAULT_EXPANSION,
+                        help="译文相对原文的长度膨胀系数（默认 %s）" % DEFAULT_EXPANSION)
+    parser.add_argument("-j", "--workers", type=int, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--deck-only", action="store_true", help="只输出每个 deck 的汇总")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", encoding="utf-8-sig" if args.format == "csv" else "utf-8", newline="") \
+        if args.output else sys.stdout
+    failed = 0
+    try:
+        writer = csv.DictWriter(out, CSV_FIELDS, extrasaction="ignore") if args.format == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        for record in iter_analyze(args.paths, args.expansion, args.workers, args.deck_only):
+            failed += "error" in record
+            if writer is not None:
+                writer.writerow(csv_row(record))
+            else:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
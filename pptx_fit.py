@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+按字体度量估算文字排版后的尺寸，为每个文本框 / 表格单元格选出各自的字号缩放比例。
+
+译后预处理.py 原来对整个 deck 用同一个 font_scale：放得下的译文也被缩小，放不下的形状
+还得在 PowerPoint 里手工调整。自动适配时，每个形状根据 a:xfrm 的尺寸和 run 的文字，找出
+不超出文本框的最大缩放比例（不超过 1，也不小于用户给出的 font_scale）。
+
+字符宽度来自字体文件（用 Pillow/FreeType 量取），每种字体只量一次，保存为磁盘上的宽度表，
+之后每个进程只加载一次；找不到字体时按全角 1 em、其余 0.55 em 估算。中日韩文字一律按 1 em。
+
+估算不考虑按单词折行、字距和段前段后间距，结果偏乐观；需要更保守时可调低 max_scale。
+"""
+import os
+import sys
+import json
+import math
+import tempfile
+import functools
+import unicodedata
+
+from pptx_text import NAMESPACES
+
+A = "{%s}" % NAMESPACES["a"]
+P = "{%s}" % NAMESPACES["p"]
+EMU_PER_PT = 12700
+LINE_HEIGHT = 1.2           # 单倍行距时行高与字号之比
+NARROW_EM = 0.55            # 没有宽度表时非全角字符的平均宽度（em）
+FIT_STEPS = 12              # 二分查找的次数，精度约为 (1 - font_scale) / 4096
+# 文本框和表格单元格的默认内边距（EMU）
+DEFAULT_INSETS = {"l": 91440, "r": 91440, "t": 45720, "b": 45720}
+
+# 用字体量取宽度的字符范围：拉丁字母、扩展拉丁字母和常用标点
+MEASURED_RANGES = [(0x20, 0x250), (0x2000, 0x2070)]
+METRICS_VERSION = 1
+CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "pptx_fit")
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+
+def font_dirs():
+    """系统字体目录，加上环境变量 PPTX_FONT_DIRS 中列出的目录。"""
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        dirs = [os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    elif sys.platform == "darwin":
+        dirs = ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+    else:
+        dirs = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.join(home, ".local", "share", "fonts"),
+                os.path.join(home, ".fonts")]
+    extra = os.environ.get("PPTX_FONT_DIRS")
+    if extra:
+        dirs = extra.split(os.pathsep) + dirs
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def fallback_width(ch):
+    """没有宽度表时的字符宽度（em）。"""
+    if unicodedata.east_asian_width(ch) in "WF":
+        return 1.0
+    if unicodedata.combining(ch):
+        return 0.0
+    return NARROW_EM
+
+
+class FontMetrics:
+    """
+    一种字体的字符宽度表（em）。
+
+    表中没有的字符按 fallback_width 估算，并记进表里，同一个字符只估算一次。
+    """
+
+    def __init__(self, widths=None):
+        self.widths = dict(widths or {})
+
+    def text_width(self, text):
+        """文字的总宽度（em）。"""
+        widths = self.widths
+        total = 0.0
+        for ch in text:
+            width = widths.get(ch)
+            if width is None:
+                width = widths[ch] = fallback_width(ch)
+            total += width
+        return total
+
+
+def read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """原子写入缓存文件，写不进去时（例如目录只读）直接放弃。"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def scan_fonts(dirs):
+    """扫描字体目录，返回 {字体族名（小写）: 字体文件}，同族优先 Regular。"""
+    try:
+        from PIL import ImageFont
+    except ImportError:
+        return {}
+    fonts = {}
+    for directory in dirs:
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if not name.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    family, style = ImageFont.truetype(path, 10).getname()
+                except (OSError, ValueError):
+                    continue
+                key = (family or "").lower()
+                if key and (key not in fonts or style in ("Regular", "Normal", "Book")):
+                    fonts[key] = path
+    return fonts
+
+
+@functools.lru_cache(maxsize=None)
+def font_index():
+    """字体族名到字体文件的索引。目录修改时间不变时直接读取磁盘缓存，每个进程只加载一次。"""
+    dirs = font_dirs()
+    signature = [[d, os.stat(d).st_mtime_ns] for d in dirs]
+    path = os.path.join(CACHE_DIR, "fonts.json")
+    cached = read_json(path)
+    if cached and cached.get("version") == METRICS_VERSION and cached.get("signature") == signature:
+        return cached["fonts"]
+    fonts = scan_fonts(dirs)
+    write_json(path, {"version": METRICS_VERSION, "signature": signature, "fonts": fonts})
+    return fonts
+
+
+def measure_font(path):
+    """用 Pillow 量取字体文件中 MEASURED_RANGES 内字符的宽度，返回 {字符: em}。"""
+    from PIL import ImageFont
+    font = ImageFont.truetype(path, 1000)
+    widths = {}
+    for start, stop in MEASURED_RANGES:
+        for cp in range(start, stop):
+            ch = chr(cp)
+            if unicodedata.category(ch) in ("Cc", "Cn"):
+                continue
+            widths[ch] = round(font.getlength(ch) / 1000.0, 4)
+    return widths
+
+
+@functools.lru_cache(maxsize=None)
+def get_metrics(typeface):
+    """
+    取得字体的宽度表，每个进程中每种字体只加载一次。
+
+    磁盘上有对应字体文件的宽度表（且字体文件没有变化）时直接读取，否则量取后写入缓存目录。
+    typeface 为空、是主题字体（+mn-lt 等）或找不到字体文件时，返回按字符类别估算的通用表。
+    """
+    if not typeface or typeface.startswith("+"):
+        return FontMetrics()
+    font_path = font_index().get(typeface.lower())
+    if font_path is None:
+        return FontMetrics()
+    try:
+        mtime = os.stat(font_path).st_mtime_ns
+    except OSError:
+        return FontMetrics()
+    cache_path = os.path.join(CACHE_DIR, "metrics", "%s.json" % "".join(
+        ch if ch.isalnum() else "_" for ch in typeface.lower()))
+    cached = read_json(cache_path)
+    if cached and cached.get("version") == METRICS_VERSION and cached.get("path") == font_path \
+            and cached.get("mtime") == mtime:
+        return FontMetrics(cached["widths"])
+    try:
+        widths = measure_font(font_path)
+    except (ImportError, OSError):
+        return FontMetrics()
+    write_json(cache_path, {"version": METRICS_VERSION, "path": font_path, "mtime": mtime, "widths": widths})
+    return FontMetrics(widths)
+
+
+def _insets(element, names, defaults):
+    return [int(element.get(name, defaults[key])) if element is not None else defaults[key]
+            for name, key in zip(names, "lrtb")]
+
+
+def body_extent(element):
+    """
+    文本框（p:sp）或表格单元格（a:tc）可用于排版的 (宽, 高, 是否折行)，单位 pt。
+    没有 a:xfrm 的占位符（位置继承自版式）和其他容器（图表、SmartArt）返回 None。
+    """
+    if element.tag == P + "sp":
+        ext = element.find("p:spPr/a:xfrm/a:ext", NAMESPACES)
+        if ext is None:
+            return None
+        cx, cy = int(ext.get("cx")), int(ext.get("cy"))
+        # 组合内形状的尺寸在组合的子坐标系中，按各层组合的缩放换算
+        for grpSp in element.iterancestors(P + "grpSp"):
+            xfrm = grpSp.find("p:grpSpPr/a:xfrm", NAMESPACES)
+            if xfrm is None:
+                continue
+            ext, chExt = xfrm.find(A + "ext"), xfrm.find(A + "chExt")
+            if ext is None or chExt is None:
+                continue
+            if int(chExt.get("cx")):
+                cx = cx * int(ext.get("cx")) / int(chExt.get("cx"))
+            if int(chExt.get("cy")):
+                cy = cy * int(ext.get("cy")) / int(chExt.get("cy"))
+        bodyPr = element.find("p:txBody/a:bodyPr", NAMESPACES)
+        left, right, top, bottom = _insets(bodyPr, ("lIns", "rIns", "tIns", "bIns"), DEFAULT_INSETS)
+        wrap = bodyPr is None or bodyPr.get("wrap") != "none"
+    elif element.tag == A + "tc":
+        tr = element.getparent()
+        tbl = tr.getparent()
+        widths = [int(col.get("w")) for col in tbl.iterfind("a:tblGrid/a:gridCol", NAMESPACES)]
+        col = sum(int(tc.get("gridSpan", 1)) for tc in element.itersiblings(A + "tc", preceding=True))
+        cx = sum(widths[col:col + int(element.get("gridSpan", 1))])
+        cy = int(tr.get("h", 0))
+        tcPr = element.find(A + "tcPr")
+        left, right, top, bottom = _insets(tcPr, ("marL", "marR", "marT", "marB"), DEFAULT_INSETS)
+        wrap = True
+    else:
+        return None
+    width = (cx - left - right) / EMU_PER_PT
+    height = (cy - top - bottom) / EMU_PER_PT
+    if width <= 0 or height <= 0:
+        return None
+    return width, height, wrap
+
+
+def paragraph_defaults(p):
+    """
+    段落中没有在 rPr 上设置的字号（pt）和拉丁字体，依次取段落的 a:pPr/a:defRPr 和文本框
+    a:lstStyle 中对应级别的 defRPr，都没有时为 None。
+    """
+    candidates = [p.find("a:pPr/a:defRPr", NAMESPACES)]
+    body = p.getparent()
+    lstStyle = body.find(A + "lstStyle") if body is not None else None
+    if lstStyle is not None:
+        pPr = p.find(A + "pPr")
+        level = int(pPr.get("lvl", 0)) if pPr is not None else 0
+        candidates.append(lstStyle.find("a:lvl%dpPr/a:defRPr" % (level + 1), NAMESPACES))
+    size = typeface = None
+    for defRPr in candidates:
+        if defRPr is None:
+            continue
+        if size is None and defRPr.get("sz") is not None:
+            size = int(defRPr.get("sz")) / 100.0
+        latin = defRPr.find(A + "latin")
+        if typeface is None and latin is not None:
+            typeface = latin.get("typeface")
+    return size, typeface
+
+
+def measure_paragraphs(paragraphs, default_size):
+    """
+    按缩放比例 1 量取各段文字。
+
+    run 没有设置字号或拉丁字体时按 paragraph_defaults 取段落和 lstStyle 的默认值，
+    再没有时用 default_size 和通用宽度表。
+
+    返回:
+        list: 每段一项 (各行宽度 pt 的列表, 段内最大字号 pt)，a:br 处换行。
+    """
+    measured = []
+    for p in paragraphs:
+        p_size, p_typeface = paragraph_defaults(p)
+        p_size = p_size or default_size
+        lines = [0.0]
+        line_size = 0.0
+        for child in p:
+            tag = child.tag
+            if tag == A + "br":
+                lines.append(0.0)
+                continue
+            if tag != A + "r" and tag != A + "fld":
+                continue
+            rPr = child.find(A + "rPr")
+            sz = rPr.get("sz") if rPr is not None else None
+            size = int(sz) / 100.0 if sz is not None else p_size
+            latin = rPr.find(A + "latin") if rPr is not None else None
+            metrics = get_metrics(latin.get("typeface") if latin is not None else p_typeface)
+            t = child.find(A + "t")
+            lines[-1] += metrics.text_width((t.text or "") if t is not None else "") * size
+            line_size = max(line_size, size)
+        measured.append((lines, line_size or p_size))
+    return measured
+
+
+def needed_height(measured, width, scale, line_factor):
+    """缩放 scale 后按宽度 width 折行所需的高度（pt）。"""
+    height = 0.0
+    for lines, size in measured:
+        count = sum(max(1, math.ceil(line * scale / width - 1e-9)) for line in lines)
+        height += count * size * scale * line_factor
+    return height
+
+
+def fit_scale(measured, extent, min_scale, max_scale=1.0, line_factor=LINE_HEIGHT):
+    """在 [min_scale, max_scale] 中找出文字不超出 extent 的最大缩放比例，向下取到 0.01。"""
+    width, height, wrap = extent
+
+    def fits(scale):
+        if not wrap and any(line * scale > width for lines, _ in measured for line in lines):
+            return False
+        return needed_height(measured, width if wrap else float("inf"), scale, line_factor) <= height
+
+    if fits(max_scale):
+        return max_scale
+    if not fits(min_scale):
+        return min_scale
+    low, high = min_scale, max_scale
+    for _ in range(FIT_STEPS):
+        mid = (low + high) / 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+    return max(min_scale, math.floor(low * 100) / 100)
+
+
+def make_fitter(min_scale, line_spacing=None, max_scale=1.0):
+    """
+    生成给 pptx_text.scale_body 使用的 fit(element, paragraphs, default_size) 函数，返回该形状的缩放比例。
+
+    参数:
+        min_scale (float): 最小缩放比例；无法确定尺寸的形状也使用这个比例（与原来的全局缩放相同）。
+        line_spacing (float): 将要设置的行距，为 None 时按单倍行距估算。
+        max_scale (float): 最大缩放比例，默认不放大。
+
+    字号和字体只从 run、段落和形状自身的 lstStyle 中读取（见 measure_paragraphs）：占位符从版式、
+    母版继承的字号和主题字体（+mn-lt 等）都不解析，这些文字按 default_size 和通用宽度表估算。
+    """
+    line_factor = LINE_HEIGHT * (line_spacing or 1.0)
+
+    def fit(element, paragraphs, default_size):
+        extent = body_extent(element)
+        if extent is None:
+            return min_scale
+        return fit_scale(measure_paragraphs(paragraphs, default_size), extent, min_scale, max_scale, line_factor)
+    return fit
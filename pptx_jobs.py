@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+供 Tk 界面使用的后台进程池任务执行器。
+
+任务在进程池中并行运行，每个任务完成（成功、失败或被取消）后把结果放进队列，
+界面用 after() 定时取出并刷新，主线程不会被整批任务阻塞。
+"""
+import os
+import queue
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+
+def timed_call(func, args):
+    """在工作进程中执行 func(*args)，返回 (结果, 耗时秒数)。"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class JobRunner:
+    """
+    在进程池中执行一批任务。
+
+    参数:
+        func: 任务函数，必须定义在模块顶层（需要能被子进程导入）。
+        jobs (list): 每个任务的参数元组。
+        workers (int): 进程数，默认为 CPU 核数。
+    """
+
+    def __init__(self, func, jobs, workers=None):
+        self.func = func
+        self.jobs = list(jobs)
+        self.workers = workers or max(1, min(len(self.jobs), os.cpu_count() or 1))
+        self.done = 0
+        self.failed = 0
+        self.cancelled = False
+        self.start_time = None
+        self._results = queue.Queue()
+        self._executor = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        for job in self.jobs:
+            future = self._executor.submit(timed_call, self.func, job)
+            future.add_done_callback(lambda f, job=job: self._results.put((job, f)))
+        return self
+
+    def cancel(self):
+        """取消还没开始的任务，正在运行的任务会执行完。"""
+        self.cancelled = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def finished(self):
+        return self.done == len(self.jobs)
+
+    @property
+    def elapsed(self):
+        """从开始到现在的秒数。"""
+        return time.perf_counter() - self.start_time
+
+    def drain(self):
+        """
+        取出目前已经完成的任务，逐个产出 (参数, 结果, 错误, 耗时)。
+        失败时结果为 None、错误为异常对象；被取消的任务错误为 CancelledError。
+        """
+        while True:
+            try:
+                job, future = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self.done += 1
+            if future.cancelled():
+                yield job, None, CancelledError(), 0.0
+                continue
+            try:
+                result, elapsed = future.result()
+            except Exception as e:
+                self.failed += 1
+                yield job, None, e, 0.0
+            else:
+                yield job, result, None, elapsed
+        if self.finished and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+把译前、译后的几种处理合并成一条流水线：每个 pptx 只打开一次，每个文本部件只解析、
+遍历一次，依次执行配置中启用的所有步骤，最后只写一次。
+
+原来的流程是 统一间距.py → 译后预处理.py → pptx译后预处理.py，每个工具都要完整加载并
+保存一遍整个包；这里改为按成员流式改写（见 pptx_zip.py），未改动的成员原样拷贝。
+
+步骤分两类：
+    bytes 步骤直接处理部件的原始字节，函数签名为 fn(name, data, params)，返回新字节或 None；
+    tree 步骤处理解析后的 XML 树，函数签名为 fn(root, params, context)，直接修改 root，
+        修改了内容时返回 True。
+相邻的同类步骤共用一次解析 / 序列化，只有在两类步骤交替时才会重新转换。
+
+配置为 JSON，按顺序列出步骤及参数，例如：
+    {"steps": [
+        {"step": "spacing", "mode": 1},
+        {"step": "font", "font_scale": 0.6, "line_spacing": 1.0},
+        {"step": "empty_paragraph", "font_scale": 0.6}
+    ]}
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pptx.opc.oxml import serialize_part_xml
+from pptx.oxml import parse_xml
+
+from pptx_fit import make_fitter
+from pptx_text import (FILLABLE, default_size, fill_empty_paragraphs, iter_bodies, iter_part_paragraphs,
+                       replace_run_text, replace_spacing_in_text, scale_body, set_spacing)
+from pptx_zip import rewrite_package_to
+import 统一间距
+
+# 步骤注册表：步骤名 -> (类型, 函数, 适用的部件名正则)
+STEPS = {}
+
+# 译后预处理处理的部件：与 pptx_text.iter_paragraphs 覆盖的范围相同
+TREE_PART_PATTERN = re.compile(r"ppt/(slides|slideLayouts|slideMasters|notesSlides|charts|diagrams)/[^/]+\.xml$")
+
+
+def register_step(name, kind, pattern):
+    """注册一个步骤。kind 为 "bytes" 或 "tree"，pattern 为适用的部件名正则。"""
+    if kind not in ("bytes", "tree"):
+        raise ValueError("未知的步骤类型：%s" % kind)
+
+    def decorator(func):
+        STEPS[name] = (kind, func, pattern)
+        return func
+    return decorator
+
+
+def part_bodies(root, context):
+    """
+    同一个部件内各个 tree 步骤共用的 [(容器, 段落列表), ...]，只遍历一次。
+    遍历与 pptx_text.iter_paragraphs 对单个部件的处理相同，按根元素判断部件类型。
+    """
+    if "bodies" not in context:
+        context["bodies"] = list(iter_bodies(iter_part_paragraphs(root, add_missing=True)))
+    return context["bodies"]
+
+
+@register_step("spacing", "bytes", 统一间距.TEXT_PART_PATTERN)
+def spacing_step(name, data, params):
+    """统一间距：替换软回车，模式 1 时同时去掉字符间距。参数 mode 默认为 1。"""
+    return 统一间距.replace_content(name, data, params.get("mode", 1))
+
+
+@register_step("font", "tree", TREE_PART_PATTERN)
+def font_step(root, params, context):
+    """
+    译后预处理：缩放字号，设置行距。
+
+    参数 font_scale（默认 1.0）、line_spacing（默认 None，不修改行距）；
+    apply_spacing 为 True 时同时对每个 run 的文字做统一间距的替换；
+    auto_fit 为 True 时每个形状按 pptx_fit 估算的比例缩放，font_scale 作为下限。
+    已由 empty_paragraph 步骤补过空格的段落不再缩放。部件中没有段落时返回 False。
+    """
+    font_scale = params.get("font_scale", 1.0)
+    fit = make_fitter(font_scale, params.get("line_spacing")) if params.get("auto_fit") else None
+    filled = context.setdefault("filled", set())
+    sizes = {}
+    bodies = part_bodies(root, context)
+    for container, paragraphs in bodies:
+        scale_body(container, paragraphs, font_scale, fit, filled, sizes)
+        if params.get("apply_spacing"):
+            replace_run_text(paragraphs, replace_spacing_in_text)
+        if params.get("line_spacing") is not None:
+            set_spacing(paragraphs, params["line_spacing"])
+    return bool(bodies)
+
+
+@register_step("empty_paragraph", "tree", TREE_PART_PATTERN)
+def empty_paragraph_step(root, params, context):
+    """
+    pptx译后预处理：给文本框和单元格中的空段落补一个空格，字号为默认字号乘以 font_scale（默认 1.0）。
+    补过的段落记在 context 中，之后的 font 步骤不会再次缩放它们。部件中没有段落时返回 False。
+    """
+    filled = context.setdefault("filled", set())
+    bodies = part_bodies(root, context)
+    for container, paragraphs in bodies:
+        if container.tag in FILLABLE:
+            filled.update(fill_empty_paragraphs(paragraphs, default_size(container), params.get("font_scale", 1.0)))
+    return bool(bodies)
+
+
+def load_config(path):
+    """读取 JSON 配置并检查步骤名，返回 [(步骤名, 参数), ...]。"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return parse_config(config)
+
+
+def parse_config(config):
+    """把配置字典转换为 [(步骤名, 参数), ...]，遇到未知步骤时抛出 ValueError。"""
+    steps = []
+    for item in config.get("steps", []):
+        params = dict(item)
+        name = params.pop("step", None)
+        if name not in STEPS:
+            raise ValueError("未知步骤：%s" % name)
+        steps.append((name, params))
+    return steps
+
+
+def transform_part(name, data, steps):
+    """
+    对一个部件依次执行适用的步骤。
+
+    参数:
+        name (str): 部件在包中的名字。
+        data (bytes): 部件原始内容。
+        steps (list): [(步骤名, 参数), ...]。
+
+    返回:
+        bytes: 新内容；没有任何步骤修改它时返回 None。
+    """
+    root = None       # 当前的 XML 树，为 None 时以 data 为准
+    context = {}      # 同一棵树上各 tree 步骤共享的状态
+    changed = False
+    for step_name, params in steps:
+        kind, func, pattern = STEPS[step_name]
+        if not pattern.match(name):
+            continue
+        if kind == "bytes":
+            if root is not None:
+                data, root, context = serialize_part_xml(root), None, {}
+            new_data = func(name, data, params)
+            if new_data is not None:
+                data, changed = new_data, True
+        else:
+            if root is None:
+                root = parse_xml(data)
+            if func(root, params, context):
+                changed = True
+    if not changed:
+        return None
+    return serialize_part_xml(root) if root is not None else data
+
+
+def run_pipeline(src, targetpath, steps):
+    """
+    按步骤处理一个 pptx，结果写到 targetpath 下的同名文件。在工作进程中执行。
+
+    返回:
+        dict: {"output": 输出路径, "changed": 被改写的部件名列表}
+    """
+    patterns = [STEPS[step_name][2] for step_name, _ in steps]
+    os.makedirs(targetpath, exist_ok=True)
+    output = os.path.join(targetpath, os.path.basename(src))
+    # 先写临时文件再改名，中途失败不会留下半个文件
+    changed = rewrite_package_to(src, output, lambda name: any(p.match(name) for p in patterns),
+                                 lambda name, data: transform_part(name, data, steps))
+    return {"output": output, "changed": changed}
+
+
+def iter_pipeline(paths, steps, targetpath=None, workers=None):
+    """多进程批量处理文件或目录，逐个产出进度事件（dict），格式与 统一间距.iter_replace 相同。"""
+    files = []
+    for path in paths:
+        files.extend(f for f in 统一间距.getFiles(path) if f.lower().endswith(".pptx"))
+    length = len(files)
+    done = 0
+    failed = 0
+    if length:
+        workers = workers or max(1, min(length, os.cpu_count() or 1))
+        yield {"event": "start", "total": length, "workers": workers, "skipped": 0}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for fs in files:
+                # 未指定输出目录时，保存在原目录下的 _target_ 文件夹中
+                target = targetpath or os.path.join(os.path.dirname(fs), "_target_")
+                futures[pool.submit(run_pipeline, fs, target, steps)] = fs
+            for future in as_completed(futures):
+                fs = futures[future]
+                done += 1
+                try:
+                    result = future.result()
+                    event = {"event": "done", "file": fs, "output": result["output"], "changed": result["changed"]}
+                except Exception as e:
+                    failed += 1
+                    event = {"event": "error", "file": fs, "error": str(e)}
+                event.update(total=length, done=done, failed=failed)
+                yield event
+    yield {"event": "finish", "total": length, "done": done, "failed": failed}
+
+
+def main(argv=None):
+    """命令行入口：进度以 JSON lines 输出到标准输出。"""
+    parser = argparse.ArgumentParser(description="按配置一次完成 pptx 的统一间距、字号缩放和空段落处理")
+    parser.add_argument("paths", nargs="+", help="pptx 文件或目录")
+    parser.add_argument("-c", "--config", required=True, help="JSON 配置文件，按顺序列出步骤及参数")
+    parser.add_argument("-o", "--output", help="输出目录，默认为原目录下的 _target_ 文件夹")
+    parser.add_argument("-j", "--workers", type=int, help="进程数，默认为 CPU 核数")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = load_config(args.config)
+    except (OSError, ValueError) as e:
+        parser.error("配置文件无效：%s" % e)
+
+    event = None
+    for event in iter_pipeline(args.paths, steps, args.output, args.workers):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+    return 1 if event["failed"] else 0
+
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+"""
+直接在 pptx 的 XML 树上批量调整文字格式。
+
+不再经过 python-pptx 的 shape / paragraph / run / font 代理对象：iter_paragraphs 用显式栈
+一次遍历幻灯片、版式、母版、备注页、图表和 SmartArt 中的所有段落，所有文字处理工具共用；
+字号按缩放比例批量换算，段前、段后和行距在同一遍中写入。幻灯片和版式的结果与原来逐个 run
+调用 run.font.size = Pt(...) 的写法完全一致。
+"""
+import copy
+import functools
+import os
+import posixpath
+import re
+import zipfile
+
+from lxml import etree
+from pptx.opc.oxml import serialize_part_xml
+from pptx.oxml import parse_xml
+from pptx.oxml.xmlchemy import OxmlElement
+
+from pptx_zip import rewrite_package_to
+
+NAMESPACES = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "c": "http://schemas.openxmlformats.org/drawingml/2006/chart",
+    "dgm": "http://schemas.openxmlformats.org/drawingml/2006/diagram",
+    "dsp": "http://schemas.microsoft.com/office/drawing/2008/diagram",
+}
+TABLE_URI = "http://schemas.openxmlformats.org/drawingml/2006/table"
+REL_NAMESPACE = "http://schemas.openxmlformats.org/package/2006/relationships"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+RT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+OFFICE_DOCUMENT_TYPE = RT + "officeDocument"
+# 从幻灯片等部件出发，沿这些关系找到其余含文字的部件：备注页、图表、SmartArt 的数据和绘图
+TEXT_REL_TYPES = {
+    RT + "notesSlide",
+    RT + "chart",
+    RT + "diagramData",
+    "http://schemas.microsoft.com/office/2007/relationships/diagramDrawing",
+}
+
+
+def _tag(qname):
+    prefix, name = qname.split(":")
+    return "{%s}%s" % (NAMESPACES[prefix], name)
+
+
+A_P, A_BR, A_TC, A_TBL, A_TR = _tag("a:p"), _tag("a:br"), _tag("a:tc"), _tag("a:tbl"), _tag("a:tr")
+P_SLD, P_SLD_LAYOUT, P_SLD_MASTER, P_NOTES = _tag("p:sld"), _tag("p:sldLayout"), _tag("p:sldMaster"), _tag("p:notes")
+P_SP, P_GRPSP, P_GRAPHIC_FRAME, P_TXBODY = _tag("p:sp"), _tag("p:grpSp"), _tag("p:graphicFrame"), _tag("p:txBody")
+C_CHART_SPACE, C_RICH, C_TXPR = _tag("c:chartSpace"), _tag("c:rich"), _tag("c:txPr")
+DGM_DATA_MODEL, DGM_T = _tag("dgm:dataModel"), _tag("dgm:t")
+DSP_DRAWING, DSP_SP, DSP_GRPSP, DSP_TXBODY = _tag("dsp:drawing"), _tag("dsp:sp"), _tag("dsp:grpSp"), _tag("dsp:txBody")
+# 与 python-pptx 一样，幻灯片和版式中没有 txBody 的形状和单元格会补上一个
+ADD_MISSING_ROOTS = (P_SLD, P_SLD_LAYOUT)
+# 可以补空格的容器：文本框和表格单元格
+FILLABLE = (P_SP, A_TC)
+
+# 空段落补空格时假设的默认字号（pt）
+TEXTBOX_DEFAULT_SIZE = 10
+TABLE_DEFAULT_SIZE = 18
+
+
+def pt_to_sz(points):
+    """与 python-pptx 的 Pt(points) 赋给 font.size 时相同的换算，返回百分之一磅。"""
+    sz = int(points * 12700) // 127
+    if not 100 <= sz <= 400000:
+        raise ValueError("字号超出范围：%s" % (sz / 100.0))
+    return sz
+
+
+def scaled_sz(sz, font_scale):
+    """与 Pt(run.font.size.pt * font_scale) 相同的换算。"""
+    return pt_to_sz(int(sz * 127) / 12700.0 * font_scale)
+
+
+@functools.lru_cache(maxsize=None)
+def spacing_template(line_spacing):
+    """生成段前 0、段后 0 和指定行距的 a:lnSpc / a:spcBef / a:spcAft 模板元素（只读，插入时复制）。"""
+    pPr = OxmlElement("a:pPr")
+    pPr.space_after = 0
+    pPr.space_before = 0
+    pPr.line_spacing = line_spacing
+    return [pPr.lnSpc, pPr.spcBef, pPr.spcAft]
+
+
+class PartLedger:
+    """
+    记录一次处理中已经访问过的部件（按部件名），保证每个 XML 部件只处理一次。
+
+    同一个版式、母版或主题可能从多条路径被引用到，重复处理会让字号被连续缩放。
+    """
+
+    def __init__(self):
+        self.visited = set()
+        self.skipped = 0
+
+    def visit(self, partname):
+        """第一次遇到该部件时返回 True，之后返回 False 并计入跳过数。"""
+        if partname in self.visited:
+            self.skipped += 1
+            return False
+        self.visited.add(partname)
+        return True
+
+    def summary(self):
+        return "处理部件 %d 个，跳过重复 %d 个" % (len(self.visited), self.skipped)
+
+
+def read_rels(zf, partname):
+    """读取部件的关系文件，返回 {rId: (关系类型, 目标部件名)}，外部链接不计入。"""
+    directory, filename = posixpath.split(partname)
+    try:
+        data = zf.read(posixpath.join(directory, "_rels", filename + ".rels").lstrip("/"))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in etree.fromstring(data).iterfind("{%s}Relationship" % REL_NAMESPACE):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target")
+        if not target.startswith("/"):
+            target = posixpath.normpath(posixpath.join(directory, target))
+        rels[rel.get("Id")] = (rel.get("Type"), target)
+    return rels
+
+
+class TextPackage:
+    """
+    只解析文字相关 XML 部件的 pptx 包：幻灯片、版式、母版，以及从它们引用的备注页、图表和 SmartArt。
+
+    Presentation() 会把包里的所有部件（包括图片、视频和嵌入对象）读进内存，save() 再全部
+    写一遍；这里只读取、解析需要调整的 XML，保存时其余成员按原始压缩字节从源包拷贝，
+    占用的内存与媒体文件的大小无关。部件的遍历顺序与 python-pptx 相同。
+    """
+
+    def __init__(self, path, layouts=True, lazy=False):
+        """
+        layouts 为 False 时只读取幻灯片及其引用的部件（用于只读的分析）。
+        lazy 为 True 时只记下幻灯片部件名，不解析任何部件，由调用方用 load / release 逐张读取。
+        """
+        self.path = path
+        self.slide_parts = []    # 按 sldIdLst 顺序的幻灯片部件名
+        self.layout_parts = []   # 按母版、sldLayoutIdLst 顺序的版式部件名
+        self.master_parts = []   # 按 sldMasterIdLst 顺序的母版部件名
+        self.elements = {}       # 部件名 -> 根元素
+        self.part_rels = {}      # 部件名 -> read_rels 的结果
+        with zipfile.ZipFile(path) as zf:
+            main = [target for rel_type, target in read_rels(zf, "/").values()
+                    if rel_type == OFFICE_DOCUMENT_TYPE]
+            if not main:
+                raise ValueError("不是有效的 pptx 文件：%s" % path)
+            presentation = etree.fromstring(zf.read(main[0].lstrip("/")))
+            rels = read_rels(zf, main[0])
+            for sldId in presentation.iterfind("p:sldIdLst/p:sldId", NAMESPACES):
+                partname = rels[sldId.get(R_ID)][1]
+                self.slide_parts.append(partname if lazy else self._load(zf, partname))
+            if layouts:
+                for masterId in presentation.iterfind("p:sldMasterIdLst/p:sldMasterId", NAMESPACES):
+                    master = self._load(zf, rels[masterId.get(R_ID)][1])
+                    self.master_parts.append(master)
+                    for layoutId in self.elements[master].iterfind("p:sldLayoutIdLst/p:sldLayoutId", NAMESPACES):
+                        self.layout_parts.append(self._load(zf, self.part_rels[master][layoutId.get(R_ID)][1]))
+
+    def _load(self, zf, partname):
+        """解析部件及其经 TEXT_REL_TYPES 关系引用的部件（备注页、图表、SmartArt），返回部件名。"""
+        pending = [partname]
+        while pending:
+            name = pending.pop()
+            if name in self.elements:
+                continue
+            try:
+                data = zf.read(name.lstrip("/"))
+            except KeyError:
+                continue
+            self.elements[name] = parse_xml(data)
+            self.part_rels[name] = read_rels(zf, name)
+            pending.extend(target for rel_type, target in self.part_rels[name].values()
+                           if rel_type in TEXT_REL_TYPES)
+        return partname
+
+    def load(self, zf, partname):
+        """从已打开的 zf 解析 partname 及其引用的部件（lazy 模式下逐张读取幻灯片），返回部件名。"""
+        return self._load(zf, partname)
+
+    def release(self):
+        """丢弃已解析的部件，只读分析完一张幻灯片后释放内存。"""
+        self.elements.clear()
+        self.part_rels.clear()
+
+    def root_parts(self):
+        """遍历的起点：所有幻灯片、版式和母版。"""
+        return self.slide_parts + self.layout_parts + self.master_parts
+
+    def part(self, partname):
+        """部件的根元素，包中没有该部件时返回 None。"""
+        return self.elements.get(partname)
+
+    def rels(self, partname):
+        return self.part_rels.get(partname, {})
+
+    def flush(self):
+        """修改都直接在 elements 中，保存时才序列化，这里不需要做什么。"""
+
+    def save(self, path):
+        """
+        保存到 path：解析过的部件重新序列化，其余成员原样拷贝。
+        先写到同目录下的临时文件再改名，path 与源文件相同时也不会损坏源文件。
+        """
+        rewrite_package_to(self.path, path, lambda name: "/" + name in self.elements,
+                           lambda name, data: serialize_part_xml(self.elements["/" + name]))
+
+
+class PresentationParts:
+    """
+    让 python-pptx 的 Presentation 提供与 TextPackage 相同的部件接口（root_parts / part / rels / flush）。
+
+    python-pptx 没有为 SmartArt 数据等部件建立 XML 对象，只保存原始字节；这些部件在这里解析，
+    修改后由 flush() 写回，所以保存前必须调用 flush()。
+    """
+
+    def __init__(self, presentation):
+        self.presentation = presentation
+        self._parts = {part.partname: part for part in presentation.part.package.iter_parts()}
+        self._parsed = {}
+        self.slide_parts = [slide.part.partname for slide in presentation.slides]
+        self.layout_parts = [layout.part.partname for master in presentation.slide_masters
+                             for layout in master.slide_layouts]
+        self.master_parts = [master.part.partname for master in presentation.slide_masters]
+
+    def root_parts(self):
+        return self.slide_parts + self.layout_parts + self.master_parts
+
+    def part(self, partname):
+        part = self._parts.get(partname)
+        if part is None:
+            return None
+        element = getattr(part, "_element", None)
+        if element is None:
+            if partname not in self._parsed:
+                self._parsed[partname] = parse_xml(part.blob)
+            element = self._parsed[partname]
+        return element
+
+    def rels(self, partname):
+        return {rId: (rel.reltype, rel.target_part.partname)
+                for rId, rel in self._parts[partname].rels.items() if not rel.is_external}
+
+    def flush(self):
+        for partname, element in self._parsed.items():
+            self._parts[partname]._blob = serialize_part_xml(element)
+
+
+def open_parts(presentation):
+    """TextPackage 原样返回，Presentation 包装为 PresentationParts。"""
+    if isinstance(presentation, TextPackage):
+        return presentation
+    return PresentationParts(presentation)
+
+
+def iter_tree_paragraphs(spTree, sp_tag, grpSp_tag, txBody_tag, add_missing=False):
+    """
+    用显式栈遍历形状树（spTree / 组合），按文档顺序产出 (容器, 段落)。
+
+    容器为文本框形状或表格单元格；组合嵌套再深也不会递归。只进入组合，不进入
+    mc:AlternateContent 等其他元素，与 python-pptx 能遍历到的形状一致。
+    """
+    stack = [iter(spTree)]
+    while stack:
+        for child in stack[-1]:
+            tag = child.tag
+            if tag == sp_tag:
+                txBody = child.get_or_add_txBody() if add_missing else child.find(txBody_tag)
+                if txBody is not None:
+                    for p in txBody.iterfind(A_P):
+                        yield child, p
+            elif tag == grpSp_tag:
+                stack.append(iter(child))
+                break
+            elif tag == P_GRAPHIC_FRAME:
+                tbl = child.find("a:graphic/a:graphicData[@uri='%s']/a:tbl" % TABLE_URI, NAMESPACES)
+                if tbl is None:
+                    continue
+                for tc in tbl.iterfind("a:tr/a:tc", NAMESPACES):
+                    txBody = tc.get_or_add_txBody() if add_missing else tc.txBody
+                    if txBody is not None:
+                        for p in txBody.iterfind(A_P):
+                            yield tc, p
+        else:
+            stack.pop()
+
+
+def iter_part_paragraphs(root, add_missing=False):
+    """
+    产出一个部件中的所有 (容器, 段落)，按根元素判断部件类型：
+
+    幻灯片、版式、母版、备注页：形状树中的文本框和表格单元格；
+    图表：c:rich（标题、数据标签等）和 c:txPr（坐标轴等的文字格式）中的段落；
+    SmartArt 数据：每个 dgm:pt 的 dgm:t；SmartArt 绘图：dsp:sp 的 dsp:txBody。
+    add_missing 为 True 时，幻灯片和版式中没有 txBody 的形状和单元格会补上一个。
+    """
+    tag = root.tag
+    if tag in (P_SLD, P_SLD_LAYOUT, P_SLD_MASTER, P_NOTES):
+        spTree = root.find("p:cSld/p:spTree", NAMESPACES)
+        if spTree is not None:
+            yield from iter_tree_paragraphs(spTree, P_SP, P_GRPSP, P_TXBODY,
+                                            add_missing and tag in ADD_MISSING_ROOTS)
+    elif tag == C_CHART_SPACE:
+        for container in root.iter(C_RICH, C_TXPR):
+            for p in container.iterfind(A_P):
+                yield container, p
+    elif tag == DGM_DATA_MODEL:
+        for pt in root.iterfind("dgm:ptLst/dgm:pt", NAMESPACES):
+            t = pt.find(DGM_T)
+            if t is not None:
+                for p in t.iterfind(A_P):
+                    yield pt, p
+    elif tag == DSP_DRAWING:
+        spTree = root.find("dsp:spTree", NAMESPACES)
+        if spTree is not None:
+            yield from iter_tree_paragraphs(spTree, DSP_SP, DSP_GRPSP, DSP_TXBODY)
+
+
+def iter_paragraphs(package, ledger=None, roots=None, add_missing=True):
+    """
+    所有文字处理工具共用的遍历：逐个产出 (部件名, 容器, 段落)。
+
+    从 roots（默认为所有幻灯片、版式和母版）出发，用显式栈沿 TEXT_REL_TYPES 关系进入备注页、
+    图表和 SmartArt，每个部件只访问一次（记在 ledger 中）。不预先收集列表，调用方可以边遍历边修改。
+
+    参数:
+        package: TextPackage 或 PresentationParts（见 open_parts）。
+        ledger (PartLedger): 部件访问记录；为 None 时新建。
+        roots (list): 起点部件名。
+        add_missing (bool): 见 iter_part_paragraphs；只读的分析应传 False。
+    """
+    if ledger is None:
+        ledger = PartLedger()
+    stack = list(reversed(package.root_parts() if roots is None else roots))
+    while stack:
+        partname = stack.pop()
+        if not ledger.visit(partname):
+            continue
+        root = package.part(partname)
+        if root is None:
+            continue
+        for container, p in iter_part_paragraphs(root, add_missing):
+            yield partname, container, p
+        related = [target for rel_type, target in package.rels(partname).values() if rel_type in TEXT_REL_TYPES]
+        stack.extend(reversed(related))
+
+
+def iter_bodies(items):
+    """把连续属于同一容器的 (容器, 段落) 合并，逐个产出 (容器, 段落列表)。"""
+    container = None
+    paragraphs = []
+    for item_container, p in items:
+        if item_container is not container:
+            if paragraphs:
+                yield container, paragraphs
+            container, paragraphs = item_container, []
+        paragraphs.append(p)
+    if paragraphs:
+        yield container, paragraphs
+
+
+def default_size(container):
+    """空段落补空格和估算排版时假设的默认字号（pt）。"""
+    return TABLE_DEFAULT_SIZE if container.tag == A_TC else TEXTBOX_DEFAULT_SIZE
+
+
+def replace_spacing_in_text(text):
+    """Replace line breaks and spacing in text using the 统一间距 method."""
+    text = re.sub("<a:br>.+?</a:br>", "</a:p><a:p>", text)
+    text = re.sub('spc="-?[\\d]+"', " ", text)
+    return text
+
+
+def fill_empty_paragraphs(paragraphs, size, font_scale):
+    """给空段落补一个空格，字号为 size 乘以缩放比例。返回补过空格的段落集合。"""
+    filled = set()
+    for p in paragraphs:
+        if not p.text.strip():
+            for elm in p.content_children:
+                p.remove(elm)
+            p.append_text(" ")
+            for r in p.r_lst:
+                rPr = r.get_or_add_rPr()
+                if rPr.sz is None:
+                    rPr.sz = pt_to_sz(size * font_scale)
+            filled.add(p)
+    return filled
+
+
+def scale_fonts(paragraphs, font_scale, skip=(), sizes=None, defaults=False):
+    """
+    按比例缩放段落中所有 run 的字号，skip 中的段落不处理。
+
+    sizes 为字号换算缓存 {原字号: 新字号}，可以在同一比例的多次调用间共用。
+    defaults 为 True 时同时缩放段落的默认字号 a:pPr/a:defRPr（图表的字号一般设在这里）。
+    """
+    # 文档里的字号种类很少，同一个字号只换算一次
+    if sizes is None:
+        sizes = {}
+
+    def scale(rPr):
+        sz = rPr.get("sz")
+        if sz is None:
+            return
+        new_sz = sizes.get(sz)
+        if new_sz is None:
+            new_sz = sizes[sz] = str(scaled_sz(int(sz), font_scale))
+        rPr.set("sz", new_sz)
+
+    for p in paragraphs:
+        if p in skip:
+            continue
+        if defaults:
+            defRPr = p.find("a:pPr/a:defRPr", NAMESPACES)
+            if defRPr is not None:
+                scale(defRPr)
+        for r in p.r_lst:
+            # 与读取 run.font 时一样，没有 a:rPr 的 run 会补上一个空的
+            scale(r.get_or_add_rPr())
+
+
+def scale_body(container, paragraphs, font_scale, fit=None, skip=(), sizes=None):
+    """
+    缩放一个容器（文本框、单元格、图表文字等）中的字号。
+
+    fit 不为 None 时改用 fit(容器, 段落列表, 默认字号) 返回的比例（见 pptx_fit.make_fitter），
+    比例为 1 时不改字号。sizes 为 {比例: 字号换算缓存}，在多个容器间共用。
+    """
+    if fit is not None:
+        font_scale = fit(container, paragraphs, default_size(container))
+        if font_scale >= 1.0:
+            return
+    cache = sizes.setdefault(font_scale, {}) if sizes is not None else None
+    scale_fonts(paragraphs, font_scale, skip, cache, defaults=container.tag in (C_RICH, C_TXPR))
+
+
+def replace_run_text(paragraphs, text_fn):
+    """用 text_fn 替换每个 run 的文字。"""
+    for p in paragraphs:
+        for r in p.r_lst:
+            text = r.text
+            new_text = text_fn(text)
+            if new_text != text:
+                r.text = new_text
+
+
+def set_spacing(paragraphs, line_spacing):
+    """段前段后设为 0，行距设为 line_spacing。"""
+    template = spacing_template(line_spacing)
+    for p in paragraphs:
+        pPr = p.get_or_add_pPr()
+        for old in (pPr.lnSpc, pPr.spcBef, pPr.spcAft):
+            if old is not None:
+                pPr.remove(old)
+        for index, elm in enumerate(template):
+            pPr.insert(index, copy.deepcopy(elm))
+
+
+def adjust_paragraphs(items, font_scale, line_spacing=None, fill_empty=False, text_fn=None, fit=None):
+    """
+    调整 iter_paragraphs 产出的所有段落，边遍历边按容器处理。
+
+    参数:
+        items: iter_paragraphs 产出的 (部件名, 容器, 段落)。
+        font_scale (float): 字体大小的缩放比例。
+        line_spacing (float): 不为 None 时，段前段后设为 0，行距设为该值。
+        fill_empty (bool): 是否给文本框和单元格中的空段落补一个空格（字号为默认字号乘以缩放比例）。
+        text_fn: 不为 None 时，对每个 run 的文字做替换。
+        fit: 不为 None 时，每个容器按 fit 返回的比例缩放（见 scale_body），不再使用统一的 font_scale。
+
+    返回:
+        int: 处理的段落数。
+    """
+    sizes = {}
+    count = 0
+    for container, paragraphs in iter_bodies((container, p) for _, container, p in items):
+        count += len(paragraphs)
+        filled = ()
+        # 补空格的段落已经按缩放后的默认字号设置，不再参与缩放
+        if fill_empty and container.tag in FILLABLE:
+            filled = fill_empty_paragraphs(paragraphs, default_size(container), font_scale)
+        scale_body(container, paragraphs, font_scale, fit, filled, sizes)
+        if text_fn is not None:
+            replace_run_text(paragraphs, text_fn)
+        if line_spacing is not None:
+            set_spacing(paragraphs, line_spacing)
+    return count
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+pptx 等 Office Open XML 包的流式读写工具。
+
+逐个成员读取源包：只有需要修改的 XML 部件才会被解压、处理并重新压缩，
+其余成员（尤其是 ppt/media/* 下的图片和视频）按原始压缩字节直接拷贝，
+不经过解压/压缩，也不落地到临时目录。
+"""
+import os
+import stat
+import struct
+import zipfile
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024  # 原始字节拷贝的分块大小
+
+
+def _data_offset(zin, info):
+    """返回成员压缩数据在源 ZIP 中的起始偏移（跳过本地文件头）。"""
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile("本地文件头损坏：%s" % info.filename)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    return info.header_offset + zipfile.sizeFileHeader + name_len + extra_len
+
+
+def copy_member_raw(zin, zout, info):
+    """
+    把 zin 中的成员 info 原样拷贝到 zout，不解压也不重新压缩。
+
+    zipfile 没有公开的原始拷贝接口，这里按 ZipFile.write 的方式直接写本地文件头，
+    再分块拷贝压缩数据，最后登记到 zout 的中央目录。
+    """
+    if info.flag_bits & 0x1:
+        raise zipfile.BadZipFile("不支持加密成员：%s" % info.filename)
+    offset = _data_offset(zin, info)
+
+    out = zipfile.ZipInfo(info.filename, info.date_time)
+    out.compress_type = info.compress_type
+    out.create_system = info.create_system
+    out.external_attr = info.external_attr
+    # CRC 和长度直接写进本地文件头，不再使用数据描述符
+    out.flag_bits = info.flag_bits & ~0x08
+    out.CRC = info.CRC
+    out.compress_size = info.compress_size
+    out.file_size = info.file_size
+    zip64 = out.file_size > zipfile.ZIP64_LIMIT or out.compress_size > zipfile.ZIP64_LIMIT
+
+    zout.fp.seek(zout.start_dir)
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader(zip64))
+
+    zin.fp.seek(offset)
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = zin.fp.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile("成员数据被截断：%s" % info.filename)
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout._didModify = True
+
+
+def rewrite_package(src, dst, select, transform):
+    """
+    把 src 包流式改写到 dst。
+
+    select(name) 决定成员是否需要交给 transform 处理；
+    transform(name, data) 返回新的字节串，不需要修改时返回 None。
+    未被选中或未被修改的成员按原始压缩字节拷贝。返回被改写的成员名列表。
+    """
+    changed = []
+    with zipfile.ZipFile(src, "r") as zin, zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            data = None
+            if select(info.filename):
+                data = transform(info.filename, zin.read(info))
+            if data is None:
+                copy_member_raw(zin, zout, info)
+                continue
+            out = zipfile.ZipInfo(info.filename, info.date_time)
+            out.compress_type = zipfile.ZIP_DEFLATED
+            out.create_system = info.create_system
+            out.external_attr = info.external_attr
+            zout.writestr(out, data)
+            changed.append(info.filename)
+    return changed
+
+
+def default_file_mode():
+    """直接创建文件时的权限：0666 去掉当前进程的 umask。"""
+    mask = os.umask(0)
+    os.umask(mask)
+    return 0o666 & ~mask
+
+
+def replace_file(tmp, path):
+    """
+    把临时文件 tmp 改名为 path。
+
+    mkstemp 创建的文件权限为 0600，改名前换成 path 原有的权限，path 不存在时换成直接创建
+    文件时的权限，与原来直接写入目标文件的结果相同，共享目录中的其他用户仍能读取。
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        mode = default_file_mode()
+    os.chmod(tmp, mode)
+    os.replace(tmp, path)
+
+
+def rewrite_package_to(src, path, select, transform):
+    """
+    与 rewrite_package 相同，但先写到 path 所在目录下的唯一临时文件再替换 path：
+    多个进程同时写同一目录不会互相覆盖，中途失败不会留下半个文件，path 与 src 相同时
+    也不会损坏源文件。返回被改写的成员名列表。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(path) + ".", dir=directory)
+    os.close(fd)
+    try:
+        changed = rewrite_package(src, tmp, select, transform)
+        replace_file(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return changed
@@ -1,125 +1,68 @@
 import os
+import multiprocessing
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, ttk
+from concurrent.futures import CancelledError
 from pptx import Presentation
-from pptx.util import Pt
+from pptx_fit import make_fitter
+from pptx_text import PartLedger, TextPackage, adjust_paragraphs, iter_paragraphs, open_parts
+from pptx_jobs import JobRunner
 
-def adjust_text_format(presentation, font_scale, line_spacing, apply_spacing):
+def adjust_text_format(presentation, font_scale, line_spacing, apply_spacing, ledger=None, auto_fit=False):
     """
     调整 PowerPoint 演示文稿的文本格式，包括字体缩放和行距。
+    直接在幻灯片、版式、母版、备注页、图表和 SmartArt 的 XML 上批量处理，
+    文本框和表格中的空段落会补一个空格以避免空段落问题。
 
     参数:
-        presentation (Presentation): PowerPoint 演示文稿对象。
+        presentation (Presentation 或 TextPackage): PowerPoint 演示文稿对象。
         font_scale (float): 字体大小的缩放比例。
         line_spacing (float): 应用的行距。
         apply_spacing (bool): 是否应用行距调整。
+        ledger (PartLedger): 部件访问记录，每个部件只处理一次；为 None 时新建。
+        auto_fit (bool): 每个形状按估算的排版尺寸单独缩放，font_scale 作为最小比例。
 
     返回:
-        Presentation: 调整后的 PowerPoint 演示文稿对象。
+        调整后的 presentation。
     """
-    def adjust_shape_text(shape):
-        """调整演示文稿中形状内的文本，包括文本框和表格单元格。"""
-        if shape.has_text_frame:
-            for paragraph in shape.text_frame.paragraphs:
-                # 为空行添加空格以避免空段落问题
-                if not paragraph.text.strip():
-                    paragraph.text = " "
-                    # 设置新添加空格的字体大小
-                    for run in paragraph.runs:
-                        if run.font.size is None:
-                            run.font.size = Pt(10 * font_scale)  # 假设默认字体大小为10
-                        else:
-                            run.font.size = Pt(run.font.size.pt * font_scales)
-                
-                for run in paragraph.runs:
-                    # 根据提供的缩放比例调整字体大小
-                    if run.font.size is not None:
-                        run.font.size = Pt(run.font.size.pt * font_scale)
-                # 如果设置了行距标志，则设置段落行距
-                if apply_spacing:
-                    paragraph.space_after = 0
-                    paragraph.space_before = 0
-                    paragraph.line_spacing = line_spacing
-
-        # 如果形状包含表格，则调整每个单元格中的文本
-        if shape.has_table:
-            for row in shape.table.rows:
-                for cell in row.cells:
-                    if cell.text_frame:  # 确保单元格具有 text_frame
-                        for paragraph in cell.text_frame.paragraphs:
-                            # 为空行添加空格以避免空段落问题
-                            if not paragraph.text.strip():
-                                paragraph.text = " "
-                                # 设置新添加空格的字体大小
-                                for run in paragraph.runs:
-                                    if run.font.size is None:
-                                        run.font.size = Pt(18 * font_scale)  # 假设默认字体大小为18
-                                    else:
-                                        run.font.size = Pt(run.font.size.pt * font_scale)
-                            
-                            for run in paragraph.runs:
-                                # 根据提供的缩放比例调整字体大小
-                                if run.font.size is not None:
-                                    run.font.size = Pt(run.font.size.pt * font_scale)
-                            # 如果设置了行距标志，则设置段落行距
-                            if apply_spacing:
-                                paragraph.space_after = 0
-                                paragraph.space_before = 0
-                                paragraph.line_spacing = line_spacing
-
-        # 如果形状是组合形状，则递归调整子形状中的文本
-        if shape.shape_type == 6:  # 6 表示组合形状
-            for sub_shape in shape.shapes:
-                adjust_shape_text(sub_shape)
-
-    # 遍历演示文稿中的所有幻灯片并调整每个形状中的文本
-    for slide in presentation.slides:
-        for shape in slide.shapes:
-            adjust_shape_text(shape)
-
-    # 遍历所有幻灯片母版并调整每个形状中的文本
-    for slide_master in presentation.slide_masters:
-        for layout in slide_master.slide_layouts:
-            for shape in layout.shapes:
-                adjust_shape_text(shape)
-
+    fit = make_fitter(font_scale, line_spacing if apply_spacing else None) if auto_fit else None
+    # 遍历幻灯片、版式、母版、备注页、图表和 SmartArt 中的所有段落
+    parts = open_parts(presentation)
+    adjust_paragraphs(iter_paragraphs(parts, ledger), font_scale, line_spacing if apply_spacing else None,
+                      fill_empty=True, fit=fit)
+    parts.flush()
     return presentation
 
-def process_ppt(input_path, output_folder, result_text, font_scale, line_spacing, apply_spacing):
+def process_ppt(input_path, output_folder, font_scale, line_spacing, apply_spacing, text_only=True, auto_fit=False):
     """
-    通过调整文本格式处理单个 PPT 文件。
+    通过调整文本格式处理单个 PPT 文件，在工作进程中执行。
 
     参数:
         input_path (str): 输入 PPT 文件的文件路径。
         output_folder (str): 保存调整后的 PPT 文件的文件夹。
-        result_text (Text): 显示结果的 Tkinter Text 小部件。
         font_scale (float): 字体大小的缩放比例。
         line_spacing (float): 应用的行距。
         apply_spacing (bool): 是否应用行距调整。
+        text_only (bool): 只解析含文字的 XML 部件，图片、视频等成员保存时原样拷贝；
+            为 False 时用 Presentation 完整加载。
+        auto_fit (bool): 见 adjust_text_format。
+
+    返回:
+        tuple: (输出文件路径, 部件统计)。处理失败时抛出异常。
     """
-    try:
-        # 从输入文件路径加载演示文稿
-        presentation = Presentation(input_path)
-        # 调整演示文稿的文本格式
-        adjusted_presentation = adjust_text_format(presentation, font_scale, line_spacing, apply_spacing)
-
-        # 如果输出文件夹不存在，则创建它
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-
-        # 将调整后的演示文稿保存到输出文件夹
-        output_ppt = os.path.join(output_folder, os.path.basename(input_path))
-        adjusted_presentation.save(output_ppt)
-
-        # 在结果 Text 小部件中显示成功消息
-        result_text.config(state=tk.NORMAL)
-        result_text.insert(tk.END, f"处理成功：{output_ppt}\n")
-        result_text.config(state=tk.DISABLED)
-    except Exception as e:
-        # 在结果 Text 小部件中显示错误消息
-        result_text.config(state=tk.NORMAL)
-        result_text.insert(tk.END, f"处理失败：{os.path.basename(input_path)}，错误: {str(e)}\n")
-        result_text.config(state=tk.DISABLED)
+    # 从输入文件路径加载演示文稿，默认只读取文字相关的部件
+    presentation = TextPackage(input_path) if text_only else Presentation(input_path)
+    # 调整演示文稿的文本格式
+    ledger = PartLedger()
+    adjusted_presentation = adjust_text_format(presentation, font_scale, line_spacing, apply_spacing, ledger, auto_fit)
+
+    # 如果输出文件夹不存在，则创建它
+    os.makedirs(output_folder, exist_ok=True)
+
+    # 将调整后的演示文稿保存到输出文件夹
+    output_ppt = os.path.join(output_folder, os.path.basename(input_path))
+    adjusted_presentation.save(output_ppt)
+    return output_ppt, ledger.summary()
 
 def browse_folder(entry):
     """提示用户选择文件夹并在提供的 Entry 小部件中显示路径。"""
@@ -134,83 +77,138 @@ def browse_file(entry):
     entry.insert(0, selected_path)
 
 def process():
-    """处理按钮的回调函数，用于处理 PPT 文件。"""
+    """处理按钮的回调函数，把 PPT 文件分给后台进程池处理。"""
+    global current_runner
     folder_path = entry_folder.get()
     file_path = entry_file.get()
     result_text.config(state=tk.NORMAL)
     result_text.delete(1.0, tk.END)
+    result_text.config(state=tk.DISABLED)
 
     # 获取用户输入的字体缩放比例和行距
     font_scale = float(entry_font_scale.get())
     line_spacing = float(entry_line_spacing.get())
     apply_spacing = apply_spacing_var.get()
+    auto_fit = auto_fit_var.get()
 
-    # 处理选定文件夹中的所有 PPT 文件或单个选定文件
+    # 收集选定文件夹中的所有 PPT 文件或单个选定文件
+    jobs = []
     if folder_path:
         output_folder = os.path.join(folder_path, "output")
         for filename in os.listdir(folder_path):
             if filename.endswith(".pptx"):
                 input_path = os.path.join(folder_path, filename)
-                process_ppt(input_path, output_folder, result_text, font_scale, line_spacing, apply_spacing)
+                jobs.append((input_path, output_folder, font_scale, line_spacing, apply_spacing, True, auto_fit))
     elif file_path:
         output_folder = os.path.join(os.path.dirname(file_path), "output")
-        process_ppt(file_path, output_folder, result_text, font_scale, line_spacing, apply_spacing)
-
+        jobs.append((file_path, output_folder, font_scale, line_spacing, apply_spacing, True, auto_fit))
+    if not jobs:
+        return
+
+    # 在后台进程池中处理，结果通过 poll_results 定时刷新到界面
+    progress_bar.config(maximum=len(jobs), value=0)
+    btn_process.config(state=tk.DISABLED)
+    btn_cancel.config(state=tk.NORMAL)
+    current_runner = JobRunner(process_ppt, jobs).start()
+    root.after(100, poll_results, current_runner)
+
+def poll_results(runner):
+    """定时取出后台任务的结果，在结果 Text 小部件和进度条中显示。"""
+    result_text.config(state=tk.NORMAL)
+    for job, result, error, elapsed in runner.drain():
+        input_path = job[0]
+        if isinstance(error, CancelledError):
+            result_text.insert(tk.END, f"已取消：{os.path.basename(input_path)}\n")
+        elif error is not None:
+            result_text.insert(tk.END, f"处理失败：{os.path.basename(input_path)}，错误: {str(error)}\n")
+        else:
+            output_ppt, summary = result
+            result_text.insert(tk.END, f"处理成功：{output_ppt}（{summary}，耗时 {elapsed:.2f} 秒）\n")
+        progress_bar["value"] = runner.done
+    if runner.finished:
+        result_text.insert(tk.END, f"共 {len(runner.jobs)} 个文件，失败 {runner.failed} 个，总耗时 {runner.elapsed:.2f} 秒\n")
+        btn_process.config(state=tk.NORMAL)
+        btn_cancel.config(state=tk.DISABLED)
+    else:
+        root.after(100, poll_results, runner)
+    result_text.see(tk.END)
     result_text.config(state=tk.DISABLED)
 
-# 创建主 Tkinter 窗口
-root = tk.Tk()
-root.title("PPT 译后预处理工具")
+def cancel():
+    """取消按钮的回调函数，取消还没开始处理的文件。"""
+    if current_runner is not None:
+        current_runner.cancel()
+        btn_cancel.config(state=tk.DISABLED)
+
+current_runner = None
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
+
+    # 创建主 Tkinter 窗口
+    root = tk.Tk()
+    root.title("PPT 译后预处理工具")
+
+    # 创建 UI 组件
+    label_folder = tk.Label(root, text="选择文件夹:")
+    entry_folder = tk.Entry(root, width=50)
+    btn_browse_folder = tk.Button(root, text="选择文件夹", bg="#2cc2d9", fg="#FFFFFF", command=lambda: browse_folder(entry_folder))
+
+    label_file = tk.Label(root, text="选择单文件:")
+    entry_file = tk.Entry(root, width=50)
+    btn_browse_file = tk.Button(root, text="选择单文件", bg="#00da6a", fg="#FFFFFF", command=lambda: browse_file(entry_file))
+
+    label_font_scale = tk.Label(root, text="字体缩放比例:")
+    entry_font_scale = tk.Entry(root, width=10)
+    entry_font_scale.insert(0, "0.6")
 
-# 创建 UI 组件
-label_folder = tk.Label(root, text="选择文件夹:")
-entry_folder = tk.Entry(root, width=50)
-btn_browse_folder = tk.Button(root, text="选择文件夹", bg="#2cc2d9", fg="#FFFFFF", command=lambda: browse_folder(entry_folder))
+    label_line_spacing = tk.Label(root, text="行距设置:")
+    entry_line_spacing = tk.Entry(root, width=10)
+    entry_line_spacing.insert(0, "1.0")
 
-label_file = tk.Label(root, text="选择单文件:")
-entry_file = tk.Entry(root, width=50)
-btn_browse_file = tk.Button(root, text="选择单文件", bg="#00da6a", fg="#FFFFFF", command=lambda: browse_file(entry_file))
+    apply_spacing_var = tk.BooleanVar()
+    chk_apply_spacing = tk.Checkbutton(root, text="修改行距", fg="#f01363", variable=apply_spacing_var)
 
-label_font_scale = tk.Label(root, text="字体缩放比例:")
-entry_font_scale = tk.Entry(root, width=10)
-entry_font_scale.insert(0, "0.6")
+    auto_fit_var = tk.BooleanVar()
+    chk_auto_fit = tk.Checkbutton(root, text="按文本框自动缩放（缩放比例作为下限）", variable=auto_fit_var)
 
-label_line_spacing = tk.Label(root, text="行距设置:")
-entry_line_spacing = tk.Entry(root, width=10)
-entry_line_spacing.insert(0, "1.0")
+    btn_process = tk.Button(root, text="处理", bg="#b80001", fg="#FFFFFF", command=process)
+    btn_cancel = tk.Button(root, text="取消", command=cancel, state=tk.DISABLED)
 
-apply_spacing_var = tk.BooleanVar()
-chk_apply_spacing = tk.Checkbutton(root, text="修改行距", fg="#f01363", variable=apply_spacing_var)
+    progress_bar = ttk.Progressbar(root, mode="determinate")
 
-btn_process = tk.Button(root, text="处理", bg="#b80001", fg="#FFFFFF", command=process)
+    result_text = tk.Text(root, wrap=tk.WORD, height=20, width=50, state=tk.DISABLED, bg="white")
 
-result_text = tk.Text(root, wrap=tk.WORD, height=20, width=50, state=tk.DISABLED, bg="white")
+    # 使用网格布局排列 UI 组件
+    label_folder.grid(row=0, column=0, pady=5, sticky="w")
+    entry_folder.grid(row=0, column=1, pady=5, sticky="ew")
+    btn_browse_folder.grid(row=0, column=2, padx=5, pady=5)
 
-# 使用网格布局排列 UI 组件
-label_folder.grid(row=0, column=0, pady=5, sticky="w")
-entry_folder.grid(row=0, column=1, pady=5, sticky="ew")
-btn_browse_folder.grid(row=0, column=2, padx=5, pady=5)
+    label_file.grid(row=1, column=0, pady=5, sticky="w")
+    entry_file.grid(row=1, column=1, pady=5, sticky="ew")
+    btn_browse_file.grid(row=1, column=2, padx=5, pady=5)
 
-label_file.grid(row=1, column=0, pady=5, sticky="w")
-entry_file.grid(row=1, column=1, pady=5, sticky="ew")
-btn_browse_file.grid(row=1, column=2, padx=5, pady=5)
+    label_font_scale.grid(row=2, column=0, pady=5, sticky="w")
+    entry_font_scale.grid(row=2, column=1, pady=5, sticky="w")
 
-label_font_scale.grid(row=2, column=0, pady=5, sticky="w")
-entry_font_scale.grid(row=2, column=1, pady=5, sticky="w")
+    label_line_spacing.grid(row=3, column=0, pady=5, sticky="w")
+    entry_line_spacing.grid(row=3, column=1, pady=5, sticky="w")
 
-label_line_spacing.grid(row=3, column=0, pady=5, sticky="w")
-entry_line_spacing.grid(row=3, column=1, pady=5, sticky="w")
+    chk_apply_spacing.grid(row=5, column=0, pady=5, sticky="w")
+    chk_auto_fit.grid(row=5, column=1, pady=5, sticky="w")
 
-chk_apply_spacing.grid(row=5, column=0, pady=5, sticky="w")
+    btn_process.grid(row=6, column=0, columnspan=2, pady=10)
+    btn_cancel.grid(row=6, column=2, pady=10)
 
-btn_process.grid(row=6, column=0, columnspan=3, pady=10)
+    progress_bar.grid(row=7, column=0, columnspan=3, padx=10, sticky="ew")
 
-result_text.grid(row=7, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+    result_text.grid(row=8, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
 
-# 调整窗口比例
-root.columnconfigure(1, weight=1)
-root.rowconfigure(7, weight=1)
+    # 调整窗口比例
+    root.columnconfigure(1, weight=1)
+    root.rowconfigure(8, weight=1)
 
-# 启动 Tkinter 主循环
-root.mainloop()
+    # 启动 Tkinter 主循环
+    root.mainloop()
 
@@ -1,9 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import tkinter as tk
-from tkinter import *
-from tkinter.filedialog import *
-import zipfile, os, re, time, shutil
+import os, re, sys, json, time, hashlib, queue, tempfile, threading, argparse, multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from pptx_zip import replace_file, rewrite_package_to
 
 global dirpath, filepath, targetpath
 filepath = ""
@@ -31,21 +30,59 @@ def selectDirFile():
         filepath = ""
 
 def fileSave():
-    global filepath, dirpath
+    global filepath, dirpath, targetpath
     if dirpath or filepath:
         logs.delete(0.0, END)
-        root.update()
-
-        replacePPTX(filepath or dirpath)
+        saveButton.config(state=DISABLED)
+        # 在后台线程中处理，界面只负责轮询事件队列
+        events = queue.Queue()
+        args = ([filepath or dirpath], var.get(), targetpath)
+        threading.Thread(target=runReplace, args=(args, events.put), daemon=True).start()
+        root.after(100, pollEvents, events)
     else:
         writeLog("文件或目录至少选择一个！")
 
+# 后台线程的入口：出错时也发出 finish 事件（带 error），界面才能停止轮询、恢复按钮
+def runReplace(args, progress):
+    try:
+        replace_pptx(*args, progress=progress)
+    except Exception as e:
+        progress({"event": "finish", "total": 0, "done": 0, "failed": 0, "error": str(e) or type(e).__name__})
+
+# 把后台线程产生的进度事件显示到界面上
+def pollEvents(events):
+    while True:
+        try:
+            event = events.get_nowait()
+        except queue.Empty:
+            break
+        if event["event"] == "start":
+            writeLog("共%s个pptx文件，%s个未修改，使用%s个进程处理" % (event["total"], event["skipped"], event["workers"]))
+        elif event["event"] == "done":
+            writeLog("%s 替换成功" % os.path.basename(event["file"]))
+        elif event["event"] == "skip":
+            writeLog("%s 未修改，跳过" % os.path.basename(event["file"]))
+        elif event["event"] == "error":
+            writeLog("%s 处理失败：%s" % (event["file"], event["error"]))
+        if event["event"] in ("done", "skip", "error"):
+            stateLable.set("* 共%s个pptx文件，已处理%s个，失败%s个，还剩下%s个"
+                           % (event["total"], event["done"], event["failed"], event["total"]-event["done"]))
+        if event["event"] == "finish":
+            if event.get("error"):
+                writeLog("处理失败：%s" % event["error"])
+            elif not event["total"]:
+                writeLog("没有找到pptx文件！")
+            saveButton.config(state=NORMAL)
+            if event["total"] and not event.get("error") and hasattr(os, "startfile"):
+                os.startfile(targetpath)
+            return
+    root.after(100, pollEvents, events)
+
 def writeLog(msg):
     current_time = time.strftime('【%H:%M:%S】', time.localtime(time.time()))
     logmsg_in = str(current_time) + str(msg) + "\n"      # 换行
     logs.insert(END, logmsg_in)
     logs.yview_moveto(1)
-    root.update()
 
 # 生成文件list
 def getFiles(directory):
@@ -58,122 +95,244 @@ def getFiles(directory):
         files = [directory]
     return files
 
-# 生成pptx
-def zip_file(fn):
-    global targetpath
-    if not os.path.exists(targetpath):
-        os.mkdir(targetpath)
-    z = zipfile.ZipFile(targetpath+"/"+fn, 'w', zipfile.ZIP_DEFLATED)
-    for dirpath, dirnames, filenames in os.walk("temp"):
-        fpath = dirpath.replace("temp", '')
-        fpath = fpath and fpath + os.sep or ''
-        for filename in filenames:
-            z.write(os.path.join(dirpath, filename), fpath+filename)
-    z.close()
-    shutil.rmtree("temp")
-    writeLog("%s 替换成功" % fn)
-
-# 替换内容
-def replace_content(xmls):
-    var_value = var.get()
-    for xml in xmls:
-        if os.path.isfile(xml):
-            file_data = ""
-            br = False
-            with open(xml, "r", encoding="utf-8") as f:
-                for line in f.readlines():
-                    if re.search("<a:br>.+?</a:br>", line) is not None or re.search('spc="-?[\d]+"', line):
-                        if var_value == 1:
-                            line = re.sub("<a:br>.+?</a:br>", "</a:p><a:p>", line)
-                            line = re.sub('spc="-?[\d]+"', " ", line)
-                        elif var_value == 2:
-                            line = re.sub("<a:br>.+?</a:br>", "</a:p><a:p>", line)
-                        else:
-                            line = re.sub("<a:br>.+?</a:br>", " ", line)
-                        br = True
-                    file_data += line
-                f.close()
-            if br:
-                with open(xml, "w", encoding="utf-8") as nf:
-                    nf.write(file_data)
-                    nf.close()
-
-# 解压并替换
-def modefile(files):
-    nf = []
-    for f in files:
-        if f.split(".")[-1:][0].lower() == "pptx":
-            nf.append(f)
-    files = nf
+# 计算文件内容的哈希
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# 生成pptx：逐个成员流式改写，不再解压到临时目录。在工作进程中执行，不能访问界面
+# known_hash 为缓存中记录的输入哈希，内容没变时直接跳过
+def convert_pptx(src, targetpath, var_value, known_hash=None):
+    sha256 = file_hash(src)
+    if sha256 == known_hash:
+        return {"sha256": sha256, "skipped": True, "changed": []}
+    os.makedirs(targetpath, exist_ok=True)
+    # 先写到目标目录下的唯一临时文件再改名，多个进程同时处理也不会互相覆盖
+    changed = rewrite_package_to(src, os.path.join(targetpath, os.path.basename(src)), is_text_part,
+                                 lambda name, data: replace_content(name, data, var_value))
+    return {"sha256": sha256, "skipped": False, "changed": changed}
+
+# 缓存文件保存在输出目录中：文件名 -> 输入的大小、修改时间、内容哈希、模式，以及输出文件的大小、修改时间
+CACHE_NAME = ".spacing_cache.json"
+# 处理规则变化时加一，旧版本写下的缓存记录自动失效
+CACHE_VERSION = 2
+
+def load_cache(targetpath):
+    try:
+        with open(os.path.join(targetpath, CACHE_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(targetpath, entries):
+    # 先和磁盘上的记录合并再原子替换，其他进程同时写入时不会丢掉它们的记录
+    cache = load_cache(targetpath)
+    cache.update(entries)
+    os.makedirs(targetpath, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", prefix=CACHE_NAME+".", dir=targetpath)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    # 保留原有缓存文件的权限（没有时按 umask），共享目录中其他用户也能读取
+    replace_file(tmp, os.path.join(targetpath, CACHE_NAME))
+
+# 缓存记录仍然有效时返回其中的输入哈希：模式和规则版本相同，且输出文件没有被改动或删除
+def cached_hash(entry, output, var_value):
+    if not entry or entry.get("mode") != var_value or entry.get("version") != CACHE_VERSION:
+        return None
+    try:
+        st = os.stat(output)
+    except OSError:
+        return None
+    if (st.st_size, st.st_mtime_ns) != (entry["output_size"], entry["output_mtime_ns"]):
+        return None
+    return entry["sha256"]
+
+# 需要处理的部件：幻灯片、版式、母版和备注页（不含 _rels 子目录）
+TEXT_PART_PATTERN = re.compile(r"ppt/(slides|slideLayouts|slideMasters|notesSlides)/[^/]+\.xml$")
+
+def is_text_part(name):
+    return TEXT_PART_PATTERN.match(name) is not None
+
+# 快速预筛：直接在原始字节中查找，只有含软回车或字符间距的部件才需要正则处理
+def needs_replace(data, var_value):
+    if b"<a:br>" in data:
+        return True
+    return var_value == 1 and b' spc="' in data
+
+# 预编译的匹配模式，直接作用于 XML 原始字节
+BR_PATTERN = re.compile(rb"<a:br>.+?</a:br>")
+# 只匹配 a:rPr / a:defRPr / a:endParaRPr 标签上的 spc 属性，逐个属性匹配避免回溯
+SPC_PATTERN = re.compile(rb'(<a:(?:rPr|defRPr|endParaRPr)(?: (?!spc=)[\w:]+="[^"]*")*) spc="-?\d+"')
+
+# 各模式下软回车的替换内容：1 硬回车+统一间距，2 硬回车，3 空格
+BR_REPLACEMENTS = {1: b"</a:p><a:p>", 2: b"</a:p><a:p>", 3: b" "}
+
+# 替换内容：直接处理字节，不解码、不按行拆分；没有改动时返回 None
+def replace_content(name, data, var_value):
+    if not needs_replace(data, var_value):
+        return None
+    new_data, count = BR_PATTERN.subn(BR_REPLACEMENTS.get(var_value, b" "), data)
+    if var_value == 1:
+        new_data, spc_count = SPC_PATTERN.subn(rb"\1  ", new_data)
+        count += spc_count
+    if not count:
+        return None
+    return new_data
+
+# 多进程批量改写，逐个产出进度事件（dict），不依赖界面
+# use_cache 为 False 时忽略已有缓存全部重新处理（处理结果仍会写入缓存）
+def iter_replace(paths, var_value=1, targetpath=None, workers=None, use_cache=True):
+    files = []
+    for path in paths:
+        files.extend(f for f in getFiles(path) if f.split(".")[-1:][0].lower() == "pptx")
     length = len(files)
     cf = 0
+    failed = 0
+    caches = {}    # 输出目录 -> 已有缓存
+    updates = {}   # 输出目录 -> 本次新增的缓存记录
+    skipped = []
+    pending = []
     for fs in files:
-        writeLog("-"*20+" * "+"-"*20)
-        writeLog("开始处理文件："+fs)
-        z = zipfile.ZipFile(fs, "r")
-        z.extractall("temp")
-        
-        # 处理幻灯片
-        slide_xmls = getFiles("temp/ppt/slides")
-        replace_content(slide_xmls)
-        
-        # 处理母版
-        master_xmls = getFiles("temp/ppt/slideMasters")
-        replace_content(master_xmls)
-        
-        zip_file(fs.split("/")[-1:][0])
+        # 未指定输出目录时，保存在原目录下的 _target_ 文件夹中
+        target = targetpath or os.path.dirname(fs)+"/_target_"
+        if target not in caches:
+            caches[target] = load_cache(target) if use_cache else {}
+        fn = os.path.basename(fs)
+        output = os.path.join(target, fn)
+        try:
+            st = os.stat(fs)
+        except OSError as e:
+            pending.append((fs, target, output, None, None, e))
+            continue
+        entry = caches[target].get(fn)
+        known_hash = cached_hash(entry, output, var_value)
+        # 大小和修改时间都没变，不读取文件直接跳过
+        if known_hash and (st.st_size, st.st_mtime_ns) == (entry["size"], entry["mtime_ns"]):
+            skipped.append((fs, output))
+        else:
+            pending.append((fs, target, output, st, known_hash, None))
+    if length:
+        workers = workers or max(1, min(len(pending), os.cpu_count() or 1))
+        yield {"event": "start", "total": length, "workers": workers, "skipped": len(skipped)}
+    for fs, output in skipped:
         cf += 1
-        stateLable.set("* 共%s个pptx文件，已处理%s个，还剩下%s个" % (length, cf, length-cf))
+        yield {"event": "skip", "file": fs, "output": output, "total": length, "done": cf, "failed": failed}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for fs, target, output, st, known_hash, error in pending:
+                if error is None:
+                    future = pool.submit(convert_pptx, fs, target, var_value, known_hash)
+                else:
+                    future = Future()
+                    future.set_exception(error)
+                futures[future] = (fs, target, output, st)
+            for future in as_completed(futures):
+                fs, target, output, st = futures[future]
+                cf += 1
+                try:
+                    result = future.result()
+                    out_st = os.stat(output)
+                    updates.setdefault(target, {})[os.path.basename(fs)] = {
+                        "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": result["sha256"],
+                        "mode": var_value, "version": CACHE_VERSION, "output_size": out_st.st_size, "output_mtime_ns": out_st.st_mtime_ns}
+                    if result["skipped"]:
+                        event = {"event": "skip", "file": fs, "output": output}
+                    else:
+                        event = {"event": "done", "file": fs, "output": output, "changed": result["changed"]}
+                except Exception as e:
+                    failed += 1
+                    event = {"event": "error", "file": fs, "error": str(e)}
+                event.update(total=length, done=cf, failed=failed)
+                yield event
+    for target, entries in updates.items():
+        save_cache(target, entries)
+    yield {"event": "finish", "total": length, "done": cf, "failed": failed}
+
+# 库入口：处理文件或目录列表，progress 回调接收每个进度事件，返回最后的汇总事件
+def replace_pptx(paths, var_value=1, targetpath=None, workers=None, progress=None, use_cache=True):
+    for event in iter_replace(paths, var_value, targetpath, workers, use_cache):
+        if progress is not None:
+            progress(event)
+    return event
+
+# 命令行入口：进度以 JSON lines 输出到标准输出
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ppt译前处理：替换软回车并统一字符间距")
+    parser.add_argument("paths", nargs="+", help="pptx 文件或目录")
+    parser.add_argument("-m", "--mode", type=int, choices=(1, 2, 3), default=1,
+                        help="1 替换成硬回车+统一间距，2 替换成硬回车，3 替换成空格（默认 1）")
+    parser.add_argument("-o", "--output", help="输出目录，默认为原目录下的 _target_ 文件夹")
+    parser.add_argument("-j", "--workers", type=int, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--no-cache", action="store_true", help="忽略缓存，重新处理所有文件")
+    args = parser.parse_args(argv)
+
+    def printEvent(event):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+
+    summary = replace_pptx(args.paths, args.mode, args.output, args.workers, progress=printEvent,
+                           use_cache=not args.no_cache)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
 
-def replacePPTX(path):
-    global targetpath
-    files = getFiles(path)
-    modefile(files)
-    os.startfile(targetpath)
+    # 带参数运行时作为命令行工具，不创建窗口
+    if len(sys.argv) > 1:
+        sys.exit(main())
 
+    import tkinter as tk
+    from tkinter import *
+    from tkinter.filedialog import *
 
-root = tk.Tk()
-root.title("ppt译前处理")
-filePath = tk.StringVar()
-dirPath = tk.StringVar()
-stateLable = tk.StringVar()
+    root = tk.Tk()
+    root.title("ppt译前处理")
+    filePath = tk.StringVar()
+    dirPath = tk.StringVar()
+    stateLable = tk.StringVar()
 
-w = 580
-h = 360
-sw = int((root.winfo_screenwidth()-w)/2)
-sh = int((root.winfo_screenheight()-h)/2)
+    w = 580
+    h = 360
+    sw = int((root.winfo_screenwidth()-w)/2)
+    sh = int((root.winfo_screenheight()-h)/2)
 
-root.geometry('%sx%s+%s+%s' % (w, h, sw, sh))
+    root.geometry('%sx%s+%s+%s' % (w, h, sw, sh))
 
-tk.Label(root, text='文件：').grid(row=1, column=0, padx=5, pady=5)
-tk.Entry(root, textvariable=filePath).grid(row=1, column=1, columnspan=4, padx=5, pady=5, ipadx=145,)
-tk.Button(root, width=8, text='选择', command=selectFile).grid(row=1, column=5, padx=5, pady=5)
+    tk.Label(root, text='文件：').grid(row=1, column=0, padx=5, pady=5)
+    tk.Entry(root, textvariable=filePath).grid(row=1, column=1, columnspan=4, padx=5, pady=5, ipadx=145,)
+    tk.Button(root, width=8, text='选择', command=selectFile).grid(row=1, column=5, padx=5, pady=5)
 
-tk.Label(root, text='目录：').grid(row=2, column=0, padx=5, pady=5)
-tk.Entry(root, textvariable=dirPath).grid(row=2, column=1, padx=5, columnspan=4, pady=5, ipadx=145,)
-tk.Button(root, width=8, text='选择', command=selectDirFile).grid(row=2, column=5, padx=5, pady=5)
+    tk.Label(root, text='目录：').grid(row=2, column=0, padx=5, pady=5)
+    tk.Entry(root, textvariable=dirPath).grid(row=2, column=1, padx=5, columnspan=4, pady=5, ipadx=145,)
+    tk.Button(root, width=8, text='选择', command=selectDirFile).grid(row=2, column=5, padx=5, pady=5)
 
-var = tk.IntVar()
-var.set(1)
-tk.Radiobutton(root, text="替换成硬回车+统一间距", variable=var, value=1).grid(row=3, column=1, pady=5, sticky=W)
-tk.Radiobutton(root, text="替换成硬回车", variable=var, value=2).grid(row=3, column=2,  pady=5, sticky=W)
-tk.Radiobutton(root, text="替换成空格", variable=var, value=3).grid(row=3, column=3,  pady=5, sticky=W)
+    var = tk.IntVar()
+    var.set(1)
+    tk.Radiobutton(root, text="替换成硬回车+统一间距", variable=var, value=1).grid(row=3, column=1, pady=5, sticky=W)
+    tk.Radiobutton(root, text="替换成硬回车", variable=var, value=2).grid(row=3, column=2,  pady=5, sticky=W)
+    tk.Radiobutton(root, text="替换成空格", variable=var, value=3).grid(row=3, column=3,  pady=5, sticky=W)
 
-tk.Button(root, width=8, text='确定', command=fileSave, height=2).grid(row=5, column=5, padx=5, pady=5, rowspan=2, sticky=N+S)
+    saveButton = tk.Button(root, width=8, text='确定', command=fileSave, height=2)
+    saveButton.grid(row=5, column=5, padx=5, pady=5, rowspan=2, sticky=N+S)
 
-tk.Label(root, text='* 新文件保存在原目录下的_target_文件夹中', fg="#666").grid(row=5, column=1, sticky=NW, padx=5, pady=0)
-state = tk.Label(root, textvariable=stateLable, fg="red").grid(row=6, column=1, padx=5, pady=0, sticky=NW,)
+    tk.Label(root, text='* 新文件保存在原目录下的_target_文件夹中', fg="#666").grid(row=5, column=1, sticky=NW, padx=5, pady=0)
+    state = tk.Label(root, textvariable=stateLable, fg="red").grid(row=6, column=1, padx=5, pady=0, sticky=NW,)
 
-logs = tk.Text(root, height=11, width=70)
-logs.grid(row=10, column=1, padx=0, pady=5, columnspan=5, sticky=W,)
+    logs = tk.Text(root, height=11, width=70)
+    logs.grid(row=10, column=1, padx=0, pady=5, columnspan=5, sticky=W,)
 
-scroll = tk.Scrollbar(root)
-scroll.set(0.5, 1)
-scroll.grid(row=10, column=5, sticky=N+S+E, padx=10)
+    scroll = tk.Scrollbar(root)
+    scroll.set(0.5, 1)
+    scroll.grid(row=10, column=5, sticky=N+S+E, padx=10)
 
-scroll.config(command=logs.yview)
-logs.config(yscrollcommand=scroll.set)
+    scroll.config(command=logs.yview)
+    logs.config(yscrollcommand=scroll.set)
 
-tk.Label(root, text='替换完成后自动打开目标文件夹').grid(row=14, column=0, columnspan=6, pady=1)
+    tk.Label(root, text='替换完成后自动打开目标文件夹').grid(row=14, column=0, columnspan=6, pady=1)
 
-root.mainloop()
+    root.mainloop()
@@ -1,92 +1,41 @@
 import os
+import multiprocessing
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, ttk
+from concurrent.futures import CancelledError
 from pptx import Presentation
-from pptx.util import Pt
-import re
+from pptx_fit import make_fitter
+from pptx_text import PartLedger, TextPackage, adjust_paragraphs, iter_paragraphs, open_parts, replace_spacing_in_text
+from pptx_jobs import JobRunner
 
-def replace_spacing_in_text(text):
-    """Replace line breaks and spacing in text using the 统一间距 method."""
-    text = re.sub("<a:br>.+?</a:br>", "</a:p><a:p>", text)
-    text = re.sub('spc="-?[\\d]+"', " ", text)
-    return text
-
-def adjust_text_format(presentation, font_scale, line_spacing, apply_spacing):
+def adjust_text_format(presentation, font_scale, line_spacing, apply_spacing, ledger=None, auto_fit=False):
     """
     调整文本格式，包括统一间距、字体缩放和行距。
-    遍历幻灯片的所有元素，包括表格、母版、文本框和组合。
+    直接在 XML 上批量处理，覆盖幻灯片、版式、母版、备注页中的文本框、表格和组合，以及图表和 SmartArt。
+    auto_fit 为 True 时每个形状按估算的排版尺寸单独缩放，font_scale 作为最小比例。
     """
-    def adjust_shape_text(shape):
-        """调整形状中的文字，包括普通文本框和表格内文字。"""
-        if shape.has_text_frame:
-            for paragraph in shape.text_frame.paragraphs:
-                for run in paragraph.runs:
-                    # 调整字体大小
-                    if run.font.size is not None:
-                        run.font.size = Pt(run.font.size.pt * font_scale)
-                    # 统一字符间距
-                    if apply_spacing:
-                        run.text = replace_spacing_in_text(run.text)
-                # 设置段落行距
-                paragraph.space_after = 0
-                paragraph.space_before = 0
-                paragraph.line_spacing = line_spacing
-
-        # 如果形状是表格，遍历单元格
-        if shape.has_table:
-            for row in shape.table.rows:
-                for cell in row.cells:
-                    if cell.text_frame:  # 确保单元格具有 text_frame
-                        for paragraph in cell.text_frame.paragraphs:
-                            for run in paragraph.runs:
-                                # 调整字体大小
-                                if run.font.size is not None:
-                                    run.font.size = Pt(run.font.size.pt * font_scale)
-                                # 统一字符间距
-                                if apply_spacing:
-                                    run.text = replace_spacing_in_text(run.text)
-                            # 设置段落行距
-                            paragraph.space_after = 0
-                            paragraph.space_before = 0
-                            paragraph.line_spacing = line_spacing
-
-        # 如果形状是组合，递归处理组合中的每个形状
-        if shape.shape_type == 6:  # 6 表示组合
-            for sub_shape in shape.shapes:
-                adjust_shape_text(sub_shape)
-
-    # 遍历幻灯片内容
-    for slide in presentation.slides:
-        for shape in slide.shapes:
-            adjust_shape_text(shape)
-
-    # 遍历所有母版内容
-    for slide_master in presentation.slide_masters:
-        for layout in slide_master.slide_layouts:
-            for shape in layout.shapes:
-                adjust_shape_text(shape)
-
+    text_fn = replace_spacing_in_text if apply_spacing else None
+    fit = make_fitter(font_scale, line_spacing) if auto_fit else None
+    parts = open_parts(presentation)
+    adjust_paragraphs(iter_paragraphs(parts, ledger), font_scale, line_spacing, text_fn=text_fn, fit=fit)
+    parts.flush()
     return presentation
 
-def process_ppt(input_path, output_folder, result_text, font_scale, line_spacing, apply_spacing):
-    """处理单个 PPT 文件。"""
-    try:
-        presentation = Presentation(input_path)
-        adjusted_presentation = adjust_text_format(presentation, font_scale, line_spacing, apply_spacing)
-
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
+def process_ppt(input_path, output_folder, font_scale, line_spacing, apply_spacing, text_only=True, auto_fit=False):
+    """
+    处理单个 PPT 文件，在工作进程中执行。返回 (输出路径, 部件统计)，失败时抛出异常。
+    text_only 为 True 时只解析含文字的 XML 部件，图片、视频等成员保存时原样拷贝，不读进内存；
+    auto_fit 见 adjust_text_format。
+    """
+    presentation = TextPackage(input_path) if text_only else Presentation(input_path)
+    ledger = PartLedger()
+    adjusted_presentation = adjust_text_format(presentation, font_scale, line_spacing, apply_spacing, ledger, auto_fit)
 
-        output_ppt = os.path.join(output_folder, os.path.basename(input_path))
-        adjusted_presentation.save(output_ppt)
+    os.makedirs(output_folder, exist_ok=True)
 
-        result_text.config(state=tk.NORMAL)
-        result_text.insert(tk.END, f"处理成功：{output_ppt}\n")
-        result_text.config(state=tk.DISABLED)
-    except Exception as e:
-        result_text.config(state=tk.NORMAL)
-        result_text.insert(tk.END, f"处理失败：{os.path.basename(input_path)}，错误: {str(e)}\n")
-        result_text.config(state=tk.DISABLED)
+    output_ppt = os.path.join(output_folder, os.path.basename(input_path))
+    adjusted_presentation.save(output_ppt)
+    return output_ppt, ledger.summary()
 
 def browse_folder(entry):
     """选择文件夹并在 Entry 中显示路径。"""
@@ -101,80 +50,134 @@ def browse_file(entry):
     entry.insert(0, selected_path)
 
 def process():
-    """处理按钮的回调函数。"""
+    """处理按钮的回调函数：把文件分给后台进程池处理。"""
+    global current_runner
     folder_path = entry_folder.get()
     file_path = entry_file.get()
     result_text.config(state=tk.NORMAL)
     result_text.delete(1.0, tk.END)
+    result_text.config(state=tk.DISABLED)
 
     font_scale = float(entry_font_scale.get())
     line_spacing = float(entry_line_spacing.get())
     apply_spacing = apply_spacing_var.get()
+    auto_fit = auto_fit_var.get()
 
+    jobs = []
     if folder_path:
         output_folder = os.path.join(folder_path, "output")
         for filename in os.listdir(folder_path):
             if filename.endswith(".pptx"):
                 input_path = os.path.join(folder_path, filename)
-                process_ppt(input_path, output_folder, result_text, font_scale, line_spacing, apply_spacing)
+                jobs.append((input_path, output_folder, font_scale, line_spacing, apply_spacing, True, auto_fit))
     elif file_path:
         output_folder = os.path.join(os.path.dirname(file_path), "output")
-        process_ppt(file_path, output_folder, result_text, font_scale, line_spacing, apply_spacing)
-
+        jobs.append((file_path, output_folder, font_scale, line_spacing, apply_spacing, True, auto_fit))
+    if not jobs:
+        return
+
+    progress_bar.config(maximum=len(jobs), value=0)
+    btn_process.config(state=tk.DISABLED)
+    btn_cancel.config(state=tk.NORMAL)
+    current_runner = JobRunner(process_ppt, jobs).start()
+    root.after(100, poll_results, current_runner)
+
+def poll_results(runner):
+    """定时取出后台任务的结果，刷新结果和进度条。"""
+    result_text.config(state=tk.NORMAL)
+    for job, result, error, elapsed in runner.drain():
+        input_path = job[0]
+        if isinstance(error, CancelledError):
+            result_text.insert(tk.END, f"已取消：{os.path.basename(input_path)}\n")
+        elif error is not None:
+            result_text.insert(tk.END, f"处理失败：{os.path.basename(input_path)}，错误: {str(error)}\n")
+        else:
+            output_ppt, summary = result
+            result_text.insert(tk.END, f"处理成功：{output_ppt}（{summary}，耗时 {elapsed:.2f} 秒）\n")
+        progress_bar["value"] = runner.done
+    if runner.finished:
+        result_text.insert(tk.END, f"共 {len(runner.jobs)} 个文件，失败 {runner.failed} 个，总耗时 {runner.elapsed:.2f} 秒\n")
+        btn_process.config(state=tk.NORMAL)
+        btn_cancel.config(state=tk.DISABLED)
+    else:
+        root.after(100, poll_results, runner)
+    result_text.see(tk.END)
     result_text.config(state=tk.DISABLED)
 
-# 创建主窗口
-root = tk.Tk()
-root.title("PPT 译后预处理工具")
+def cancel():
+    """取消按钮的回调函数。"""
+    if current_runner is not None:
+        current_runner.cancel()
+        btn_cancel.config(state=tk.DISABLED)
+
+current_runner = None
+
+if __name__ == "__main__":
+    # 打包成 exe 后子进程需要
+    multiprocessing.freeze_support()
+
+    # 创建主窗口
+    root = tk.Tk()
+    root.title("PPT 译后预处理工具")
+
+    # 创建 UI 组件
+    label_folder = tk.Label(root, text="选择文件夹:")
+    entry_folder = tk.Entry(root, width=50)
+    btn_browse_folder = tk.Button(root, text="选择文件夹", command=lambda: browse_folder(entry_folder))
+
+    label_file = tk.Label(root, text="选择文件:")
+    entry_file = tk.Entry(root, width=50)
+    btn_browse_file = tk.Button(root, text="选择文件", command=lambda: browse_file(entry_file))
+
+    label_font_scale = tk.Label(root, text="字体缩放比例:")
+    entry_font_scale = tk.Entry(root, width=10)
+    entry_font_scale.insert(0, "0.6")
 
-# 创建 UI 组件
-label_folder = tk.Label(root, text="选择文件夹:")
-entry_folder = tk.Entry(root, width=50)
-btn_browse_folder = tk.Button(root, text="选择文件夹", command=lambda: browse_folder(entry_folder))
+    label_line_spacing = tk.Label(root, text="行距:")
+    entry_line_spacing = tk.Entry(root, width=10)
+    entry_line_spacing.insert(0, "1.0")
 
-label_file = tk.Label(root, text="选择文件:")
-entry_file = tk.Entry(root, width=50)
-btn_browse_file = tk.Button(root, text="选择文件", command=lambda: browse_file(entry_file))
+    apply_spacing_var = tk.BooleanVar()
+    chk_apply_spacing = tk.Checkbutton(root, text="统一字符间距", variable=apply_spacing_var)
 
-label_font_scale = tk.Label(root, text="字体缩放比例:")
-entry_font_scale = tk.Entry(root, width=10)
-entry_font_scale.insert(0, "0.6")
+    auto_fit_var = tk.BooleanVar()
+    chk_auto_fit = tk.Checkbutton(root, text="按文本框自动缩放（缩放比例作为下限）", variable=auto_fit_var)
 
-label_line_spacing = tk.Label(root, text="行距:")
-entry_line_spacing = tk.Entry(root, width=10)
-entry_line_spacing.insert(0, "1.0")
+    btn_process = tk.Button(root, text="处理", command=process)
+    btn_cancel = tk.Button(root, text="取消", command=cancel, state=tk.DISABLED)
 
-apply_spacing_var = tk.BooleanVar()
-chk_apply_spacing = tk.Checkbutton(root, text="统一字符间距", variable=apply_spacing_var)
+    progress_bar = ttk.Progressbar(root, mode="determinate")
 
-btn_process = tk.Button(root, text="处理", command=process)
+    result_text = tk.Text(root, wrap=tk.WORD, height=15, width=60, state=tk.DISABLED)
 
-result_text = tk.Text(root, wrap=tk.WORD, height=15, width=60, state=tk.DISABLED)
+    # 布局
+    label_folder.grid(row=0, column=0, pady=5, sticky="w")
+    entry_folder.grid(row=0, column=1, pady=5, sticky="ew")
+    btn_browse_folder.grid(row=0, column=2, padx=5, pady=5)
 
-# 布局
-label_folder.grid(row=0, column=0, pady=5, sticky="w")
-entry_folder.grid(row=0, column=1, pady=5, sticky="ew")
-btn_browse_folder.grid(row=0, column=2, padx=5, pady=5)
+    label_file.grid(row=1, column=0, pady=5, sticky="w")
+    entry_file.grid(row=1, column=1, pady=5, sticky="ew")
+    btn_browse_file.grid(row=1, column=2, padx=5, pady=5)
 
-label_file.grid(row=1, column=0, pady=5, sticky="w")
-entry_file.grid(row=1, column=1, pady=5, sticky="ew")
-btn_browse_file.grid(row=1, column=2, padx=5, pady=5)
+    label_font_scale.grid(row=2, column=0, pady=5, sticky="w")
+    entry_font_scale.grid(row=2, column=1, pady=5, sticky="w")
 
-label_font_scale.grid(row=2, column=0, pady=5, sticky="w")
-entry_font_scale.grid(row=2, column=1, pady=5, sticky="w")
+    label_line_spacing.grid(row=3, column=0, pady=5, sticky="w")
+    entry_line_spacing.grid(row=3, column=1, pady=5, sticky="w")
 
-label_line_spacing.grid(row=3, column=0, pady=5, sticky="w")
-entry_line_spacing.grid(row=3, column=1, pady=5, sticky="w")
+    chk_apply_spacing.grid(row=4, column=0, pady=5, sticky="w")
+    chk_auto_fit.grid(row=4, column=1, pady=5, sticky="w")
 
-chk_apply_spacing.grid(row=4, column=0, pady=5, sticky="w")
+    btn_process.grid(row=5, column=0, columnspan=2, pady=10)
+    btn_cancel.grid(row=5, column=2, pady=10)
 
-btn_process.grid(row=5, column=0, columnspan=3, pady=10)
+    progress_bar.grid(row=6, column=0, columnspan=3, padx=10, sticky="ew")
 
-result_text.grid(row=6, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+    result_text.grid(row=7, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
 
-# 调整窗口比例
-root.columnconfigure(1, weight=1)
-root.rowconfigure(6, weight=1)
+    # 调整窗口比例
+    root.columnconfigure(1, weight=1)
+    root.rowconfigure(7, weight=1)
 
-# 启动主循环
-root.mainloop()
+    # 启动主循环
+    root.mainloop()